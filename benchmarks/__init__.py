@@ -0,0 +1,3 @@
+"""
+Benchmarks du simulateur (voir benchmarks/run.py)
+"""
@@ -0,0 +1,135 @@
+"""
+Temps d'import de chaque module de l'application
+
+Usage (depuis la racine du projet) :
+    python -m benchmarks.imports
+    python -m benchmarks.imports utils.dvf_loader plotly.express --output imports.json
+
+Chaque module est importé dans un interpréteur neuf avec `-X importtime`,
+après Streamlit (toujours chargé par le serveur) : le temps mesuré est le
+coût supplémentaire du module pour la première session. Les dépendances les
+plus coûteuses sont indiquées.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Sequence
+
+# Modules importés par l'application et ses pages
+DEFAULT_MODULES = [
+    'pandas', 'numpy', 'plotly.graph_objects', 'plotly.express', 'scipy',
+    'utils.simulation', 'utils.financial_calculator', 'utils.profiling',
+    'utils.dvf_loader', 'utils.market_analysis', 'utils.communes_insee',
+    'utils.hierarchy', 'utils.monte_carlo', 'components.diagnostics'
+]
+DEFAULT_PRELOAD = ('streamlit',)
+DEFAULT_REPEAT = 3
+TOP_DEPENDANCES = 5
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """
+    Lit la sortie de `python -X importtime`
+
+    Args:
+        stderr: Sortie d'erreur de l'interpréteur
+
+    Returns:
+        Liste de {'module', 'self_us', 'cumul_us', 'niveau'} dans l'ordre d'import
+    """
+    lignes = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumul_us, nom = line[len('import time:'):].split('|', 2)
+        nom = nom[1:]
+        lignes.append({'module': nom.strip(), 'self_us': int(self_us), 'cumul_us': int(cumul_us),
+                       'niveau': (len(nom) - len(nom.lstrip())) // 2})
+    return lignes
+
+
+def measure_import(module: str, preload: Sequence[str] = DEFAULT_PRELOAD,
+                   python: str = sys.executable) -> Dict:
+    """
+    Mesure l'import d'un module dans un interpréteur neuf
+
+    Args:
+        module: Nom du module
+        preload: Modules importés avant (non comptés)
+        python: Interpréteur utilisé
+
+    Returns:
+        Dictionnaire {'module', 'total_ms', 'dependances'} (dépendances les plus
+        coûteuses en temps propre)
+    """
+    code = ''.join(f'import {m}\n' for m in preload) + f'import {module}\n'
+    proc = subprocess.run([python, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise ImportError(f"Import de {module} impossible : {proc.stderr.strip().splitlines()[-1]}")
+
+    lignes = parse_importtime(proc.stderr)
+    # Les lignes postérieures au dernier module préchargé (niveau 0) concernent le module
+    debut = 0
+    for i, ligne in enumerate(lignes):
+        if ligne['niveau'] == 0 and ligne['module'] in preload:
+            debut = i + 1
+    propres = lignes[debut:]
+
+    total_us = sum(l['self_us'] for l in propres)
+    top = sorted(propres, key=lambda l: l['self_us'], reverse=True)[:TOP_DEPENDANCES]
+    return {'module': module, 'total_ms': total_us / 1000,
+            'dependances': [{'module': l['module'], 'self_ms': l['self_us'] / 1000} for l in top]}
+
+
+def measure_imports(modules: Sequence[str] = DEFAULT_MODULES, repeat: int = DEFAULT_REPEAT,
+                    preload: Sequence[str] = DEFAULT_PRELOAD) -> List[Dict]:
+    """
+    Mesure plusieurs modules (médiane sur plusieurs interpréteurs)
+
+    Args:
+        modules: Modules mesurés
+        repeat: Nombre de mesures par module
+        preload: Modules importés avant chaque mesure
+
+    Returns:
+        Liste triée par temps décroissant
+    """
+    resultats = []
+    for module in modules:
+        mesures = [measure_import(module, preload) for _ in range(repeat)]
+        mediane = statistics.median(m['total_ms'] for m in mesures)
+        resultat = min(mesures, key=lambda m: abs(m['total_ms'] - mediane))
+        resultats.append(dict(resultat, total_ms=mediane))
+    return sorted(resultats, key=lambda r: r['total_ms'], reverse=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Point d'entrée en ligne de commande"""
+    parser = argparse.ArgumentParser(description="Temps d'import des modules de l'application")
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--preload', nargs='*', default=list(DEFAULT_PRELOAD),
+                        help="Modules déjà chargés (défaut : streamlit)")
+    parser.add_argument('--output', default=None, help="Fichier JSON des résultats")
+    args = parser.parse_args(argv)
+
+    resultats = measure_imports(args.modules, args.repeat, args.preload)
+    for r in resultats:
+        deps = ', '.join(f"{d['module']} {d['self_ms']:.1f}" for d in r['dependances'][:3])
+        print(f"{r['module']:<28} {r['total_ms']:>8.1f} ms   ({deps})", file=sys.stderr)
+
+    contenu = json.dumps({'preload': args.preload, 'resultats': resultats},
+                         indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(contenu)
+    else:
+        print(contenu)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
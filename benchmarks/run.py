@@ -0,0 +1,491 @@
+"""
+Benchmarks des chemins critiques (chargement, analyses de marché, simulation)
+
+Usage (depuis la racine du projet) :
+    python -m benchmarks.run                          # jeu synthétique par défaut
+    python -m benchmarks.run --communes 90000 --years 2000-2024
+    python -m benchmarks.run --data-dir data --years 2017,2022-2024
+    python -m benchmarks.run --save-baseline          # enregistre la référence
+
+Les résultats sont écrits en JSON (--output, sinon sortie standard) et
+comparés à la référence enregistrée (benchmarks/baseline.json) : le code de
+sortie vaut 1 si un benchmark est plus lent que la référence au-delà de la
+tolérance.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_communes_insee, write_synthetic_dataset
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+DEFAULT_COMMUNES = 35000
+DEFAULT_YEARS = '2014-2024'
+DEFAULT_REPEAT = 5
+# Écart relatif toléré avant de signaler une régression (bruit de mesure)
+DEFAULT_TOLERANCE = 0.25
+
+# Nombre d'appels par mesure pour les fonctions unitaires rapides
+APPELS_COMMUNE = 200
+APPELS_SCORE = 50
+APPELS_RECHERCHE = 50
+APPELS_CALCUL = 100
+APPELS_POSITIONNEMENT = 10000
+APPELS_COMPARABLES = 2000
+APPELS_CLASSEMENT = 200
+
+
+def parse_years(spec: str) -> List[int]:
+    """
+    Lit une liste d'années ('2014-2024' ou '2017,2022-2024')
+
+    Args:
+        spec: Spécification des années
+
+    Returns:
+        Liste triée des années
+    """
+    years = set()
+    for part in spec.split(','):
+        debut, _, fin = part.strip().partition('-')
+        years.update(range(int(debut), int(fin or debut) + 1))
+    return sorted(years)
+
+
+def time_callable(fn: Callable[[int], None], repeat: int, warmup: int = 1) -> List[float]:
+    """
+    Mesure les durées d'exécution d'une fonction
+
+    Args:
+        fn: Fonction appelée avec le numéro d'itération (les échauffements ont
+            des numéros négatifs)
+        repeat: Nombre de mesures
+        warmup: Nombre d'exécutions non mesurées
+
+    Returns:
+        Durées en secondes
+    """
+    for i in range(warmup):
+        fn(-1 - i)
+    durees = []
+    for i in range(repeat):
+        debut = time.perf_counter()
+        fn(i)
+        durees.append(time.perf_counter() - debut)
+    return durees
+
+
+class BenchmarkContext:
+    """Données partagées par les benchmarks (jeu DVF, référentiel, échantillons)"""
+
+    def __init__(self, years: List[int], seed: int = 0, synthetic: bool = True):
+        """
+        Args:
+            years: Années chargées
+            seed: Graine des échantillons
+            synthetic: Jeu synthétique (référentiel de communes généré) ou données réelles
+        """
+        self.years = years
+        self.synthetic = synthetic
+        self.rng = np.random.default_rng(seed)
+        self.seed = seed
+        self.df: Optional[pd.DataFrame] = None
+        self.communes_ref: Optional[pd.DataFrame] = None
+
+    def sample_communes(self, size: int, iteration: int) -> List[str]:
+        """
+        Échantillon de communes propre à chaque itération
+
+        Les échantillons successifs ne se recouvrent pas : les résultats mis
+        en cache (memoize du store) par une itération ne profitent pas à la suivante.
+        """
+        communes = self._communes_order
+        debut = ((iteration + 2) * size) % max(len(communes), 1)
+        return [communes[(debut + k) % len(communes)] for k in range(size)]
+
+    def prepare(self) -> None:
+        from utils.dvf_loader import load_dvf_data
+        from utils.dvf_store import get_store
+        from utils.communes_insee import load_communes_insee
+
+        self.df = load_dvf_data(self.years)
+        communes = get_store(self.df).communes
+        self._communes_order = list(self.rng.permutation(communes))
+
+        if self.synthetic:
+            self.communes_ref = generate_communes_insee(communes, self.seed)
+        else:
+            self.communes_ref = load_communes_insee()
+
+
+def _bench_load(ctx: BenchmarkContext, disk_cache: bool) -> Callable[[int], None]:
+    from utils.dvf_cache import clear_cache
+    from utils.dvf_loader import clear_dvf_store, load_dvf_data
+
+    def run(_):
+        clear_dvf_store()
+        if not disk_cache:
+            clear_cache()
+        load_dvf_data(ctx.years)
+    return run
+
+
+def _bench_commune_data(ctx: BenchmarkContext) -> Callable[[int], None]:
+    from utils.dvf_loader import get_commune_data
+
+    def run(i):
+        for code in ctx.sample_communes(APPELS_COMMUNE, i):
+            get_commune_data(ctx.df, code)
+    return run
+
+
+def _bench_market_score(ctx: BenchmarkContext) -> Callable[[int], None]:
+    from utils.market_analysis import calculate_market_score
+
+    def run(i):
+        for code in ctx.sample_communes(APPELS_SCORE, i):
+            calculate_market_score(ctx.df, code)
+    return run
+
+
+def _bench_panel(ctx: BenchmarkContext) -> Callable[[int], None]:
+    from utils.dvf_panel import DVFPanel
+    from utils.dvf_store import get_store
+
+    store = get_store(ctx.df)
+
+    def run(_):
+        # Pivot complet (sans le memoize du store) puis indicateurs de toutes les communes
+        DVFPanel(store).indicators('prix_m2_moyen')
+    return run
+
+
+def _bench_trends(ctx: BenchmarkContext) -> Callable[[int], None]:
+    from utils.dvf_panel import DVFPanel
+    from utils.dvf_store import get_store
+
+    store = get_store(ctx.df)
+
+    def run(_):
+        # Régression (moindres carrés et Theil-Sen) de toutes les communes
+        DVFPanel(store).trends('prix_m2_moyen', robust=True)
+    return run
+
+
+def _bench_positioning(ctx: BenchmarkContext) -> Callable[[int], None]:
+    from utils.price_quantiles import get_price_quantiles
+
+    quantiles = get_price_quantiles(ctx.df)
+    prix = ctx.rng.uniform(800, 12_000, APPELS_POSITIONNEMENT)
+
+    def run(i):
+        # Un lot d'annonces réparties sur des communes tirées au hasard
+        codes = ctx.sample_communes(APPELS_POSITIONNEMENT, i)
+        quantiles.position(prix, codes)
+    return run
+
+
+def _bench_comparables(ctx: BenchmarkContext) -> Callable[[int], None]:
+    from utils.comparables import get_comparables_index
+
+    index = get_comparables_index(ctx.df)
+    requetes = pd.DataFrame({
+        'surface': ctx.rng.uniform(20, 150, APPELS_COMPARABLES),
+        'prix_m2': ctx.rng.uniform(800, 12_000, APPELS_COMPARABLES),
+        'annee': ctx.rng.choice(ctx.years, APPELS_COMPARABLES),
+    })
+
+    def run(i):
+        # Un lot de biens répartis sur des communes tirées au hasard (arbres déjà construits)
+        requetes['insee_com'] = ctx.sample_communes(APPELS_COMPARABLES, i)
+        index.query(requetes, k=10)
+    return run
+
+
+def _bench_top_communes(ctx: BenchmarkContext) -> Callable[[int], None]:
+    from utils.dvf_loader import get_top_communes
+    from utils.dvf_store import get_store
+    from utils.hierarchy import departement_from_code
+
+    annees = get_store(ctx.df).years
+    get_top_communes(ctx.df)
+
+    def run(i):
+        # Classements filtrés par département, période et volume de mutations
+        for k, code in enumerate(ctx.sample_communes(APPELS_CLASSEMENT, i)):
+            get_top_communes(ctx.df, 'prix_m2_moyen', 20, k % 2 == 0,
+                             level='departement', code=departement_from_code(code),
+                             start=annees[k % len(annees)], end=annees[-1],
+                             min_mutations=(k % 3) * 50)
+    return run
+
+
+def _bench_search(ctx: BenchmarkContext) -> Callable[[int], None]:
+    from utils.communes_insee import create_commune_search_dict, search_communes
+    from utils.dvf_store import get_store
+
+    code_to_name, _ = create_commune_search_dict(ctx.communes_ref)
+    available = get_store(ctx.df).communes
+    noms = list(code_to_name.values())
+    codes = list(code_to_name)
+
+    # Requêtes variées : préfixes de noms, mots, codes, fautes de frappe
+    requetes = []
+    for k in range(APPELS_RECHERCHE):
+        nom = noms[int(ctx.rng.integers(len(noms)))]
+        genre = k % 4
+        if genre == 0:
+            requetes.append(nom[:4])
+        elif genre == 1:
+            requetes.append(nom.split('-')[0].split(' ')[-1][:6])
+        elif genre == 2:
+            requetes.append(codes[int(ctx.rng.integers(len(codes)))][:3])
+        else:
+            requetes.append(nom[:3] + nom[4:3:-1] + nom[3:4] + nom[5:8])
+
+    def run(_):
+        for requete in requetes:
+            search_communes(requete, code_to_name, available)
+    return run
+
+
+def _bench_search_dict(ctx: BenchmarkContext) -> Callable[[int], None]:
+    from utils.communes_insee import create_commune_search_dict
+
+    def run(_):
+        create_commune_search_dict(ctx.communes_ref)
+    return run
+
+
+def _bench_loan_schedule(ctx: BenchmarkContext) -> Callable[[int], None]:
+    from utils.financial_calculator import calculate_loan_schedule
+
+    montants = ctx.rng.uniform(50_000, 500_000, APPELS_CALCUL)
+    taux = ctx.rng.uniform(1, 6, APPELS_CALCUL).round(2)
+    durees = ctx.rng.choice([10, 15, 20, 25], APPELS_CALCUL)
+
+    def run(_):
+        for montant, t, duree in zip(montants, taux, durees):
+            calculate_loan_schedule(float(montant), float(t), int(duree))
+    return run
+
+
+def _bench_investissement(ctx: BenchmarkContext) -> Callable[[int], None]:
+    from utils.simulation import calculer_investissement
+
+    prix = ctx.rng.uniform(80_000, 600_000, APPELS_CALCUL).round()
+    surfaces = ctx.rng.uniform(15, 120, APPELS_CALCUL).round()
+    scenarios = [
+        (float(p), float(s), float(p) * 0.1, 3.8, 20, float(s) * 14, 30, 5000, 0.075,
+         800, 30, 5, 2.0, 1.5)
+        for p, s in zip(prix, surfaces)
+    ]
+
+    def run(_):
+        for scenario in scenarios:
+            calculer_investissement(*scenario)
+    return run
+
+
+# Benchmarks : nom -> (fabrique de la fonction mesurée, appels par mesure)
+BENCHMARKS = {
+    'load_dvf_data': (lambda ctx: _bench_load(ctx, disk_cache=True), 1),
+    'load_dvf_data_sans_cache': (lambda ctx: _bench_load(ctx, disk_cache=False), 1),
+    'get_commune_data': (_bench_commune_data, APPELS_COMMUNE),
+    'calculate_market_score': (_bench_market_score, APPELS_SCORE),
+    'panel_indicateurs': (_bench_panel, 1),
+    'tendances_communes': (_bench_trends, 1),
+    'positionnement_prix': (_bench_positioning, APPELS_POSITIONNEMENT),
+    'comparables': (_bench_comparables, APPELS_COMPARABLES),
+    'top_communes': (_bench_top_communes, APPELS_CLASSEMENT),
+    'search_communes': (_bench_search, APPELS_RECHERCHE),
+    'create_commune_search_dict': (_bench_search_dict, 1),
+    'calculate_loan_schedule': (_bench_loan_schedule, APPELS_CALCUL),
+    'calculer_investissement': (_bench_investissement, APPELS_CALCUL)
+}
+
+
+def run_benchmarks(ctx: BenchmarkContext, repeat: int = DEFAULT_REPEAT,
+                   selection: Optional[List[str]] = None,
+                   progress: Optional[Callable[[str], None]] = None) -> Dict:
+    """
+    Exécute les benchmarks
+
+    Args:
+        ctx: Contexte (voir BenchmarkContext)
+        repeat: Nombre de mesures par benchmark
+        selection: Noms des benchmarks à exécuter (None = tous)
+        progress: Fonction optionnelle appelée avec le nom du benchmark en cours
+
+    Returns:
+        Dictionnaire nom -> statistiques (secondes par mesure et par appel)
+    """
+    # Les benchmarks de chargement passent en premier ; les autres partagent
+    # ensuite les données chargées une seule fois
+    ctx_ready = False
+    results = {}
+    for name, (factory, appels) in BENCHMARKS.items():
+        if selection and name not in selection:
+            continue
+        if progress is not None:
+            progress(name)
+        if not name.startswith('load_dvf_data') and not ctx_ready:
+            ctx.prepare()
+            ctx_ready = True
+        durees = time_callable(factory(ctx), repeat)
+        mediane = statistics.median(durees)
+        results[name] = {
+            'appels': appels,
+            'min_s': min(durees),
+            'mediane_s': mediane,
+            'moyenne_s': statistics.fmean(durees),
+            'par_appel_s': mediane / appels
+        }
+    return results
+
+
+def compare_to_baseline(results: Dict, baseline: Dict,
+                        tolerance: float = DEFAULT_TOLERANCE) -> Dict:
+    """
+    Compare des résultats à une référence (médianes)
+
+    Args:
+        results: Résultats de run_benchmarks
+        baseline: Résultats de référence
+        tolerance: Écart relatif toléré
+
+    Returns:
+        Dictionnaire nom -> {'reference_s', 'mediane_s', 'ratio', 'statut'}
+    """
+    comparaison = {}
+    for name, mesure in results.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]['mediane_s']
+        ratio = mesure['mediane_s'] / reference if reference > 0 else float('inf')
+        if ratio > 1 + tolerance:
+            statut = 'regression'
+        elif ratio < 1 / (1 + tolerance):
+            statut = 'amelioration'
+        else:
+            statut = 'stable'
+        comparaison[name] = {'reference_s': reference, 'mediane_s': mesure['mediane_s'],
+                             'ratio': ratio, 'statut': statut}
+    return comparaison
+
+
+def _environment(args, n_lignes: int, n_communes: int, memoire: int) -> Dict:
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plateforme': platform.platform(),
+        'source': args.data_dir or 'synthetique',
+        'communes': n_communes,
+        'annees': parse_years(args.years),
+        'lignes': n_lignes,
+        'memoire_octets': memoire,
+        'graine': args.seed,
+        'repetitions': args.repeat
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Point d'entrée en ligne de commande"""
+    parser = argparse.ArgumentParser(description="Benchmarks du simulateur immobilier")
+    parser.add_argument('--communes', type=int, default=DEFAULT_COMMUNES,
+                        help="Nombre de communes du jeu synthétique")
+    parser.add_argument('--years', default=DEFAULT_YEARS,
+                        help="Années (ex: 2014-2024 ou 2017,2022-2024)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=None,
+                        help="Dossier de fichiers dvfYYYY.csv réels (au lieu du jeu synthétique)")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=None)
+    parser.add_argument('--output', default=None, help="Fichier JSON des résultats")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Enregistrer les résultats comme nouvelle référence")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    years = parse_years(args.years)
+    workdir = tempfile.mkdtemp(prefix='immo_bench_')
+    env_precedent = {k: os.environ.get(k) for k in ('DVF_DATA_DIR', 'DVF_CACHE_DIR')}
+    try:
+        if args.data_dir is None:
+            data_dir = os.path.join(workdir, 'data')
+            print(f"Génération du jeu synthétique ({args.communes:,} communes, "
+                  f"{len(years)} années)...", file=sys.stderr)
+            write_synthetic_dataset(data_dir, args.communes, years, args.seed)
+        else:
+            data_dir = args.data_dir
+        os.environ['DVF_DATA_DIR'] = data_dir
+        os.environ['DVF_CACHE_DIR'] = os.path.join(workdir, 'cache')
+
+        ctx = BenchmarkContext(years, args.seed, synthetic=args.data_dir is None)
+        results = run_benchmarks(ctx, args.repeat, args.only,
+                                 lambda name: print(f"  {name}", file=sys.stderr))
+        if ctx.df is None:
+            ctx.prepare()
+        n_communes = ctx.df['insee_com'].nunique() if 'insee_com' in ctx.df.columns else 0
+        memoire = int(ctx.df.memory_usage(deep=True).sum())
+        rapport = {'environnement': _environment(args, len(ctx.df), n_communes, memoire),
+                   'resultats': results}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        for key, value in env_precedent.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        env_ref = baseline.get('environnement', {})
+        if any(env_ref.get(k) != rapport['environnement'][k] for k in ('source', 'lignes', 'graine')):
+            print("Attention : la référence a été mesurée sur un autre jeu de données",
+                  file=sys.stderr)
+        rapport['comparaison'] = compare_to_baseline(results, baseline['resultats'], args.tolerance)
+        regressions = [n for n, c in rapport['comparaison'].items() if c['statut'] == 'regression']
+
+    # Résumé lisible sur la sortie d'erreur, JSON sur la sortie standard ou dans un fichier
+    for name, mesure in results.items():
+        ligne = f"{name:<28} {mesure['mediane_s'] * 1000:>10.2f} ms  ({mesure['par_appel_s'] * 1e6:,.0f} µs/appel)"
+        if name in rapport.get('comparaison', {}):
+            c = rapport['comparaison'][name]
+            ligne += f"  x{c['ratio']:.2f} {c['statut']}"
+        print(ligne, file=sys.stderr)
+
+    contenu = json.dumps(rapport, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(contenu)
+    else:
+        print(contenu)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(contenu)
+        print(f"Référence enregistrée : {args.baseline}", file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Génération de jeux de données DVF synthétiques (commune × année) pour les benchmarks
+
+Les distributions imitent les fichiers réels : prix au m² log-normaux avec
+une tendance propre à chaque commune, volumes à queue lourde, années sans
+mutation absentes du fichier. Le résultat est reproductible (graine fixe).
+"""
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from utils.dvf_ingest import write_dvf_csv
+
+# Départements métropolitains (les codes communes sont 'DDNNN')
+DEPARTEMENTS = [f'{d:02d}' for d in range(1, 96) if d != 20] + ['2A', '2B']
+COMMUNES_PAR_DEPARTEMENT = 999
+
+# Fragments des noms de communes synthétiques
+PREFIXES = ['', '', '', 'Saint-', 'Sainte-', 'Le ', 'La ', 'Les ']
+SYLLABES = ['ba', 'bel', 'bour', 'cha', 'cour', 'fon', 'gra', 'la', 'lan', 'mar',
+            'mon', 'mou', 'ne', 'pe', 'ri', 'roc', 'sau', 'ta', 'ter', 'vil', 'ville', 'zac']
+SUFFIXES = ['', '', '', '', '-sur-Loire', '-sur-Mer', '-les-Bains', '-en-Brie', '-le-Château']
+
+
+def synthetic_insee_codes(n_communes: int, seed: int = 0) -> np.ndarray:
+    """
+    Tire des codes INSEE synthétiques distincts et triés
+
+    Args:
+        n_communes: Nombre de communes
+        seed: Graine aléatoire
+
+    Returns:
+        Tableau de codes (chaînes de 5 caractères)
+    """
+    capacite = len(DEPARTEMENTS) * COMMUNES_PAR_DEPARTEMENT
+    if n_communes > capacite:
+        raise ValueError(f"Au plus {capacite} communes synthétiques")
+
+    rng = np.random.default_rng(seed)
+    positions = np.sort(rng.choice(capacite, size=n_communes, replace=False))
+    deps = np.asarray(DEPARTEMENTS, dtype=object)[positions // COMMUNES_PAR_DEPARTEMENT]
+    numeros = pd.Series(positions % COMMUNES_PAR_DEPARTEMENT + 1).astype(str).str.zfill(3)
+    return (pd.Series(deps) + numeros).to_numpy(dtype=object)
+
+
+def generate_dvf_panel(n_communes: int, years: List[int], seed: int = 0) -> pd.DataFrame:
+    """
+    Génère un tableau DVF commune × année au format normalisé
+
+    Args:
+        n_communes: Nombre de communes
+        years: Années générées
+        seed: Graine aléatoire
+
+    Returns:
+        DataFrame (colonnes de load_dvf_data), lignes à zéro mutation absentes
+    """
+    rng = np.random.default_rng(seed)
+    codes = synthetic_insee_codes(n_communes, seed)
+    n_years = len(years)
+
+    # Caractéristiques propres à chaque commune
+    prix_base = rng.lognormal(np.log(2500), 0.5, n_communes)
+    tendance = rng.normal(0.02, 0.02, n_communes)
+    taille = rng.lognormal(1.0, 1.3, n_communes)
+    part_maisons = rng.beta(4, 1.5, n_communes)
+
+    # Trajectoires annuelles (communes en ligne, années en colonne)
+    t = np.asarray(years, dtype=float) - years[0]
+    bruit = rng.normal(0, 0.06, (n_communes, n_years))
+    prix_m2 = prix_base[:, None] * np.exp(tendance[:, None] * t + bruit)
+    nb_mutations = rng.poisson(np.broadcast_to(taille[:, None], (n_communes, n_years)))
+    nb_maisons = rng.binomial(nb_mutations, part_maisons[:, None])
+    surface = np.clip(rng.normal(55 + 45 * part_maisons[:, None], 12, (n_communes, n_years)), 15, None)
+
+    presentes = nb_mutations > 0
+    nb = nb_mutations[presentes]
+    maisons = nb_maisons[presentes]
+    df = pd.DataFrame({
+        'insee_com': np.repeat(codes, n_years).reshape(n_communes, n_years)[presentes],
+        'annee': np.broadcast_to(np.asarray(years), (n_communes, n_years))[presentes],
+        'nb_mutations': nb,
+        'nb_maisons': maisons,
+        'nb_apparts': nb - maisons,
+        'prop_maison': (maisons / nb * 100).round(1),
+        'prop_appart': ((nb - maisons) / nb * 100).round(1),
+        'prix_moyen': (prix_m2 * surface)[presentes].round(),
+        'prix_m2_moyen': prix_m2[presentes].round(),
+        'surface_moy': surface[presentes].round()
+    })
+    return df.sort_values(['annee', 'insee_com'], kind='stable').reset_index(drop=True)
+
+
+def generate_communes_insee(codes, seed: int = 0) -> pd.DataFrame:
+    """
+    Génère un référentiel de communes au format du fichier INSEE
+
+    Args:
+        codes: Codes INSEE des communes
+        seed: Graine aléatoire
+
+    Returns:
+        DataFrame avec colonnes 'TYPECOM', 'COM', 'DEP', 'LIBELLE'
+    """
+    rng = np.random.default_rng(seed)
+    n = len(codes)
+
+    def choix(valeurs):
+        return pd.Series(np.asarray(valeurs, dtype=object)[rng.integers(0, len(valeurs), n)])
+
+    racine = choix(SYLLABES) + choix(SYLLABES)
+    racine = racine.where(rng.random(n) < 0.5, racine + choix(SYLLABES))
+    noms = choix(PREFIXES) + racine.str.capitalize() + choix(SUFFIXES)
+
+    codes = pd.Series(np.asarray(codes, dtype=object))
+    return pd.DataFrame({'TYPECOM': 'COM', 'COM': codes, 'DEP': codes.str[:2], 'LIBELLE': noms})
+
+
+def write_synthetic_dataset(directory: str, n_communes: int, years: List[int],
+                            seed: int = 0) -> Dict[int, str]:
+    """
+    Écrit un jeu DVF synthétique au format data/dvfYYYY.csv
+
+    Args:
+        directory: Dossier de sortie
+        n_communes: Nombre de communes
+        years: Années générées
+        seed: Graine aléatoire
+
+    Returns:
+        Dictionnaire année -> chemin du fichier écrit
+    """
+    df = generate_dvf_panel(n_communes, years, seed)
+    paths = {}
+    for year, rows in df.groupby('annee'):
+        path = os.path.join(directory, f'dvf{year}.csv')
+        write_dvf_csv(rows, path)
+        paths[int(year)] = path
+    return paths
+
@@ -0,0 +1,122 @@
+"""
+Panneau de diagnostic des performances (accessible via ?diagnostics=1)
+"""
+from datetime import datetime
+
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+from utils import profiling
+
+
+def show_diagnostics():
+    """Affiche les mesures de l'instrumentation et l'empreinte mémoire des données"""
+    st.header("Diagnostics de performance")
+    show_profiling()
+    show_memory()
+
+
+def show_profiling():
+    """Affiche les mesures de l'instrumentation (voir utils.profiling)"""
+    if not profiling.ENABLED:
+        st.info("Instrumentation désactivée. Relancez l'application avec la variable "
+                "d'environnement `IMMO_PROFILE=1` (et `IMMO_PROFILE_FILE=mesures.jsonl` "
+                "pour un export continu).")
+        return
+
+    profiler = profiling.PROFILER
+    summary = profiler.summary()
+    if summary.empty:
+        st.info("Aucune mesure pour l'instant : utilisez l'application puis revenez ici.")
+        return
+
+    lookups = summary['hits'].sum() + summary['misses'].sum()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Points mesurés", len(summary))
+        st.caption(f"{int(summary['appels'].sum()):,} appels")
+    with col2:
+        sections = summary[summary['type'] == 'section']
+        st.metric("Temps des sections", f"{sections['total_s'].sum():.2f} s")
+    with col3:
+        taux = summary['hits'].sum() / lookups * 100 if lookups else 0
+        st.metric("Taux de hit des caches", f"{taux:.1f}%")
+    with col4:
+        st.metric("Mesures en mémoire", f"{len(profiler.events):,}")
+        if profiler.export_path:
+            st.caption(f"Export : `{profiler.export_path}`")
+
+    types = sorted(summary['type'].unique())
+    choix = st.multiselect("Types de mesures", types, default=types, key="diag_types")
+    vue = summary[summary['type'].isin(choix)]
+
+    top = vue.head(20).iloc[::-1]
+    fig = go.Figure(go.Bar(x=top['total_s'], y=top['nom'], orientation='h',
+                           text=top['type'], marker_color='#3498db'))
+    fig.update_layout(title="Temps total par point de mesure", xaxis_title="Temps total (s)",
+                      height=max(300, 28 * len(top)))
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(
+        vue.assign(total_ms=vue['total_s'] * 1000, moyenne_ms=vue['moyenne_s'] * 1000,
+                   max_ms=vue['max_s'] * 1000)
+           [['nom', 'type', 'appels', 'total_ms', 'moyenne_ms', 'max_ms', 'hits', 'misses', 'taux_hit']]
+           .style.format({'total_ms': '{:,.1f}', 'moyenne_ms': '{:,.2f}', 'max_ms': '{:,.1f}',
+                          'taux_hit': '{:.1f}%'}, na_rep='-'),
+        use_container_width=True, hide_index=True
+    )
+
+    with st.expander("Dernières mesures"):
+        recentes = pd.DataFrame(profiler.recent_events(200)[::-1])
+        if not recentes.empty:
+            recentes['heure'] = pd.to_datetime(recentes['ts'], unit='s').dt.strftime('%H:%M:%S.%f')
+            recentes['duree_ms'] = recentes['duree_s'] * 1000
+            st.dataframe(recentes[['heure', 'nom', 'type', 'duree_ms', 'cache', 'thread']],
+                         use_container_width=True, hide_index=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Exporter les mesures (JSONL)", profiler.to_jsonl(),
+                           file_name=f"mesures_{datetime.now():%Y%m%d_%H%M%S}.jsonl",
+                           mime="application/jsonl", key="diag_export")
+    with col2:
+        if st.button("Réinitialiser les mesures", key="diag_reset"):
+            profiler.reset()
+            st.rerun()
+
+
+def show_memory():
+    """Affiche l'empreinte mémoire des données DVF (voir utils.dvf_memory)"""
+    st.subheader("Mémoire des données DVF")
+    if not st.toggle("Analyser la mémoire (charge les données DVF si nécessaire)",
+                     key="diag_memoire"):
+        return
+
+    from utils.dvf_loader import load_dvf_store
+    from utils.dvf_memory import memory_report
+
+    rapport = memory_report(load_dvf_store())
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total", f"{rapport['total'] / 1e6:,.1f} Mo")
+    with col2:
+        st.metric("Données", f"{rapport['total_donnees'] / 1e6:,.1f} Mo")
+    with col3:
+        st.metric("Index du store", f"{rapport['total_index'] / 1e6:,.1f} Mo")
+    with col4:
+        st.metric("Résultats en cache", f"{rapport['total_cache'] / 1e6:,.1f} Mo")
+        st.caption(f"{len(rapport['cache']):,} entrées")
+
+    st.dataframe(
+        rapport['colonnes'].style.format({'octets': '{:,.0f}', 'octets_par_ligne': '{:.1f}',
+                                          'part_pct': '{:.1f}%'}),
+        use_container_width=True, hide_index=True
+    )
+    col1, col2 = st.columns(2)
+    with col1:
+        st.dataframe(rapport['index'].style.format({'octets': '{:,.0f}'}),
+                     use_container_width=True, hide_index=True)
+    with col2:
+        st.dataframe(rapport['cache'].style.format({'octets': '{:,.0f}'}),
+                     use_container_width=True, hide_index=True)
@@ -2,18 +2,16 @@
 Page d'analyse du marché immobilier avec données DVF
 """
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import plotly.express as px
 from utils.dvf_loader import (
-    load_dvf_data, get_communes_list, get_commune_data,
-    get_market_stats, calculate_market_evolution, get_top_communes
-)
-from utils.market_analysis import (
-    analyze_price_trends, calculate_market_liquidity,
-    compare_to_market, calculate_market_score,
-    get_investment_recommendation
+    load_dvf_store, get_communes_list, get_market_stats, get_top_communes, calculate_market_evolution
 )
+from utils.market_report import build_commune_report
+from utils.dvf_panel import cagr, get_panel, get_trend_table
+from utils.dvf_store import get_store, store_cached
+from utils.profiling import instrument_streamlit, section
 
 # CSS pour fond noir
 st.markdown("""
@@ -40,6 +38,9 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# Mesure des graphiques et tableaux (si IMMO_PROFILE=1)
+instrument_streamlit()
+
 
 def show_market_analysis():
     """Affiche la page d'analyse du marché"""
@@ -49,33 +50,28 @@ def show_market_analysis():
     
     # Charger les données
     with st.spinner("Chargement des données DVF..."):
-        df = load_dvf_data()
+        store = load_dvf_store()
+        df = store.df
     
     if df.empty:
         st.error("Aucune donnée DVF disponible. Vérifiez que les fichiers sont présents dans le dossier /data")
         return
     
-    st.success(f"{len(df):,} enregistrements chargés ({df['annee'].min():.0f}-{df['annee'].max():.0f})")
-    
-    # Tabs pour différentes analyses
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "Recherche par Commune",
-        "Tendances du Marché",
-        "Top Communes",
-        "Vue d'Ensemble"
-    ])
-    
-    with tab1:
-        show_commune_search(df)
-    
-    with tab2:
-        show_market_trends(df)
+    st.success(f"{len(df):,} enregistrements chargés ({store.years[0]}-{store.years[-1]})")
     
-    with tab3:
-        show_top_communes(df)
+    # Une seule analyse calculée à chaque exécution (des onglets les exécuteraient toutes)
+    analyses = {
+        "Recherche par Commune": show_commune_search,
+        "Tendances du Marché": show_market_trends,
+        "Top Communes": show_top_communes,
+        "Régions & Départements": show_territories,
+        "Vue d'Ensemble": show_market_overview
+    }
+    choix = st.radio("Analyse", list(analyses), horizontal=True,
+                     label_visibility="collapsed", key="market_analyse")
     
-    with tab4:
-        show_market_overview(df)
+    with section(f"Marché : {choix}"):
+        analyses[choix](df)
 
 
 def show_commune_search(df: pd.DataFrame):
@@ -85,14 +81,8 @@ def show_commune_search(df: pd.DataFrame):
     # Charger les données INSEE
     try:
         from utils.communes_insee import (
-            load_communes_insee, create_commune_search_dict, 
-            search_communes, format_commune_option, get_code_from_formatted
+            load_commune_search_index, format_commune_option, get_code_from_formatted
         )
-        from utils.dvf_loader import get_communes_list
-        
-        df_insee = load_communes_insee()
-        code_to_name, name_to_code = create_commune_search_dict(df_insee)
-        available_codes = get_communes_list(df)
         
         col1, col2 = st.columns([2, 1])
         
@@ -106,8 +96,11 @@ def show_commune_search(df: pd.DataFrame):
         commune = None
         
         if search_input and len(search_input) >= 2:
+            # Index construit à la première recherche
+            search_index = load_commune_search_index()
+            
             # Rechercher les communes
-            results = search_communes(search_input, code_to_name, available_codes, max_results=30)
+            results = search_index.search(search_input, max_results=30)
             
             if results:
                 # Créer les options formatées
@@ -166,10 +159,10 @@ def show_commune_search(df: pd.DataFrame):
     if not commune:
         return
     
-    # Récupérer les données de la commune
-    df_commune = get_commune_data(df, commune)
+    # Rapport de marché de la commune (un seul filtrage et un seul groupby)
+    report = build_commune_report(get_store(df), commune)
     
-    if df_commune.empty:
+    if report.empty:
         st.warning(f"Aucune donnée pour la commune {commune}")
         return
     
@@ -179,7 +172,7 @@ def show_commune_search(df: pd.DataFrame):
     
     # Calculer les stats
     prop_type = 'all' if property_type == "Tous" else property_type.lower()
-    stats = get_market_stats(df, commune, prop_type)
+    stats = report.stats if prop_type == 'all' else get_market_stats(df, commune, prop_type)
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -199,7 +192,7 @@ def show_commune_search(df: pd.DataFrame):
     st.markdown("---")
     st.subheader("Évolution des Prix")
     
-    evolution = calculate_market_evolution(df, commune)
+    evolution = report.evolution
     
     if not evolution.empty:
         # Graphique évolution prix/m²
@@ -243,21 +236,28 @@ def show_commune_search(df: pd.DataFrame):
         )
         
         st.plotly_chart(fig2, use_container_width=True)
+        st.caption("Variation annualisée depuis l'année disponible précédente "
+                   "(l'écart 2017 → 2022 est réparti sur 5 ans).")
         
         # Analyse des tendances
         st.markdown("---")
         st.subheader("Analyse du Marché")
         
-        trends = analyze_price_trends(df, commune)
-        liquidity = calculate_market_liquidity(df, commune)
-        market_score = calculate_market_score(df, commune)
+        trends = report.trends
+        liquidity = report.liquidity
+        market_score = report.score
         
         col1, col2, col3 = st.columns(3)
         
         with col1:
             st.info("**Tendance**")
             st.write(trends.get('tendance', 'Indéterminée'))
+            if not np.isnan(trends.get('pente_prix_m2', np.nan)):
+                st.caption(f"Pente: {trends['pente_prix_m2']:+.0f} €/m²/an "
+                           f"({trends['pente_relative_prix_m2']:+.2f}%/an, R² {trends['r2_tendance']:.2f})")
             st.caption(f"Variation moyenne: {trends.get('variation_prix_m2_annuelle', 0):.2f}%/an")
+            if not np.isnan(trends.get('volatilite_prix_m2', np.nan)):
+                st.caption(f"Volatilité: {trends['volatilite_prix_m2']:.1f}%/an")
         
         with col2:
             st.info("**Liquidité**")
@@ -280,7 +280,7 @@ def show_market_trends(df: pd.DataFrame):
     st.subheader("Tendances Globales du Marché")
     
     # Sélection de la période
-    years_available = sorted(df['annee'].unique())
+    years_available = get_store(df).years
     
     col1, col2 = st.columns(2)
     with col1:
@@ -289,16 +289,10 @@ def show_market_trends(df: pd.DataFrame):
         year_end = st.selectbox("Année de fin", years_available, 
                                index=len(years_available)-1)
     
-    # Filtrer par période
-    df_period = df[(df['annee'] >= year_start) & (df['annee'] <= year_end)]
-    
-    # Évolution nationale
-    evolution_nationale = df_period.groupby('annee').agg({
-        'prix_moyen': 'mean',
-        'prix_m2_moyen': 'mean',
-        'surface_moy': 'mean',
-        'nb_mutations': 'sum'
-    }).reset_index()
+    # Évolution nationale (calculée une fois par version des données), filtrée par période
+    evolution_nationale = calculate_market_evolution(df)
+    evolution_nationale = evolution_nationale[(evolution_nationale['annee'] >= year_start) &
+                                              (evolution_nationale['annee'] <= year_end)]
     
     # Graphique prix moyen
     col1, col2 = st.columns(2)
@@ -357,12 +351,15 @@ def show_market_trends(df: pd.DataFrame):
     st.markdown("---")
     st.subheader("Statistiques de la Période")
     
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         variation = ((evolution_nationale['prix_m2_moyen'].iloc[-1] / 
                      evolution_nationale['prix_m2_moyen'].iloc[0] - 1) * 100)
         st.metric("Variation Prix/m²", f"{variation:+.2f}%")
+        croissance = cagr(evolution_nationale['prix_m2_moyen'], evolution_nationale['annee'])[0]
+        if not np.isnan(croissance):
+            st.caption(f"Soit {croissance * 100:+.2f}%/an")
     
     with col2:
         total_mutations = evolution_nationale['nb_mutations'].sum()
@@ -371,6 +368,49 @@ def show_market_trends(df: pd.DataFrame):
     with col3:
         avg_surface = evolution_nationale['surface_moy'].mean()
         st.metric("Surface Moyenne", f"{avg_surface:.0f} m²")
+    
+    with col4:
+        # Taux annuel de chaque commune sur la période (panel commune × année)
+        croissances = get_panel(df).cagr('prix_m2_moyen', year_start, year_end)
+        croissances = croissances[~np.isnan(croissances)]
+        if len(croissances):
+            st.metric("Communes en hausse", f"{(croissances > 0).mean() * 100:.0f}%")
+            st.caption(f"Médiane : {np.median(croissances) * 100:+.2f}%/an "
+                       f"({len(croissances):,} communes)")
+    
+    # Tendance linéaire de chaque commune sur la période (table mise en cache)
+    st.markdown("---")
+    st.subheader("Tendances par Commune")
+    
+    tendances = get_trend_table(df, start=year_start, end=year_end)
+    tendances = tendances[tendances['pente'].notna()]
+    
+    if tendances.empty:
+        st.info("Sélectionnez au moins deux années pour estimer les tendances.")
+    else:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Pente médiane", f"{tendances['pente'].median():+.0f} €/m²/an")
+        with col2:
+            st.metric("Pente relative médiane", f"{tendances['pente_relative'].median():+.2f}%/an")
+        with col3:
+            # Hausse significative : pente supérieure à deux erreurs types
+            avec_erreur = tendances[tendances['erreur_type'].notna()]
+            if not avec_erreur.empty:
+                significatives = (avec_erreur['pente'] > 2 * avec_erreur['erreur_type']).mean()
+                st.metric("Hausses significatives", f"{significatives * 100:.0f}%")
+                st.caption(f"Parmi {len(avec_erreur):,} communes avec 3 années ou plus")
+        
+        pentes = tendances['pente_relative'].clip(-20, 20)
+        fig4 = go.Figure(go.Histogram(x=pentes, nbinsx=80, marker_color='#e67e22'))
+        fig4.update_layout(
+            title="Distribution des pentes relatives du prix/m² (bornées à ±20 %/an)",
+            xaxis_title="Pente relative (%/an)",
+            yaxis_title="Nombre de communes",
+            height=350,
+            bargap=0
+        )
+        st.plotly_chart(fig4, use_container_width=True)
 
 
 def show_top_communes(df: pd.DataFrame):
@@ -397,11 +437,43 @@ def show_top_communes(df: pd.DataFrame):
     with col3:
         order = st.radio("Ordre", ["Plus élevé", "Plus faible"])
     
-    # Récupérer le top communes
+    from utils.hierarchy import get_hierarchy_cube, load_level_labels
+    
+    # Filtres : territoire, période et volume minimal de transactions
+    years_available = get_store(df).years
+    col1, col2, col3, col4, col5 = st.columns([1, 2, 1, 1, 1])
+    
+    with col1:
+        perimetre = st.selectbox("Périmètre", ["France", "Région", "Département"],
+                                 key="top_perimetre")
+    
+    level, code = None, None
+    if perimetre != "France":
+        level = 'region' if perimetre == "Région" else 'departement'
+        labels = load_level_labels(level)
+        codes = get_hierarchy_cube(df).tables[level].index.get_level_values(0).unique()
+        options = {f"{labels.get(c, c)} ({c})": c for c in codes}
+        with col2:
+            selected = st.selectbox(perimetre, list(options), key=f"top_{level}")
+        code = options.get(selected)
+    
+    with col3:
+        year_start = st.selectbox("Année de début", years_available, index=0, key="top_debut")
+    with col4:
+        year_end = st.selectbox("Année de fin", years_available,
+                                index=len(years_available)-1, key="top_fin")
+    with col5:
+        min_mutations = st.number_input("Mutations minimum", min_value=0, value=0, step=10,
+                                        key="top_min_mutations")
+    
+    # Récupérer le top communes (classements pré-triés, lecture en O(top_n))
     ascending = (order == "Plus faible")
-    top = get_top_communes(df, metric, top_n, ascending)
+    top = get_top_communes(df, metric, top_n, ascending, level=level, code=code,
+                           start=year_start, end=year_end, min_mutations=min_mutations)
     
-    if not top.empty:
+    if top.empty:
+        st.info("Aucune commune ne correspond à ces filtres")
+    else:
         # Graphique
         fig = go.Figure()
         fig.add_trace(go.Bar(
@@ -440,12 +512,127 @@ def show_top_communes(df: pd.DataFrame):
         st.dataframe(top_display, use_container_width=True, hide_index=True)
 
 
+def show_territories(df: pd.DataFrame):
+    """Affiche les indicateurs agrégés d'une région ou d'un département"""
+    st.subheader("Analyse par Région et Département")
+    
+    from utils.hierarchy import get_hierarchy_cube, load_level_labels
+    
+    # Tables pré-agrégées (construites une seule fois par jeu de données)
+    cube = get_hierarchy_cube(df)
+    
+    col1, col2 = st.columns([1, 2])
+    
+    with col1:
+        niveau = st.radio("Niveau", ["Région", "Département"], key="territoire_niveau")
+    
+    level, child_level, child_label = (
+        ('region', 'departement', "Départements") if niveau == "Région"
+        else ('departement', 'arrondissement', "Arrondissements")
+    )
+    labels = load_level_labels(level)
+    codes = cube.tables[level].index.get_level_values(0).unique()
+    options = {f"{labels.get(code, code)} ({code})": code for code in codes}
+    
+    with col2:
+        selected = st.selectbox(f"Sélectionnez un(e) {niveau.lower()}", list(options),
+                                key=f"territoire_{level}")
+    
+    if not selected:
+        return
+    code = options[selected]
+    evolution = cube.get(level, code).reset_index()
+    if evolution.empty:
+        st.warning("Données insuffisantes")
+        return
+    
+    derniere = evolution.iloc[-1]
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric(f"Prix/m² Moyen {derniere['annee']:.0f}", f"{derniere['prix_m2_moyen']:,.0f} €")
+    with col2:
+        st.metric("Prix Moyen", f"{derniere['prix_moyen']:,.0f} €")
+    with col3:
+        st.metric("Mutations", f"{derniere['nb_mutations']:,.0f}")
+    with col4:
+        st.metric("Communes", f"{derniere['nb_communes']:,.0f}")
+    
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=evolution['annee'],
+        y=evolution['prix_m2_moyen'],
+        mode='lines+markers',
+        line=dict(color='#2ecc71', width=3)
+    ))
+    fig.update_layout(
+        title=f"Prix au m² moyen (pondéré par les mutations) - {selected}",
+        xaxis_title="Année",
+        yaxis_title="Prix/m² (€)",
+        height=400
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Détail par entité de niveau inférieur
+    st.markdown("---")
+    st.subheader(f"{child_label} ({derniere['annee']:.0f})")
+    
+    enfants = cube.children(level, code, child_level, year=derniere['annee']).reset_index()
+    if not enfants.empty:
+        child_labels = load_level_labels(child_level)
+        code_col = enfants.columns[0]
+        enfants.insert(0, 'Nom', enfants[code_col].map(child_labels).fillna(enfants[code_col]))
+        st.dataframe(
+            enfants[['Nom', code_col, 'nb_communes', 'nb_mutations', 'prix_moyen',
+                     'prix_m2_moyen', 'surface_moy']]
+            .sort_values('prix_m2_moyen', ascending=False)
+            .rename(columns={code_col: 'Code', 'nb_communes': 'Communes',
+                             'nb_mutations': 'Mutations', 'prix_moyen': 'Prix Moyen (€)',
+                             'prix_m2_moyen': 'Prix/m² (€)', 'surface_moy': 'Surface (m²)'})
+            .round(0),
+            use_container_width=True,
+            hide_index=True
+        )
+
+
+@store_cached
+def overview_data(df: pd.DataFrame) -> dict:
+    """
+    Indicateurs de la vue d'ensemble, calculés une fois par version des données
+
+    Args:
+        df: DataFrame DVF
+
+    Returns:
+        Dictionnaire (statistiques, histogramme des prix au m², répartition et
+        prix au m² par type de bien)
+    """
+    data = {'stats': get_market_stats(df)}
+
+    if 'prix_m2_moyen' in df.columns:
+        prix_m2 = df['prix_m2_moyen'].dropna().to_numpy(dtype=float)
+        data['histogramme'] = np.histogram(prix_m2, bins=50)
+
+    if 'nb_maisons' in df.columns and 'nb_apparts' in df.columns:
+        data['total_maisons'] = df['nb_maisons'].sum()
+        data['total_apparts'] = df['nb_apparts'].sum()
+
+    if 'prop_maison' in df.columns and 'prix_m2_moyen' in df.columns:
+        df_maisons = df[df['prop_maison'] > 80]
+        df_apparts = df[df['prop_appart'] > 80]
+        data['prix_maisons'] = df_maisons['prix_m2_moyen'].astype(float).mean() if not df_maisons.empty else 0
+        data['prix_apparts'] = df_apparts['prix_m2_moyen'].astype(float).mean() if not df_apparts.empty else 0
+
+    return data
+
+
 def show_market_overview(df: pd.DataFrame):
     """Affiche une vue d'ensemble du marché"""
     st.subheader("Vue d'Ensemble du Marché")
     
     # Statistiques globales
-    stats = get_market_stats(df)
+    data = overview_data(df)
+    stats = data['stats']
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -461,21 +648,24 @@ def show_market_overview(df: pd.DataFrame):
     with col4:
         st.metric("Total Mutations", f"{stats.get('total_mutations', 0):,.0f}")
     
-    # Distribution des prix
+    # Distribution des prix (classes précalculées : la figure ne transporte pas chaque ligne)
     st.markdown("---")
     st.subheader("Distribution des Prix au m²")
     
-    if 'prix_m2_moyen' in df.columns:
+    if 'histogramme' in data:
+        effectifs, bornes = data['histogramme']
         fig = go.Figure()
-        fig.add_trace(go.Histogram(
-            x=df['prix_m2_moyen'],
-            nbinsx=50,
+        fig.add_trace(go.Bar(
+            x=(bornes[:-1] + bornes[1:]) / 2,
+            y=effectifs,
+            width=np.diff(bornes),
             marker_color='#3498db'
         ))
         fig.update_layout(
             title="Répartition des Prix au m²",
             xaxis_title="Prix/m² (€)",
             yaxis_title="Nombre de Communes",
+            bargap=0,
             height=400
         )
         st.plotly_chart(fig, use_container_width=True)
@@ -487,13 +677,10 @@ def show_market_overview(df: pd.DataFrame):
     col1, col2 = st.columns(2)
     
     with col1:
-        if 'nb_maisons' in df.columns and 'nb_apparts' in df.columns:
-            total_maisons = df['nb_maisons'].sum()
-            total_apparts = df['nb_apparts'].sum()
-            
+        if 'total_maisons' in data:
             fig = go.Figure(data=[go.Pie(
                 labels=['Maisons', 'Appartements'],
-                values=[total_maisons, total_apparts],
+                values=[data['total_maisons'], data['total_apparts']],
                 hole=0.4,
                 marker_colors=['#3498db', '#e74c3c']
             )])
@@ -502,12 +689,8 @@ def show_market_overview(df: pd.DataFrame):
     
     with col2:
         # Prix moyen par type
-        if 'prop_maison' in df.columns and 'prix_m2_moyen' in df.columns:
-            df_maisons = df[df['prop_maison'] > 80]
-            df_apparts = df[df['prop_appart'] > 80]
-            
-            prix_maisons = df_maisons['prix_m2_moyen'].mean() if not df_maisons.empty else 0
-            prix_apparts = df_apparts['prix_m2_moyen'].mean() if not df_apparts.empty else 0
+        if 'prix_maisons' in data:
+            prix_maisons, prix_apparts = data['prix_maisons'], data['prix_apparts']
             
             fig = go.Figure(data=[go.Bar(
                 x=['Maisons', 'Appartements'],
@@ -2,13 +2,7 @@
 Page de simulation fiscale avancée
 """
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-from utils.financial_calculator import (
-    calculate_tax_lmnp, calculate_tax_pinel,
-    calculate_income_tax, calculate_social_charges,
-    calculate_wealth_tax
-)
+from utils.financial_calculator import calculate_tax_lmnp, calculate_tax_pinel
 
 # CSS pour fond noir
 st.markdown("""
@@ -59,6 +53,10 @@ def show_tax_simulation():
 
 def show_revenus_fonciers():
     """Simulation revenus fonciers classiques"""
+    # Imports différés : seul le régime choisi charge pandas et plotly
+    import pandas as pd
+    import plotly.graph_objects as go
+    
     st.subheader("Location Nue - Revenus Fonciers")
     
     col1, col2 = st.columns(2)
@@ -230,6 +228,10 @@ def show_revenus_fonciers():
 
 def show_lmnp():
     """Simulation LMNP"""
+    # Imports différés : seul le régime choisi charge pandas et plotly
+    import pandas as pd
+    import plotly.graph_objects as go
+    
     st.subheader("LMNP - Location Meublée Non Professionnelle")
     
     st.info("Le statut LMNP permet de déduire vos charges ET d'amortir votre bien")
@@ -423,6 +425,10 @@ def show_lmnp():
 
 def show_pinel():
     """Simulation Loi Pinel"""
+    # Imports différés : seul le régime choisi charge pandas et plotly
+    import pandas as pd
+    import plotly.graph_objects as go
+    
     st.subheader("Loi Pinel - Investissement Locatif Défiscalisé")
     
     st.info("La loi Pinel permet de réduire vos impôts en échange d'un engagement de location")
@@ -1,9 +1,7 @@
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-import numpy as np
 from datetime import datetime
+from utils.simulation import calculer_investissement
+from utils.profiling import instrument_streamlit, section
 
 # Configuration de la page
 st.set_page_config(
@@ -13,6 +11,15 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Mesure des graphiques et tableaux (si IMMO_PROFILE=1)
+instrument_streamlit()
+
+# Panneau de diagnostic caché (?diagnostics=1)
+if st.query_params.get("diagnostics") == "1":
+    from components.diagnostics import show_diagnostics
+    show_diagnostics()
+    st.stop()
+
 # CSS personnalisé
 st.markdown("""
     <style>
@@ -58,116 +65,6 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-def calculer_investissement(prix_bien, surface, apport, taux_credit, duree_credit, 
-                           loyer_mensuel, charges_copro, travaux, frais_notaire_pct,
-                           taxe_fonciere, assurance_pgl, vacance_locative,
-                           appreciation_annuelle, augmentation_loyer):
-    """Calcule tous les indicateurs de l'investissement"""
-    
-    # Calculs initiaux
-    prix_total = prix_bien + travaux
-    frais_notaire = prix_bien * frais_notaire_pct
-    cout_total = prix_total + frais_notaire
-    montant_emprunte = cout_total - apport
-    
-    # Mensualités du crédit
-    if taux_credit > 0 and duree_credit > 0:
-        taux_mensuel = taux_credit / 100 / 12
-        nb_mois = duree_credit * 12
-        mensualite_credit = montant_emprunte * (taux_mensuel * (1 + taux_mensuel)**nb_mois) / ((1 + taux_mensuel)**nb_mois - 1)
-        cout_total_credit = mensualite_credit * nb_mois
-        interets_total = cout_total_credit - montant_emprunte
-    else:
-        mensualite_credit = 0
-        cout_total_credit = 0
-        interets_total = 0
-    
-    # Revenus et charges mensuels
-    revenus_bruts_mensuel = loyer_mensuel * (1 - vacance_locative/100)
-    charges_mensuelles = charges_copro + assurance_pgl + (taxe_fonciere / 12)
-    charges_totales = charges_mensuelles + mensualite_credit
-    
-    # Cashflow mensuel
-    cashflow_mensuel = revenus_bruts_mensuel - charges_totales
-    cashflow_annuel = cashflow_mensuel * 12
-    
-    # Rentabilité brute
-    loyers_annuels = loyer_mensuel * 12
-    rentabilite_brute = (loyers_annuels / prix_total) * 100
-    
-    # Rentabilité nette
-    charges_annuelles = charges_mensuelles * 12
-    revenus_nets = loyers_annuels * (1 - vacance_locative/100) - charges_annuelles
-    rentabilite_nette = (revenus_nets / cout_total) * 100
-    
-    # ROI (Return on Investment sur apport)
-    if apport > 0:
-        roi = (revenus_nets / apport) * 100
-    else:
-        roi = 0
-    
-    # Simulation sur 20 ans
-    projection = []
-    valeur_bien = prix_bien
-    loyer_actuel = loyer_mensuel
-    capital_restant = montant_emprunte
-    
-    for annee in range(1, 21):
-        # Appréciation du bien
-        valeur_bien *= (1 + appreciation_annuelle/100)
-        
-        # Augmentation du loyer
-        if annee > 1:
-            loyer_actuel *= (1 + augmentation_loyer/100)
-        
-        # Revenus de l'année
-        revenus_annee = loyer_actuel * 12 * (1 - vacance_locative/100)
-        charges_annee = (charges_copro + assurance_pgl) * 12 + taxe_fonciere
-        
-        # Remboursement du crédit
-        if annee <= duree_credit:
-            remb_annuel = mensualite_credit * 12
-            # Calcul simplifié du capital remboursé
-            capital_rembourse = remb_annuel - (capital_restant * taux_credit / 100)
-            capital_restant -= capital_rembourse
-        else:
-            remb_annuel = 0
-            capital_rembourse = 0
-            capital_restant = 0
-        
-        cashflow_annee = revenus_annee - charges_annee - remb_annuel
-        
-        # Plus-value latente
-        plus_value = valeur_bien - prix_bien
-        
-        projection.append({
-            'Année': annee,
-            'Valeur Bien': valeur_bien,
-            'Loyer Mensuel': loyer_actuel,
-            'Revenus Annuels': revenus_annee,
-            'Charges Annuelles': charges_annee,
-            'Remboursement': remb_annuel,
-            'Cashflow': cashflow_annee,
-            'Capital Restant': max(0, capital_restant),
-            'Plus-value': plus_value,
-            'Patrimoine Net': valeur_bien - max(0, capital_restant)
-        })
-    
-    return {
-        'cout_total': cout_total,
-        'montant_emprunte': montant_emprunte,
-        'mensualite_credit': mensualite_credit,
-        'interets_total': interets_total,
-        'revenus_bruts_mensuel': revenus_bruts_mensuel,
-        'charges_mensuelles': charges_mensuelles,
-        'cashflow_mensuel': cashflow_mensuel,
-        'cashflow_annuel': cashflow_annuel,
-        'rentabilite_brute': rentabilite_brute,
-        'rentabilite_nette': rentabilite_nette,
-        'roi': roi,
-        'projection': projection
-    }
-
 # Titre principal
 st.title("Simulateur d'Investissement Immobilier")
 st.markdown("### Analysez la rentabilité de votre projet immobilier")
@@ -206,16 +103,17 @@ with st.sidebar:
                                    value=7.5, step=0.5) / 100
 
 # Onglets principaux
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
     "Analyse", 
     "Revenus & Charges", 
     "Projection 20 ans", 
     "Marché DVF",
     "Comparaison", 
-    "Fiscalité"
+    "Fiscalité",
+    "Sensibilité"
 ])
 
-with tab1:
+with tab1, section("Onglet Analyse"):
     st.header("Analyse de Rentabilité")
     
     col1, col2 = st.columns(2)
@@ -300,7 +198,10 @@ with tab1:
         st.metric("ROI (sur apport)", f"{resultats['roi']:.2f}%", 
                  help="Return on Investment calculé sur votre apport personnel")
 
-with tab2:
+with tab2, section("Onglet Revenus & Charges"):
+    import pandas as pd
+    import plotly.graph_objects as go
+    
     st.header("Détail Revenus & Charges")
     
     col1, col2 = st.columns(2)
@@ -372,7 +273,10 @@ with tab2:
     recap_data['Montant Formaté'] = recap_data['Montant (€)'].apply(lambda x: f"{x:,.2f} €")
     st.dataframe(recap_data[['Catégorie', 'Détail', 'Montant Formaté']], use_container_width=True, hide_index=True)
 
-with tab3:
+with tab3, section("Onglet Projection 20 ans"):
+    import pandas as pd
+    import plotly.graph_objects as go
+    
     st.header("Projection sur 20 ans")
     
     df_projection = pd.DataFrame(resultats['projection'])
@@ -443,53 +347,161 @@ with tab3:
     
     st.dataframe(df_display, use_container_width=True, hide_index=True)
 
-with tab4:
+    # Simulation Monte Carlo
+    st.markdown("---")
+    st.subheader("Analyse de Risque (Monte Carlo)")
+
+    with st.expander("Simuler des trajectoires aléatoires d'appréciation, de loyers et de vacance"):
+        from utils.monte_carlo import (
+            DEFAULT_APPRECIATION_VOL, DEFAULT_LOYER_VOL, DEFAULT_VACANCE_VOL,
+            calibrate_appreciation, simulate_monte_carlo
+        )
+
+        appreciation_mc = appreciation_annuelle
+        volatilite_defaut = DEFAULT_APPRECIATION_VOL
+
+        # Calibrage optionnel sur l'historique DVF d'une commune
+        code_calibrage = st.text_input("Calibrer sur une commune (code INSEE, optionnel)",
+                                       key="mc_insee")
+        if code_calibrage:
+            try:
+                from utils.dvf_loader import load_dvf_store
+                from utils.market_report import build_commune_report
+
+                calibrage = calibrate_appreciation(
+                    build_commune_report(load_dvf_store(), code_calibrage).evolution
+                )
+                if calibrage:
+                    appreciation_mc = round(calibrage['appreciation'], 2)
+                    volatilite_defaut = round(calibrage['volatilite'], 2)
+                    st.success(f"Historique DVF ({calibrage['nombre_annees']} années) : "
+                               f"appréciation {appreciation_mc:.2f}%/an, "
+                               f"volatilité {volatilite_defaut:.2f}%/an")
+                else:
+                    st.warning("Historique insuffisant pour cette commune")
+            except Exception as e:
+                st.error(f"Calibrage impossible: {e}")
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            appreciation_mc = st.number_input("Appréciation moyenne (%/an)", value=float(appreciation_mc),
+                                              step=0.1, key=f"mc_appr_{code_calibrage}")
+            volatilite_appreciation = st.number_input("Volatilité appréciation (%/an)",
+                                                      min_value=0.0, value=float(volatilite_defaut),
+                                                      step=0.5, key=f"mc_vol_{code_calibrage}")
+        with col2:
+            volatilite_loyer = st.number_input("Volatilité indexation loyers (%/an)", min_value=0.0,
+                                               value=DEFAULT_LOYER_VOL, step=0.5)
+            volatilite_vacance = st.number_input("Écart-type vacance (points/an)", min_value=0.0,
+                                                 value=DEFAULT_VACANCE_VOL, step=0.5)
+        with col3:
+            n_trajectoires = st.select_slider("Nombre de trajectoires",
+                                              options=[1000, 5000, 10000, 50000, 100000],
+                                              value=10000)
+            graine = st.number_input("Graine aléatoire", min_value=0, value=42, step=1)
+
+        if st.button("Lancer la simulation", key="mc_run"):
+            parametres_mc = {
+                'prix_bien': prix_bien, 'surface': surface, 'apport': apport,
+                'taux_credit': taux_credit, 'duree_credit': duree_credit,
+                'loyer_mensuel': loyer_mensuel, 'charges_copro': charges_copro,
+                'travaux': travaux, 'frais_notaire_pct': frais_notaire_pct,
+                'taxe_fonciere': taxe_fonciere, 'assurance_pgl': assurance_pgl,
+                'vacance_locative': vacance_locative,
+                'appreciation_annuelle': appreciation_mc,
+                'augmentation_loyer': augmentation_loyer
+            }
+            mc = simulate_monte_carlo(parametres_mc, n_paths=n_trajectoires,
+                                      appreciation_vol=volatilite_appreciation,
+                                      loyer_vol=volatilite_loyer,
+                                      vacance_vol=volatilite_vacance,
+                                      seed=int(graine))
+
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("TRI médian", f"{mc['tri'][2]:.2f}%")
+            with col2:
+                st.metric("TRI 5% - 95%", f"{mc['tri'][0]:.1f}% / {mc['tri'][-1]:.1f}%")
+            with col3:
+                st.metric("Probabilité TRI négatif", f"{mc['prob_tri_negatif'] * 100:.1f}%",
+                          help=f"Trajectoires sans TRI défini : {mc['prob_tri_indefini'] * 100:.1f}% "
+                               "(comptées comme négatives si elles finissent en perte)")
+            with col4:
+                st.metric("Probabilité de perte", f"{mc['prob_perte'] * 100:.1f}%")
+
+            # Bandes de percentiles (5-95 et 25-75) autour de la médiane
+            for cle, titre, couleur in [('patrimoine_net', "Patrimoine Net", '46, 204, 113'),
+                                        ('cashflow_cumule', "Cashflow Cumulé", '155, 89, 182')]:
+                bandes = mc[cle]
+                fig_mc = go.Figure()
+                for bas, haut, opacite, nom in [(0, 4, 0.15, 'P5 - P95'), (1, 3, 0.35, 'P25 - P75')]:
+                    fig_mc.add_trace(go.Scatter(
+                        x=mc['annees'], y=bandes[haut], mode='lines',
+                        line=dict(width=0), showlegend=False, hoverinfo='skip'
+                    ))
+                    fig_mc.add_trace(go.Scatter(
+                        x=mc['annees'], y=bandes[bas], mode='lines',
+                        line=dict(width=0), fill='tonexty',
+                        fillcolor=f'rgba({couleur}, {opacite})', name=nom
+                    ))
+                fig_mc.add_trace(go.Scatter(
+                    x=mc['annees'], y=bandes[2], mode='lines',
+                    name='Médiane', line=dict(color=f'rgb({couleur})', width=3)
+                ))
+                fig_mc.update_layout(
+                    title=f"{titre} - {mc['n_paths']:,} trajectoires",
+                    xaxis_title="Année",
+                    yaxis_title="Montant (€)",
+                    height=450,
+                    hovermode='x unified'
+                )
+                st.plotly_chart(fig_mc, use_container_width=True)
+
+with tab4, section("Onglet Marché DVF"):
+    import pandas as pd
+    import plotly.graph_objects as go
+    
     st.header("Analyse de Marché DVF")
     
     st.info("Comparez votre projet aux données réelles du marché immobilier français")
     
-    # Import des modules
     try:
-        from utils.dvf_loader import load_dvf_data, get_communes_list
-        from utils.market_analysis import compare_to_market, get_investment_recommendation
+        # Interface de recherche (données DVF chargées à la première recherche)
+        st.markdown("---")
+        st.subheader("Sélection de la Commune")
         
-        # Charger les données DVF
-        with st.spinner("Chargement des données DVF..."):
-            df_dvf = load_dvf_data()
+        col1, col2 = st.columns([2, 1])
         
-        if not df_dvf.empty:
-            st.success(f"{len(df_dvf):,} enregistrements chargés")
+        with col1:
+            search_input = st.text_input(
+                "Rechercher par nom de commune ou code INSEE",
+                placeholder="Ex: Paris, Lyon, 75015...",
+                help="Tapez au moins 2 caractères pour lancer la recherche"
+            )
+        
+        commune_select = None
+        df_dvf = None
+        
+        if search_input and len(search_input) >= 2:
+            from utils.dvf_loader import load_dvf_store
             
-            # Charger les données INSEE des communes
-            try:
-                from utils.communes_insee import (
-                    load_communes_insee, create_commune_search_dict, 
-                    search_communes, format_commune_option, get_code_from_formatted
-                )
-                from utils.dvf_loader import get_communes_list
-                
-                df_insee = load_communes_insee()
-                code_to_name, name_to_code = create_commune_search_dict(df_insee)
-                available_codes = get_communes_list(df_dvf)
-                
-                # Interface de recherche
-                st.markdown("---")
-                st.subheader("Sélection de la Commune")
-                
-                col1, col2 = st.columns([2, 1])
-                
-                with col1:
-                    search_input = st.text_input(
-                        "Rechercher par nom de commune ou code INSEE",
-                        placeholder="Ex: Paris, Lyon, 75015...",
-                        help="Tapez au moins 2 caractères pour lancer la recherche"
+            # Charger les données DVF
+            with st.spinner("Chargement des données DVF..."):
+                df_dvf = load_dvf_store().df
+            
+            if df_dvf.empty:
+                st.warning("Aucune donnée DVF disponible")
+            else:
+                # Charger les données INSEE des communes
+                try:
+                    from utils.communes_insee import (
+                        load_commune_search_index, format_commune_option, get_code_from_formatted
                     )
-                
-                commune_select = None
-                
-                if search_input and len(search_input) >= 2:
+                    
+                    search_index = load_commune_search_index()
+                    
                     # Rechercher les communes
-                    results = search_communes(search_input, code_to_name, available_codes, max_results=30)
+                    results = search_index.search(search_input, max_results=30)
                     
                     if results:
                         with col2:
@@ -508,119 +520,154 @@ with tab4:
                             commune_select = get_code_from_formatted(selected)
                     else:
                         st.warning("Aucune commune trouvée avec ce critère")
-                elif search_input and len(search_input) < 2:
-                    st.info("Tapez au moins 2 caractères pour rechercher")
+                
+                except Exception as e:
+                    st.error(f"Erreur lors du chargement des données communes: {e}")
+                    # Fallback : la recherche est interprétée comme un code INSEE
+                    from utils.dvf_loader import get_communes_list
+                    if search_input in get_communes_list(df_dvf):
+                        commune_select = search_input
+        elif search_input:
+            st.info("Tapez au moins 2 caractères pour rechercher")
+        
+        with col2:
+            if commune_select:
+                st.metric("Commune sélectionnée", commune_select)
+        
+        # Analyse comparative
+        if commune_select:
+            from utils.market_analysis import compare_to_market, get_investment_recommendation
             
-            except Exception as e:
-                st.error(f"Erreur lors du chargement des données communes: {e}")
-                # Fallback vers l'ancienne méthode
-                from utils.dvf_loader import get_communes_list
-                communes = get_communes_list(df_dvf)
-                if communes:
-                    commune_select = st.text_input(
-                        "Code INSEE de la commune",
-                        placeholder="Ex: 75015",
-                        help="Entrez le code INSEE à 5 chiffres"
-                    )
-                    if commune_select not in communes:
-                        commune_select = None
+            st.markdown("---")
+            st.subheader("Comparaison avec le Marché")
             
-            with col2:
-                if commune_select:
-                    st.metric("Commune sélectionnée", commune_select)
+            # Comparer le prix
+            comparison = compare_to_market(prix_m2, df_dvf, commune_select)
             
-            # Analyse comparative
-            if commune_select:
+            if comparison.get('statut') != 'Données insuffisantes':
+                col1, col2, col3 = st.columns(3)
+                
+                with col1:
+                    st.metric("Votre Prix/m²", f"{prix_m2:,.0f} €")
+                
+                with col2:
+                    st.metric("Prix/m² Marché", 
+                             f"{comparison.get('prix_m2_marche', 0):,.0f} €")
+                
+                with col3:
+                    ecart = comparison.get('ecart_pourcentage', 0)
+                    st.metric("Écart", f"{ecart:+.1f}%",
+                             delta_color="inverse")
+                
+                # Évaluation
                 st.markdown("---")
-                st.subheader("Comparaison avec le Marché")
+                positionnement = comparison.get('positionnement', '')
+                evaluation = comparison.get('evaluation', '')
                 
-                # Comparer le prix
-                comparison = compare_to_market(prix_m2, df_dvf, commune_select)
+                if 'dessous' in positionnement.lower():
+                    st.success(f"**{positionnement}** - {evaluation}")
+                elif 'moyenne' in positionnement.lower():
+                    st.info(f"**{positionnement}** - {evaluation}")
+                else:
+                    st.warning(f"**{positionnement}** - {evaluation}")
+
+                # Percentiles : part des mutations à un prix/m² inférieur
+                niveaux = [("Commune", 'percentile_commune'),
+                           ("Département", 'percentile_departement'),
+                           ("France", 'percentile_national')]
+                if any(pd.notna(comparison.get(cle)) for _, cle in niveaux):
+                    cols = st.columns(len(niveaux))
+                    for col, (libelle, cle) in zip(cols, niveaux):
+                        with col:
+                            valeur = comparison.get(cle)
+                            st.metric(f"Percentile {libelle}",
+                                      f"{valeur:.0f}e" if pd.notna(valeur) else "-")
+                    st.caption("Part des mutations DVF dont le prix moyen au m² est "
+                               "inférieur au vôtre.")
+
+                # Communes-années les plus proches (surface, prix/m², année) du département
+                with st.expander("Marchés comparables du département"):
+                    try:
+                        from utils.comparables import find_comparables
+                        from utils.dvf_store import get_store
+
+                        comparables = find_comparables(
+                            df_dvf, surface=surface, prix_m2=prix_m2,
+                            annee=get_store(df_dvf).years[-1], insee=commune_select, k=10
+                        )
+                        if comparables.empty:
+                            st.info("Aucun marché comparable trouvé")
+                        else:
+                            st.dataframe(
+                                comparables[['insee_com', 'annee', 'surface_moy', 'prix_m2_moyen',
+                                             'nb_mutations', 'distance']]
+                                .style.format({'surface_moy': '{:.0f} m²', 'prix_m2_moyen': '{:,.0f} €',
+                                               'distance': '{:.2f}'}),
+                                use_container_width=True, hide_index=True
+                            )
+                            st.caption("Distance : 1 ≈ 20 % d'écart de surface ou de prix/m², "
+                                       "ou 2 ans d'écart.")
+                    except Exception as e:
+                        st.warning(f"Recherche de comparables indisponible : {e}")
+
+                # Recommandation d'investissement
+                st.markdown("---")
+                st.subheader("Recommandation d'Investissement")
                 
-                if comparison.get('statut') != 'Données insuffisantes':
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        st.metric("Votre Prix/m²", f"{prix_m2:,.0f} €")
-                    
-                    with col2:
-                        st.metric("Prix/m² Marché", 
-                                 f"{comparison.get('prix_m2_marche', 0):,.0f} €")
-                    
-                    with col3:
-                        ecart = comparison.get('ecart_pourcentage', 0)
-                        st.metric("Écart", f"{ecart:+.1f}%",
-                                 delta_color="inverse")
-                    
-                    # Évaluation
-                    st.markdown("---")
-                    positionnement = comparison.get('positionnement', '')
-                    evaluation = comparison.get('evaluation', '')
-                    
-                    if 'dessous' in positionnement.lower():
-                        st.success(f"**{positionnement}** - {evaluation}")
-                    elif 'moyenne' in positionnement.lower():
-                        st.info(f"**{positionnement}** - {evaluation}")
-                    else:
-                        st.warning(f"**{positionnement}** - {evaluation}")
-                    
-                    # Recommandation d'investissement
-                    st.markdown("---")
-                    st.subheader("Recommandation d'Investissement")
-                    
-                    reco = get_investment_recommendation(df_dvf, commune_select, 
-                                                        prix_m2, surface)
-                    
-                    score = reco.get('score', 0)
-                    recommandation = reco.get('recommandation', '')
-                    
-                    # Jauge de score
-                    import plotly.graph_objects as go
-                    
-                    fig = go.Figure(go.Indicator(
-                        mode="gauge+number+delta",
-                        value=score,
-                        domain={'x': [0, 1], 'y': [0, 1]},
-                        title={'text': "Score d'Investissement"},
-                        gauge={
-                            'axis': {'range': [None, 100]},
-                            'bar': {'color': "darkblue"},
-                            'steps': [
-                                {'range': [0, 35], 'color': "#e74c3c"},
-                                {'range': [35, 50], 'color': "#f39c12"},
-                                {'range': [50, 65], 'color': "#f1c40f"},
-                                {'range': [65, 80], 'color': "#2ecc71"},
-                                {'range': [80, 100], 'color': "#27ae60"}
-                            ],
-                            'threshold': {
-                                'line': {'color': "black", 'width': 4},
-                                'thickness': 0.75,
-                                'value': 70
-                            }
+                reco = get_investment_recommendation(df_dvf, commune_select, 
+                                                    prix_m2, surface)
+                
+                score = reco.get('score', 0)
+                recommandation = reco.get('recommandation', '')
+                
+                # Jauge de score
+                import plotly.graph_objects as go
+                
+                fig = go.Figure(go.Indicator(
+                    mode="gauge+number+delta",
+                    value=score,
+                    domain={'x': [0, 1], 'y': [0, 1]},
+                    title={'text': "Score d'Investissement"},
+                    gauge={
+                        'axis': {'range': [None, 100]},
+                        'bar': {'color': "darkblue"},
+                        'steps': [
+                            {'range': [0, 35], 'color': "#e74c3c"},
+                            {'range': [35, 50], 'color': "#f39c12"},
+                            {'range': [50, 65], 'color': "#f1c40f"},
+                            {'range': [65, 80], 'color': "#2ecc71"},
+                            {'range': [80, 100], 'color': "#27ae60"}
+                        ],
+                        'threshold': {
+                            'line': {'color': "black", 'width': 4},
+                            'thickness': 0.75,
+                            'value': 70
                         }
-                    ))
-                    fig.update_layout(height=300)
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    if reco.get('couleur') == 'success':
-                        st.success(f"**{recommandation}**")
-                    elif reco.get('couleur') == 'warning':
-                        st.warning(f"**{recommandation}**")
-                    else:
-                        st.error(f"**{recommandation}**")
+                    }
+                ))
+                fig.update_layout(height=300)
+                st.plotly_chart(fig, use_container_width=True)
+                
+                if reco.get('couleur') == 'success':
+                    st.success(f"**{recommandation}**")
+                elif reco.get('couleur') == 'warning':
+                    st.warning(f"**{recommandation}**")
                 else:
-                    st.warning("Données insuffisantes pour cette commune")
+                    st.error(f"**{recommandation}**")
             else:
-                st.info("Utilisez la recherche ci-dessus pour sélectionner une commune")
+                st.warning("Données insuffisantes pour cette commune")
         else:
-            st.warning("Aucune donnée DVF disponible")
+            st.info("Utilisez la recherche ci-dessus pour sélectionner une commune")
     
     except ImportError:
         st.error("Modules d'analyse DVF non disponibles")
     except Exception as e:
         st.error(f"Erreur lors du chargement des données: {e}")
 
-with tab5:
+with tab5, section("Onglet Comparaison"):
+    import pandas as pd
+    import plotly.graph_objects as go
+    
     st.header("Comparaison de Scénarios")
     
     st.info("Créez et comparez plusieurs scénarios d'investissement")
@@ -756,7 +803,7 @@ with tab5:
             st.write(f"{best_roi['Scénario']}")
             st.metric("", f"{best_roi['ROI']:.2f}%")
 
-with tab6:
+with tab6, section("Onglet Fiscalité"):
     st.header("Simulation Fiscale")
     
     st.info("Optimisez votre investissement avec différents régimes fiscaux")
@@ -1002,6 +1049,107 @@ with tab6:
     except Exception as e:
         st.error(f"Erreur: {e}")
 
+with tab7, section("Onglet Sensibilité"):
+    import numpy as np
+    import plotly.graph_objects as go
+    
+    st.header("Analyse de Sensibilité")
+    
+    st.info("Faites varier deux paramètres à la fois : toute la grille est calculée en une seule passe")
+    
+    from utils.simulation import SENSITIVITY_PARAMS, sensitivity_grid, swept_parameter
+    
+    params_base = {
+        'prix_bien': prix_bien, 'surface': surface, 'apport': apport,
+        'taux_credit': taux_credit, 'duree_credit': duree_credit,
+        'loyer_mensuel': loyer_mensuel, 'charges_copro': charges_copro,
+        'travaux': travaux, 'frais_notaire_pct': frais_notaire_pct,
+        'taxe_fonciere': taxe_fonciere, 'assurance_pgl': assurance_pgl,
+        'vacance_locative': vacance_locative,
+        'appreciation_annuelle': appreciation_annuelle,
+        'augmentation_loyer': augmentation_loyer
+    }
+    valeurs_actuelles = {**params_base, 'prix_m2': prix_m2, 'loyer_m2': loyer_m2}
+    parametres = list(SENSITIVITY_PARAMS)
+    
+    def plage_defaut(param):
+        """Plage par défaut : ±50% autour de la valeur actuelle"""
+        valeur = float(valeurs_actuelles[param])
+        if valeur == 0:
+            return 0.0, 10.0
+        return round(valeur * 0.5, 2), round(valeur * 1.5, 2)
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        param_x = st.selectbox("Paramètre en abscisse", parametres,
+                               index=parametres.index('taux_credit'),
+                               format_func=SENSITIVITY_PARAMS.get, key="sens_x")
+        x_defaut = plage_defaut(param_x)
+        x_min = st.number_input("Minimum", value=x_defaut[0], key=f"sens_x_min_{param_x}")
+        x_max = st.number_input("Maximum", value=x_defaut[1], key=f"sens_x_max_{param_x}")
+    
+    with col2:
+        param_y = st.selectbox("Paramètre en ordonnée", parametres,
+                               index=parametres.index('prix_m2'),
+                               format_func=SENSITIVITY_PARAMS.get, key="sens_y")
+        y_defaut = plage_defaut(param_y)
+        y_min = st.number_input("Minimum", value=y_defaut[0], key=f"sens_y_min_{param_y}")
+        y_max = st.number_input("Maximum", value=y_defaut[1], key=f"sens_y_max_{param_y}")
+    
+    resolution = st.slider("Résolution de la grille", min_value=10, max_value=100,
+                           value=50, step=10)
+    
+    if swept_parameter(param_x) == swept_parameter(param_y):
+        st.warning("Choisissez deux paramètres différents (prix au m² et prix du bien, "
+                   "ou loyer au m² et loyer mensuel, fixent la même valeur)")
+    elif x_min >= x_max or y_min >= y_max:
+        st.warning("Le minimum doit être inférieur au maximum")
+    else:
+        x_values = np.linspace(x_min, x_max, resolution)
+        y_values = np.linspace(y_min, y_max, resolution)
+        # La durée du crédit est un nombre entier d'années
+        if param_x == 'duree_credit':
+            x_values = np.unique(np.round(x_values))
+        if param_y == 'duree_credit':
+            y_values = np.unique(np.round(y_values))
+        
+        grille = sensitivity_grid(params_base, param_x, x_values, param_y, y_values)
+        
+        indicateurs = [
+            ('cashflow_mensuel', "Cashflow Mensuel (€)", "€"),
+            ('rentabilite_nette', "Rentabilité Nette (%)", "%"),
+            ('tri', "TRI sur 20 ans (%)", "%")
+        ]
+        
+        for cle, titre, unite in indicateurs:
+            fig_sens = go.Figure(go.Heatmap(
+                x=grille['x'],
+                y=grille['y'],
+                z=grille[cle],
+                colorscale='RdYlGn',
+                colorbar=dict(title=unite),
+                hovertemplate=(f"{SENSITIVITY_PARAMS[param_x]}: %{{x:,.2f}}<br>"
+                               f"{SENSITIVITY_PARAMS[param_y]}: %{{y:,.2f}}<br>"
+                               f"{titre}: %{{z:,.2f}}<extra></extra>")
+            ))
+            # Scénario actuel
+            fig_sens.add_trace(go.Scatter(
+                x=[valeurs_actuelles[param_x]],
+                y=[valeurs_actuelles[param_y]],
+                mode='markers',
+                marker=dict(color='white', size=12, symbol='x'),
+                name='Scénario actuel',
+                showlegend=False
+            ))
+            fig_sens.update_layout(
+                title=titre,
+                xaxis_title=SENSITIVITY_PARAMS[param_x],
+                yaxis_title=SENSITIVITY_PARAMS[param_y],
+                height=450
+            )
+            st.plotly_chart(fig_sens, use_container_width=True)
+
 # Footer avec informations
 st.markdown("---")
 st.markdown("""
@@ -0,0 +1,56 @@
+"""
+Non-régression de l'amortissement en forme fermée face à la boucle mensuelle d'origine
+"""
+import numpy as np
+import pytest
+
+from utils.financial_calculator import calculate_loan_schedule, loan_schedule_arrays
+
+
+def _amortissement_reference(principal, taux_annuel, annees):
+    """Tableau d'amortissement mois par mois (boucle d'origine)"""
+    taux = taux_annuel / 100 / 12
+    n = annees * 12
+    mensualite = principal * (taux * (1 + taux) ** n) / ((1 + taux) ** n - 1)
+    lignes, restant = [], principal
+    for mois in range(1, n + 1):
+        interets = restant * taux
+        capital = mensualite - interets
+        restant -= capital
+        lignes.append((mois, mensualite, interets, capital, max(0, restant)))
+    return np.array(lignes)
+
+
+@pytest.mark.parametrize('principal,taux,annees', [(180_000, 3.8, 20), (50_000, 0.5, 7),
+                                                   (300_000, 9.0, 30), (1_000, 4.0, 1)])
+def test_amortissement_egal_boucle(principal, taux, annees):
+    attendu = _amortissement_reference(principal, taux, annees)
+    tableau = calculate_loan_schedule(principal, taux, annees).to_numpy()
+    assert tableau.shape == attendu.shape
+    np.testing.assert_allclose(tableau, attendu, rtol=1e-9, atol=1e-6)
+
+
+def test_amortissement_lot_egal_prets_isoles():
+    principals, taux, annees = [100_000, 250_000], [2.0, 4.5], [10, 25]
+    lot = loan_schedule_arrays(principals, taux, annees)
+    for i in range(2):
+        seul = loan_schedule_arrays(principals[i], taux[i], annees[i])
+        n = annees[i] * 12
+        for nom in ('payment', 'interest', 'principal', 'balance'):
+            np.testing.assert_allclose(lot[nom][i, :n], seul[nom])
+            assert not lot[nom][i, n:].any()
+
+
+def test_amortissement_taux_nul_et_duree_nulle():
+    # Comportement d'origine : tableau vide
+    assert calculate_loan_schedule(100_000, 0, 20).empty
+    assert calculate_loan_schedule(100_000, 3.0, 0).empty
+
+    # Taux nul : amortissement linéaire
+    lineaire = loan_schedule_arrays(120_000, 0, 10)
+    np.testing.assert_allclose(lineaire['payment'], 1_000)
+    assert not lineaire['interest'].any()
+    assert lineaire['balance'][-1] == pytest.approx(0)
+
+    # Durée nulle : aucune échéance
+    assert len(loan_schedule_arrays(100_000, 3.0, 0)['payment']) == 0
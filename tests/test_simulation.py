@@ -0,0 +1,116 @@
+"""
+Non-régression de simulate_batch face à calculer_investissement d'origine
+(boucle annuelle scalaire)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.simulation import PARAM_NAMES, PROJECTION_COLUMNS, simulate_batch
+
+SCENARIO = {
+    'prix_bien': 200000, 'surface': 50, 'apport': 20000, 'taux_credit': 3.8,
+    'duree_credit': 20, 'loyer_mensuel': 900, 'charges_copro': 30, 'travaux': 5000,
+    'frais_notaire_pct': 0.075, 'taxe_fonciere': 800, 'assurance_pgl': 30,
+    'vacance_locative': 5, 'appreciation_annuelle': 2.0, 'augmentation_loyer': 1.5
+}
+
+
+def _simulation_reference(prix_bien, surface, apport, taux_credit, duree_credit,
+                          loyer_mensuel, charges_copro, travaux, frais_notaire_pct,
+                          taxe_fonciere, assurance_pgl, vacance_locative,
+                          appreciation_annuelle, augmentation_loyer):
+    """calculer_investissement d'origine (boucle annuelle sur 20 ans)"""
+    prix_total = prix_bien + travaux
+    cout_total = prix_total + prix_bien * frais_notaire_pct
+    montant_emprunte = cout_total - apport
+
+    if taux_credit > 0 and duree_credit > 0:
+        taux_mensuel = taux_credit / 100 / 12
+        nb_mois = duree_credit * 12
+        mensualite = montant_emprunte * (taux_mensuel * (1 + taux_mensuel)**nb_mois) / \
+            ((1 + taux_mensuel)**nb_mois - 1)
+        interets_total = mensualite * nb_mois - montant_emprunte
+    else:
+        mensualite = interets_total = 0
+
+    revenus_bruts_mensuel = loyer_mensuel * (1 - vacance_locative / 100)
+    charges_mensuelles = charges_copro + assurance_pgl + taxe_fonciere / 12
+    cashflow_mensuel = revenus_bruts_mensuel - charges_mensuelles - mensualite
+    loyers_annuels = loyer_mensuel * 12
+    revenus_nets = loyers_annuels * (1 - vacance_locative / 100) - charges_mensuelles * 12
+
+    projection = []
+    valeur_bien, loyer, capital_restant = prix_bien, loyer_mensuel, montant_emprunte
+    for annee in range(1, 21):
+        valeur_bien *= (1 + appreciation_annuelle / 100)
+        if annee > 1:
+            loyer *= (1 + augmentation_loyer / 100)
+        revenus = loyer * 12 * (1 - vacance_locative / 100)
+        charges = (charges_copro + assurance_pgl) * 12 + taxe_fonciere
+        if annee <= duree_credit:
+            remb = mensualite * 12
+            capital_restant -= remb - capital_restant * taux_credit / 100
+        else:
+            remb, capital_restant = 0, 0
+        projection.append({
+            'Valeur Bien': valeur_bien, 'Loyer Mensuel': loyer, 'Revenus Annuels': revenus,
+            'Charges Annuelles': charges, 'Remboursement': remb,
+            'Cashflow': revenus - charges - remb, 'Capital Restant': max(0, capital_restant),
+            'Plus-value': valeur_bien - prix_bien,
+            'Patrimoine Net': valeur_bien - max(0, capital_restant)
+        })
+
+    return {
+        'cout_total': cout_total,
+        'montant_emprunte': montant_emprunte,
+        'mensualite_credit': mensualite,
+        'interets_total': interets_total,
+        'cashflow_mensuel': cashflow_mensuel,
+        'cashflow_annuel': cashflow_mensuel * 12,
+        'rentabilite_brute': loyers_annuels / prix_total * 100,
+        'rentabilite_nette': revenus_nets / cout_total * 100,
+        'roi': revenus_nets / apport * 100 if apport > 0 else 0,
+        'projection': pd.DataFrame(projection)
+    }
+
+
+def _compare_simulation(scenarios):
+    lot = simulate_batch(pd.DataFrame(scenarios))
+    for i, scenario in enumerate(scenarios):
+        attendu = _simulation_reference(**scenario)
+        for cle, valeur in attendu.items():
+            if cle == 'projection':
+                for col in PROJECTION_COLUMNS:
+                    np.testing.assert_allclose(lot['projection'][col][i], valeur[col],
+                                               rtol=1e-10, atol=1e-6)
+            else:
+                assert lot[cle][i] == pytest.approx(valeur, rel=1e-10, abs=1e-8), cle
+
+
+def test_simulation_lot_egal_reference():
+    rng = np.random.default_rng(1)
+    scenarios = []
+    for _ in range(200):
+        scenario = dict(SCENARIO)
+        scenario.update(prix_bien=rng.uniform(80_000, 600_000), apport=rng.uniform(0, 80_000),
+                        taux_credit=rng.uniform(0.5, 6), duree_credit=int(rng.integers(5, 31)),
+                        loyer_mensuel=rng.uniform(400, 2_500),
+                        vacance_locative=rng.uniform(0, 15),
+                        appreciation_annuelle=rng.uniform(-2, 5))
+        scenarios.append(scenario)
+    _compare_simulation(scenarios)
+
+
+def test_simulation_cas_limites():
+    _compare_simulation([
+        dict(SCENARIO, taux_credit=0),
+        dict(SCENARIO, duree_credit=0),
+        dict(SCENARIO, apport=0),
+        dict(SCENARIO, duree_credit=25),
+    ])
+
+
+def test_simulation_colonnes_completes():
+    lot = simulate_batch({name: [SCENARIO[name]] * 3 for name in PARAM_NAMES})
+    assert all(lot['projection'][col].shape == (3, 20) for col in PROJECTION_COLUMNS)
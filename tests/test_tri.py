@@ -0,0 +1,41 @@
+"""
+Non-régression du TRI vectorisé (calculate_irr_batch) face à brentq
+"""
+import numpy as np
+import pytest
+from scipy.optimize import brentq
+
+from utils.financial_calculator import calculate_irr, calculate_irr_batch
+
+
+def _tri_reference(flux):
+    """TRI (%) par brentq sur la VAN ; None sans changement de signe"""
+    flux = np.asarray(flux, dtype=float)
+    van = lambda taux: np.sum(flux / (1 + taux) ** np.arange(len(flux)))
+    if van(-0.99) * van(10.0) > 0:
+        return None
+    return brentq(van, -0.99, 10.0, xtol=1e-14) * 100
+
+
+def test_tri_lot_egal_reference():
+    rng = np.random.default_rng(0)
+    flux = np.column_stack([-rng.uniform(10_000, 100_000, 300),
+                            rng.uniform(-5_000, 15_000, (300, 20))])
+    flux[:, -1] += rng.uniform(0, 200_000, 300)
+    tri = calculate_irr_batch(flux)
+    for ligne, valeur in zip(flux, tri):
+        attendu = _tri_reference(ligne)
+        if attendu is None:
+            assert np.isnan(valeur)
+        else:
+            assert valeur == pytest.approx(attendu, abs=1e-8)
+
+
+def test_tri_flux_tous_negatifs():
+    flux = [[-1000, -100, -100, -50], [0, 0, 0, 0]]
+    assert np.isnan(calculate_irr_batch(flux)).all()
+    assert calculate_irr(flux[0]) == 0.0
+
+
+def test_tri_taux_nul():
+    assert calculate_irr([-1000, 500, 500]) == pytest.approx(0.0, abs=1e-10)
@@ -0,0 +1,474 @@
+"""
+Serveur HTTP local (JSON) exposant les calculs du simulateur
+
+Usage :
+    python -m utils.api_server --port 8765
+
+Routes :
+    GET  /sante                       État du serveur et du cache
+    POST /simulation                  calculer_investissement (paramètres PARAM_NAMES)
+    POST /fiscalite/<calcul>          Fonctions fiscales de financial_calculator
+    GET  /marche/<insee>?prix_m2=...  Rapport de marché d'une commune
+    POST /marche                      Idem, corps {"insee": ..., "prix_m2": ...}
+    POST /positionnement              Percentiles de prix au m² (commune, département,
+                                      France), corps {"insee": ..., "prix_m2": ...}
+    POST /comparables                 k communes-années les plus proches, corps
+                                      {"insee": ..., "surface": ..., "prix_m2": ..., "annee": ...,
+                                       "k": 10, "perimetre": "departement"}
+
+Les routes POST acceptent un objet ou une liste d'objets (lot) ; la réponse a
+la même forme. Les données DVF sont chargées une fois au démarrage et
+partagées par toutes les requêtes ; les réponses sont mises en cache (LRU)
+par empreinte des paramètres. Aucune dépendance hors bibliothèque standard.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from utils.comparables import DEFAULT_K, get_comparables_index
+from utils.dvf_store import DVFStore
+from utils.financial_calculator import (
+    calculate_break_even_point, calculate_income_tax, calculate_profitability_ratios,
+    calculate_social_charges, calculate_tax_lmnp, calculate_tax_pinel, calculate_wealth_tax
+)
+from utils.market_report import build_commune_report
+from utils.price_quantiles import get_price_quantiles
+from utils.simulation import PARAM_NAMES, calculer_investissements
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 4096
+
+# Taille maximale d'un corps de requête (10 Mo)
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+# Champs d'une requête de comparables (voir utils.comparables.FEATURES)
+COMPARABLE_FIELDS = ('insee', 'surface', 'prix_m2', 'annee')
+
+# Calculs fiscaux exposés : nom de route -> fonction
+TAX_FUNCTIONS: Dict[str, Callable] = {
+    'lmnp': calculate_tax_lmnp,
+    'pinel': calculate_tax_pinel,
+    'ifi': calculate_wealth_tax,
+    'impot_revenu': calculate_income_tax,
+    'prelevements_sociaux': calculate_social_charges,
+    'ratios': calculate_profitability_ratios,
+    'point_mort': calculate_break_even_point
+}
+
+
+class APIError(Exception):
+    """Erreur renvoyée au client avec un code HTTP"""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def to_json_compatible(value: Any) -> Any:
+    """
+    Convertit un résultat (NumPy, pandas, NaN) en valeurs JSON standard
+
+    Args:
+        value: Résultat d'un calcul
+
+    Returns:
+        Valeur sérialisable (NaN et infinis remplacés par None)
+    """
+    if isinstance(value, dict):
+        return {str(k): to_json_compatible(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_compatible(v) for v in value]
+    if isinstance(value, pd.DataFrame):
+        return to_json_compatible(value.to_dict(orient='records'))
+    if isinstance(value, (pd.Series, np.ndarray)):
+        return to_json_compatible(value.tolist())
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class ResponseCache:
+    """Cache LRU des résultats, indexé par empreinte des paramètres (thread-safe)"""
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(route: str, params: Hashable) -> str:
+        """Empreinte SHA-256 d'une route et de ses paramètres (ordre des clés indifférent)"""
+        payload = json.dumps([route, params], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: str, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entrees': len(self._entries), 'taille_max': self.max_size,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+class SimulationAPI:
+    """
+    Traitement des requêtes, indépendant du transport HTTP
+
+    Chaque élément d'un lot est mis en cache séparément ; les simulations non
+    trouvées dans le cache sont calculées ensemble (une passe vectorisée).
+    """
+
+    def __init__(self, store: DVFStore, cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            store: DVFStore partagé par toutes les requêtes
+            cache_size: Nombre maximal de résultats en cache
+        """
+        self.store = store
+        self.cache = ResponseCache(cache_size)
+
+    def handle(self, method: str, target: str, body: Optional[bytes] = None) -> Tuple[int, Any]:
+        """
+        Traite une requête
+
+        Args:
+            method: Méthode HTTP
+            target: Chemin et paramètres de l'URL
+            body: Corps de la requête (JSON)
+
+        Returns:
+            Tuple (code HTTP, réponse sérialisable)
+        """
+        try:
+            url = urlsplit(target)
+            parts = [p for p in url.path.split('/') if p]
+            route = parts[0] if parts else ''
+
+            if method == 'GET' and route == 'sante':
+                return HTTPStatus.OK, self.health()
+            if method == 'GET' and route == 'marche' and len(parts) == 2:
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                return HTTPStatus.OK, self._single(self.market, {'insee': parts[1], **query})
+            if method != 'POST':
+                raise APIError(HTTPStatus.NOT_FOUND, f"Route inconnue: {method} {url.path}")
+
+            payload = self._parse_body(body)
+            if route == 'simulation' and len(parts) == 1:
+                return HTTPStatus.OK, self._dispatch(self.simulations, payload)
+            if route == 'fiscalite' and len(parts) == 2:
+                if parts[1] not in TAX_FUNCTIONS:
+                    raise APIError(HTTPStatus.NOT_FOUND, f"Calcul fiscal inconnu: {parts[1]}")
+                return HTTPStatus.OK, self._dispatch(
+                    lambda items: [self.tax(parts[1], item) for item in items], payload)
+            if route == 'marche' and len(parts) == 1:
+                return HTTPStatus.OK, self._dispatch(
+                    lambda items: [self.market(item) for item in items], payload)
+            if route == 'positionnement' and len(parts) == 1:
+                return HTTPStatus.OK, self._dispatch(self.positioning, payload)
+            if route == 'comparables' and len(parts) == 1:
+                return HTTPStatus.OK, self._dispatch(self.comparables, payload)
+            raise APIError(HTTPStatus.NOT_FOUND, f"Route inconnue: POST {url.path}")
+        except APIError as e:
+            return e.status, {'erreur': str(e)}
+        except Exception as e:
+            # Erreur inattendue : réponse 500 plutôt qu'une connexion fermée sans réponse
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'erreur': f"Erreur interne : {e}"}
+
+    @staticmethod
+    def _parse_body(body: Optional[bytes]) -> Any:
+        try:
+            payload = json.loads(body or b'null')
+        except ValueError:
+            raise APIError(HTTPStatus.BAD_REQUEST, "Corps JSON invalide")
+        if isinstance(payload, list) and all(isinstance(item, dict) for item in payload):
+            return payload
+        if isinstance(payload, dict):
+            return payload
+        raise APIError(HTTPStatus.BAD_REQUEST, "Le corps doit être un objet ou une liste d'objets")
+
+    def _dispatch(self, compute: Callable[[List[Dict]], List[Any]], payload) -> Any:
+        """Applique un calcul par lot à un objet ou à une liste d'objets"""
+        if isinstance(payload, dict):
+            return self._single(lambda item: compute([item])[0], payload)
+        return compute(payload)
+
+    @staticmethod
+    def _single(compute: Callable[[Dict], Any], item: Dict) -> Any:
+        """Calcul d'un objet isolé : une erreur devient une réponse 400"""
+        result = compute(item)
+        if isinstance(result, dict) and set(result) == {'erreur'}:
+            raise APIError(HTTPStatus.BAD_REQUEST, result['erreur'])
+        return result
+
+    def _cached(self, route: str, params: Dict, compute: Callable[[], Any]) -> Any:
+        key = self.cache.key(route, params)
+        found, value = self.cache.get(key)
+        if found:
+            return value
+        try:
+            value = to_json_compatible(compute())
+        except (TypeError, ValueError, KeyError, ArithmeticError) as e:
+            # Erreur propre à l'élément : non mise en cache, le reste du lot continue
+            return {'erreur': str(e)}
+        self.cache.put(key, value)
+        return value
+
+    def health(self) -> Dict:
+        return {'statut': 'ok', 'version_donnees': self.store.version, 'lignes': len(self.store),
+                'communes': len(self.store.communes), 'annees': self.store.years,
+                'cache': self.cache.stats()}
+
+    def simulations(self, items: List[Dict]) -> List[Any]:
+        """Simulations d'un lot ; les éléments absents du cache sont calculés ensemble"""
+        results: List[Any] = [None] * len(items)
+        a_calculer = []
+        for i, item in enumerate(items):
+            missing = [name for name in PARAM_NAMES if name not in item]
+            if missing:
+                results[i] = {'erreur': f"Paramètres manquants: {', '.join(missing)}"}
+                continue
+            params, invalides = {}, []
+            for name in PARAM_NAMES:
+                try:
+                    params[name] = float(item[name])
+                except (TypeError, ValueError):
+                    invalides.append(name)
+            if invalides:
+                # Valeur non numérique : erreur propre à l'élément, le reste du lot continue
+                results[i] = {'erreur': f"Paramètres invalides: {', '.join(invalides)}"}
+                continue
+            key = self.cache.key('simulation', params)
+            found, value = self.cache.get(key)
+            if found:
+                results[i] = value
+            else:
+                a_calculer.append((i, key, params))
+
+        if a_calculer:
+            calcules = calculer_investissements([params for _, _, params in a_calculer])
+            for (i, key, _), value in zip(a_calculer, calcules):
+                value = to_json_compatible(value)
+                self.cache.put(key, value)
+                results[i] = value
+        return results
+
+    def tax(self, name: str, params: Dict) -> Any:
+        """Calcul fiscal ; les résultats scalaires sont renvoyés sous la clé 'montant'"""
+        def compute():
+            result = TAX_FUNCTIONS[name](**params)
+            return result if isinstance(result, dict) else {'montant': result}
+        return self._cached(f'fiscalite/{name}', params, compute)
+
+    def market(self, params: Dict) -> Any:
+        """Rapport de marché d'une commune, avec comparaison si prix_m2 est fourni"""
+        insee = str(params.get('insee', ''))
+        if insee not in self.store:
+            return {'erreur': f"Commune inconnue: {insee}"}
+
+        def compute():
+            report = build_commune_report(self.store, insee)
+            trends = {k: v for k, v in report.trends.items() if k != 'evolution'}
+            result = {'insee': insee, 'stats': report.stats, 'evolution': report.evolution,
+                      'tendances': trends, 'liquidite': report.liquidity, 'score': report.score}
+            if params.get('prix_m2') is not None:
+                result['comparaison'] = report.compare(float(params['prix_m2']))
+            return result
+        return self._cached('marche', params, compute)
+
+    def positioning(self, items: List[Dict]) -> List[Any]:
+        """Percentiles d'un lot de prix au m², calculés ensemble (voir utils.price_quantiles)"""
+        results: List[Any] = [None] * len(items)
+        valides = []
+        for i, item in enumerate(items):
+            try:
+                prix = float(item['prix_m2'])
+            except (KeyError, TypeError, ValueError):
+                results[i] = {'erreur': "Paramètre prix_m2 manquant ou invalide"}
+                continue
+            valides.append((i, str(item.get('insee', '')), prix))
+
+        if valides:
+            table = get_price_quantiles(self.store).position(
+                [prix for _, _, prix in valides], [insee for _, insee, _ in valides])
+            for (i, insee, prix), ligne in zip(valides, table.to_dict(orient='records')):
+                results[i] = to_json_compatible({'insee': insee, 'prix_m2': prix, **ligne})
+        return results
+
+    def comparables(self, items: List[Dict]) -> List[Any]:
+        """
+        Comparables d'un lot de biens (voir utils.comparables) : les éléments de
+        mêmes paramètres (k, périmètre, caractéristiques) sont recherchés ensemble
+        """
+        results: List[Any] = [None] * len(items)
+        groupes: Dict[Tuple, List[int]] = {}
+        for i, item in enumerate(items):
+            champs = tuple(nom for nom in COMPARABLE_FIELDS if item.get(nom) is not None)
+            try:
+                k = int(item.get('k', DEFAULT_K))
+            except (TypeError, ValueError):
+                results[i] = {'erreur': "Paramètre k invalide"}
+                continue
+            groupes.setdefault((k, str(item.get('perimetre', 'departement')), champs), []).append(i)
+
+        index = get_comparables_index(self.store)
+        for (k, perimetre, champs), membres in groupes.items():
+            requetes = pd.DataFrame([{nom: items[i][nom] for nom in champs} for i in membres],
+                                    columns=list(champs))
+            if 'insee' in requetes.columns:
+                requetes = requetes.rename(columns={'insee': 'insee_com'})
+            try:
+                trouves = index.query(requetes, k, perimetre)
+            except (TypeError, ValueError) as e:
+                for i in membres:
+                    results[i] = {'erreur': str(e)}
+                continue
+            par_requete = trouves.groupby('requete').indices
+            for position, i in enumerate(membres):
+                lignes = trouves.iloc[par_requete.get(position, [])].drop(columns='requete')
+                results[i] = to_json_compatible({'comparables': lignes})
+        return results
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    """Lit une requête HTTP/1.1 ; None si la connexion est fermée"""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise APIError(HTTPStatus.BAD_REQUEST, "Ligne de requête invalide")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise APIError(HTTPStatus.BAD_REQUEST, "En-tête Content-Length invalide")
+    if length < 0:
+        raise APIError(HTTPStatus.BAD_REQUEST, "En-tête Content-Length invalide")
+    if length > MAX_BODY_SIZE:
+        raise APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Corps de requête trop volumineux")
+    body = await reader.readexactly(length) if length else b''
+
+    keep_alive = (headers.get('connection', '').lower() != 'close'
+                  and version.upper() == 'HTTP/1.1')
+    return method.upper(), target, body, keep_alive
+
+
+def _write_response(writer: asyncio.StreamWriter, status: int, payload: Any,
+                    keep_alive: bool) -> None:
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    status = HTTPStatus(status)
+    head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode('latin-1') + body)
+
+
+async def serve(api: SimulationAPI, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                ready: Optional[Callable[[asyncio.AbstractServer], None]] = None) -> None:
+    """
+    Démarre le serveur HTTP (connexions persistantes HTTP/1.1)
+
+    Les calculs s'exécutent dans le pool de threads de la boucle : une
+    requête longue ne bloque pas la lecture des autres connexions.
+
+    Args:
+        api: Traitement des requêtes
+        host: Adresse d'écoute
+        port: Port d'écoute
+        ready: Fonction optionnelle appelée avec le serveur une fois à l'écoute
+    """
+    loop = asyncio.get_running_loop()
+
+    async def connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except APIError as e:
+                    _write_response(writer, e.status, {'erreur': str(e)}, False)
+                    break
+                if request is None:
+                    break
+                method, target, body, keep_alive = request
+                status, payload = await loop.run_in_executor(None, api.handle, method, target, body)
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(connection, host, port)
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Point d'entrée en ligne de commande"""
+    parser = argparse.ArgumentParser(description="Serveur JSON local du simulateur immobilier")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help="Nombre maximal de réponses en cache")
+    args = parser.parse_args(argv)
+
+    from utils.dvf_loader import load_dvf_store
+    api = SimulationAPI(load_dvf_store(), args.cache_size)
+
+    def ready(server):
+        print(f"Serveur à l'écoute sur http://{args.host}:{args.port} "
+              f"({len(api.store):,} lignes DVF en mémoire)", flush=True)
+
+    try:
+        asyncio.run(serve(api, args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,465 @@
+"""
+Évaluation hors ligne d'un fichier d'annonces (rentabilité, fiscalité, marché)
+
+Usage :
+    python -m utils.batch annonces.csv --output resultats.csv
+    python -m utils.batch annonces.csv --output resultats.parquet --workers 8
+
+Chaque ligne du fichier d'entrée est un bien. Colonnes reconnues : celles de
+PARAM_NAMES (prix_bien, surface, loyer_mensuel...), ou prix_m2 / loyer_m2 à
+la place de prix_bien / loyer_mensuel, plus insee_com pour la comparaison au
+marché et tranche_marginale pour la fiscalité. Les paramètres absents
+prennent les valeurs par défaut du simulateur (DEFAULT_DEAL_PARAMS).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.financial_calculator import (PLAFOND_MICRO_BIC, annual_loan_schedule, calculate_social_charges,
+                                        calculate_tax_foncier, calculate_tax_lmnp)
+from utils.simulation import PARAM_NAMES, batch_to_frame, compute_tri, simulate_batch
+
+# Valeurs par défaut du simulateur (barre latérale et onglet Analyse)
+DEFAULT_DEAL_PARAMS = {
+    'taux_credit': 3.8,
+    'duree_credit': 20,
+    'charges_copro': 30,
+    'travaux': 5000,
+    'frais_notaire_pct': 0.075,
+    'taxe_fonciere': 800,
+    'assurance_pgl': 30,
+    'vacance_locative': 5,
+    'appreciation_annuelle': 2.0,
+    'augmentation_loyer': 1.5
+}
+# Apport par défaut : 10% du prix du bien
+DEFAULT_APPORT_PCT = 0.1
+DEFAULT_TMI = 30
+
+DEFAULT_CHUNKSIZE = 5000
+
+
+def prepare_deals(deals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Complète un bloc d'annonces avec les paramètres de simulation
+
+    Args:
+        deals: Annonces (au minimum surface et prix_bien ou prix_m2, loyer_mensuel ou loyer_m2)
+
+    Returns:
+        DataFrame des paramètres PARAM_NAMES (même index que deals)
+    """
+    params = pd.DataFrame(index=deals.index)
+    surface = pd.to_numeric(deals['surface'], errors='coerce')
+    params['surface'] = surface
+
+    if 'prix_bien' in deals.columns:
+        params['prix_bien'] = pd.to_numeric(deals['prix_bien'], errors='coerce')
+    elif 'prix_m2' in deals.columns:
+        params['prix_bien'] = pd.to_numeric(deals['prix_m2'], errors='coerce') * surface
+    else:
+        raise ValueError("Colonne prix_bien ou prix_m2 requise")
+
+    if 'loyer_mensuel' in deals.columns:
+        params['loyer_mensuel'] = pd.to_numeric(deals['loyer_mensuel'], errors='coerce')
+    elif 'loyer_m2' in deals.columns:
+        params['loyer_mensuel'] = pd.to_numeric(deals['loyer_m2'], errors='coerce') * surface
+    else:
+        raise ValueError("Colonne loyer_mensuel ou loyer_m2 requise")
+
+    if 'apport' in deals.columns:
+        params['apport'] = pd.to_numeric(deals['apport'], errors='coerce')
+    else:
+        params['apport'] = params['prix_bien'] * DEFAULT_APPORT_PCT
+
+    for name, default in DEFAULT_DEAL_PARAMS.items():
+        if name in deals.columns:
+            params[name] = pd.to_numeric(deals[name], errors='coerce').fillna(default)
+        else:
+            params[name] = float(default)
+
+    return params[PARAM_NAMES]
+
+
+def compute_taxes(params: pd.DataFrame, results: Dict, tmi) -> pd.DataFrame:
+    """
+    Fiscalité de la première année pour chaque bien (vectorisée)
+
+    Location nue : micro-foncier ou réel (charges, taxe foncière, assurance et
+    intérêts de la première année déductibles), selon calculate_tax_foncier.
+    Location meublée : micro-BIC. Plafonds et abattements : ceux de
+    utils.financial_calculator.
+
+    Args:
+        params: Paramètres (voir prepare_deals)
+        results: Résultat de simulate_batch
+        tmi: Tranche marginale d'imposition (%), scalaire ou vecteur
+
+    Returns:
+        DataFrame des revenus imposables, impôts et du régime le plus favorable
+    """
+    loyers = params['loyer_mensuel'].to_numpy() * 12
+    tmi = np.asarray(tmi, dtype=float)
+
+    # Intérêts de la première année (tableau d'amortissement en forme fermée)
+    interets = np.zeros(len(params))
+    avec_credit = ((params['taux_credit'] > 0) & (params['duree_credit'] > 0)).to_numpy()
+    if avec_credit.any():
+        echeancier = annual_loan_schedule(results['montant_emprunte'][avec_credit],
+                                          params['taux_credit'].to_numpy()[avec_credit],
+                                          params['duree_credit'].to_numpy()[avec_credit])
+        interets[avec_credit] = echeancier['interest'][:, 0]
+
+    charges_deductibles = (interets + params['charges_copro'].to_numpy() * 12
+                           + params['taxe_fonciere'].to_numpy()
+                           + params['assurance_pgl'].to_numpy() * 12)
+
+    fiscalite = calculate_tax_foncier(loyers, charges_deductibles, tmi)
+    impot_micro = fiscalite['impot_micro']
+    impot_reel = fiscalite['impot_reel']
+    micro_optimal = fiscalite['micro_eligible'] & (impot_micro <= impot_reel)
+    impot_nue = np.where(micro_optimal, impot_micro, impot_reel)
+
+    lmnp = calculate_tax_lmnp(loyers, charges_deductibles)
+    revenus_micro_bic = np.where(loyers <= PLAFOND_MICRO_BIC, lmnp['revenus_imposables_micro'], np.nan)
+
+    return pd.DataFrame({
+        'charges_deductibles': charges_deductibles,
+        'revenus_imposables_micro_foncier': fiscalite['revenus_imposables_micro'],
+        'impot_micro_foncier': impot_micro,
+        'revenus_imposables_reel': fiscalite['revenus_imposables_reel'],
+        'impot_reel': impot_reel,
+        'deficit_foncier': fiscalite['deficit_foncier'],
+        'regime_optimal': np.where(micro_optimal, 'Micro-Foncier', 'Réel'),
+        'impot_annuel': impot_nue,
+        'cashflow_annuel_apres_impot': results['cashflow_annuel'] - impot_nue,
+        'impot_micro_bic': revenus_micro_bic * tmi / 100 + calculate_social_charges(revenus_micro_bic)
+    }, index=params.index)
+
+
+def evaluate_deals(deals: pd.DataFrame, tmi: float = DEFAULT_TMI) -> pd.DataFrame:
+    """
+    Évalue un bloc d'annonces : indicateurs, TRI sur 20 ans et fiscalité
+
+    Args:
+        deals: Annonces (voir prepare_deals)
+        tmi: Tranche marginale par défaut (colonne tranche_marginale prioritaire)
+
+    Returns:
+        DataFrame : colonnes d'entrée suivies des résultats
+    """
+    params = prepare_deals(deals)
+    results = simulate_batch(params)
+
+    indicateurs = batch_to_frame(results)
+    indicateurs.index = deals.index
+    indicateurs['tri'] = compute_tri(params, results)
+
+    if 'tranche_marginale' in deals.columns:
+        tmi = pd.to_numeric(deals['tranche_marginale'], errors='coerce').fillna(tmi).to_numpy()
+    fiscalite = compute_taxes(params, results, tmi)
+
+    sortie = deals.copy()
+    for name in PARAM_NAMES:
+        if name not in sortie.columns:
+            sortie[name] = params[name]
+    return pd.concat([sortie, indicateurs, fiscalite], axis=1)
+
+
+def build_market_table(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Références de marché par commune, calculées une fois pour tout le lot
+
+    Args:
+        df: DataFrame DVF
+
+    Returns:
+        DataFrame indexé par insee_com (prix/m² moyen et médian, score)
+
+    Raises:
+        ValueError: Si les données DVF sont vides
+    """
+    from utils.market_analysis import score_all_communes
+
+    scores = score_all_communes(df)
+    if scores.empty:
+        raise ValueError("Aucune donnée DVF : comparaison au marché impossible")
+    scores = scores.set_index('insee_com')
+    rows = df[df['insee_com'].notna()]
+    medianes = rows.groupby(rows['insee_com'].astype(str))['prix_m2_moyen'].median()
+    return pd.DataFrame({
+        'prix_m2_marche': scores['prix_m2_mean'],
+        'prix_m2_median_marche': medianes.reindex(scores.index),
+        'score_marche': scores['score'],
+        'appreciation_marche': scores['appreciation']
+    })
+
+
+def compare_to_market_batch(evaluated: pd.DataFrame, market: pd.DataFrame,
+                            quantiles=None) -> pd.DataFrame:
+    """
+    Positionne le prix au m² de chaque bien par rapport à sa commune
+
+    Mêmes seuils que MarketReport.compare (écart à la moyenne, position par
+    rapport à la médiane).
+
+    Args:
+        evaluated: Biens évalués (colonnes insee_com, prix_bien, surface)
+        market: Table de build_market_table
+        quantiles: PriceQuantiles optionnel : ajoute les percentiles du prix
+                   dans la commune, le département et en France
+
+    Returns:
+        evaluated complété des colonnes de marché
+    """
+    codes = evaluated['insee_com'].astype(str).str.zfill(5)
+    ref = market.reindex(codes.to_numpy())
+    ref.index = evaluated.index
+
+    prix_m2 = evaluated['prix_bien'] / evaluated['surface']
+    mediane = ref['prix_m2_median_marche']
+    conditions = [prix_m2 < mediane * 0.8, prix_m2 < mediane, prix_m2 < mediane * 1.2,
+                  prix_m2 >= mediane * 1.2]
+
+    comparaison = ref.assign(
+        prix_m2=prix_m2,
+        ecart_marche_pct=(prix_m2 - ref['prix_m2_marche']) / ref['prix_m2_marche'] * 100,
+        positionnement=np.select(conditions, [
+            "Bien en dessous du marché", "En dessous du marché",
+            "Dans la moyenne du marché", "Au-dessus du marché"
+        ], default="Données insuffisantes"),
+        evaluation=np.select(conditions, [
+            "Excellent prix", "Bon prix", "Prix correct", "Prix élevé"
+        ], default="Données insuffisantes")
+    )
+    if quantiles is not None:
+        percentiles = quantiles.position(prix_m2.to_numpy(), codes.to_numpy())
+        percentiles.index = evaluated.index
+        comparaison = pd.concat([comparaison, percentiles], axis=1)
+    if 'prix_m2' in evaluated.columns:
+        comparaison = comparaison.drop(columns='prix_m2')
+    return pd.concat([evaluated, comparaison], axis=1)
+
+
+def _evaluate_chunk(args):
+    """Évalue un bloc (fonction de niveau module pour le pool de processus)"""
+    index, deals, tmi = args
+    return index, evaluate_deals(deals, tmi)
+
+
+class Checkpoint:
+    """
+    Point de reprise d'un traitement : blocs terminés et taille de la sortie
+
+    Enregistré à côté de la sortie (<sortie>.checkpoint.json) après chaque
+    bloc écrit ; une sortie CSV est tronquée à la dernière taille enregistrée
+    pour éliminer un bloc partiellement écrit.
+    """
+
+    def __init__(self, output: str, input_path: str, chunksize: int):
+        self.path = output + '.checkpoint.json'
+        self.state = {'input': os.path.abspath(input_path), 'chunksize': chunksize,
+                      'done': 0, 'rows': 0, 'bytes': 0}
+
+    def load(self) -> bool:
+        """Charge un point de reprise compatible ; False s'il n'y en a pas"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if state.get('input') != self.state['input'] or state.get('chunksize') != self.state['chunksize']:
+            return False
+        self.state = state
+        return True
+
+    def save(self) -> None:
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ResultWriter:
+    """Écriture en flux des résultats : CSV unique ou dossier de fichiers Parquet"""
+
+    def __init__(self, output: str, checkpoint: Checkpoint, resume: bool):
+        self.output = output
+        self.parquet = output.endswith('.parquet')
+        self.checkpoint = checkpoint
+
+        if self.parquet:
+            os.makedirs(output, exist_ok=True)
+            if not resume:
+                for name in os.listdir(output):
+                    if name.startswith('part-'):
+                        os.remove(os.path.join(output, name))
+        else:
+            os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+            with open(output, 'a+b') as f:
+                f.truncate(checkpoint.state['bytes'] if resume else 0)
+
+    def write(self, index: int, frame: pd.DataFrame) -> None:
+        if self.parquet:
+            frame.to_parquet(os.path.join(self.output, f'part-{index:06d}.parquet'), index=False)
+        else:
+            header = self.checkpoint.state['bytes'] == 0
+            frame.to_csv(self.output, mode='a', header=header, index=False)
+            self.checkpoint.state['bytes'] = os.path.getsize(self.output)
+
+        self.checkpoint.state['done'] = index + 1
+        self.checkpoint.state['rows'] += len(frame)
+        self.checkpoint.save()
+
+
+def _iter_chunks(path: str, chunksize: int, skip: int) -> Iterator:
+    """Blocs du fichier d'entrée, numérotés, en sautant les skip premiers"""
+    if path.endswith('.parquet'):
+        yield from _iter_parquet_chunks(path, chunksize, skip)
+        return
+    reader = pd.read_csv(path, chunksize=chunksize, dtype={'insee_com': str})
+    for index, chunk in enumerate(reader):
+        if index >= skip:
+            yield index, chunk
+
+
+def _iter_parquet_chunks(path: str, chunksize: int, skip: int) -> Iterator:
+    """
+    Blocs d'un fichier Parquet lus par lots (le fichier n'est jamais chargé
+    en entier) ; l'index des lignes continue d'un bloc à l'autre, comme avec
+    read_csv(chunksize=...)
+    """
+    import pyarrow.parquet as pq
+
+    debut = 0
+    for index, batch in enumerate(pq.ParquetFile(path).iter_batches(batch_size=chunksize)):
+        if index >= skip:
+            chunk = batch.to_pandas()
+            chunk.index = pd.RangeIndex(debut, debut + len(chunk))
+            if 'insee_com' in chunk.columns:
+                chunk['insee_com'] = chunk['insee_com'].astype(str)
+            yield index, chunk
+        debut += batch.num_rows
+
+
+def _bounded_map(pool: ProcessPoolExecutor, func, tasks: Iterable, window: int) -> Iterator:
+    """
+    Équivalent de pool.map limité à `window` tâches en cours
+
+    Executor.map soumet toutes les tâches d'emblée (tout le fichier serait lu
+    et sérialisé) ; ici un bloc n'est lu qu'une fois un résultat rendu. Les
+    résultats sont rendus dans l'ordre des tâches.
+    """
+    en_cours = deque()
+    for task in tasks:
+        en_cours.append(pool.submit(func, task))
+        if len(en_cours) >= window:
+            yield en_cours.popleft().result()
+    while en_cours:
+        yield en_cours.popleft().result()
+
+
+def run_batch(input_path: str, output: str, chunksize: int = DEFAULT_CHUNKSIZE,
+              workers: Optional[int] = None, tmi: float = DEFAULT_TMI,
+              market: bool = True, resume: bool = True, progress=None) -> Dict:
+    """
+    Évalue un fichier d'annonces par blocs, en parallèle, avec reprise
+
+    Args:
+        input_path: Fichier d'annonces (CSV ou Parquet)
+        output: Sortie (.csv, ou .parquet pour un dossier de fichiers)
+        chunksize: Nombre d'annonces par bloc
+        workers: Nombre de processus (1 = sans pool, None = nombre de cœurs)
+        tmi: Tranche marginale d'imposition par défaut (%)
+        market: Ajouter la comparaison au marché DVF (colonne insee_com)
+        resume: Reprendre au dernier point de reprise s'il existe
+        progress: Fonction optionnelle appelée avec (lignes traitées, secondes)
+
+    Returns:
+        Dictionnaire {'rows', 'chunks', 'seconds'}
+    """
+    debut = time.time()
+    checkpoint = Checkpoint(output, input_path, chunksize)
+    resume = resume and checkpoint.load()
+    writer = ResultWriter(output, checkpoint, resume)
+
+    market_table = quantiles = None
+    if market:
+        from utils.dvf_loader import get_data_dir, load_dvf_data
+        from utils.price_quantiles import get_price_quantiles
+        df = load_dvf_data()
+        if df.empty:
+            # Dossier DVF introuvable (DVF_DATA_DIR est relatif au répertoire courant)
+            warnings.warn(f"Aucune donnée DVF dans {os.path.abspath(get_data_dir())} : "
+                          "évaluation sans comparaison au marché (voir DVF_DATA_DIR)")
+        else:
+            market_table = build_market_table(df)
+            quantiles = get_price_quantiles(df)
+
+    taches = ((index, chunk, tmi) for index, chunk in
+              _iter_chunks(input_path, chunksize, checkpoint.state['done']))
+
+    def traiter(resultats):
+        for index, frame in resultats:
+            if market_table is not None and 'insee_com' in frame.columns:
+                frame = compare_to_market_batch(frame, market_table, quantiles)
+            writer.write(index, frame)
+            if progress is not None:
+                progress(checkpoint.state['rows'], time.time() - debut)
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            traiter(_bounded_map(pool, _evaluate_chunk, taches, 2 * workers))
+    else:
+        traiter(map(_evaluate_chunk, taches))
+
+    checkpoint.clear()
+    return {'rows': checkpoint.state['rows'], 'chunks': checkpoint.state['done'],
+            'seconds': time.time() - debut}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Point d'entrée en ligne de commande"""
+    parser = argparse.ArgumentParser(description="Évalue un fichier d'annonces immobilières")
+    parser.add_argument('input', help="Fichier d'annonces (CSV ou Parquet)")
+    parser.add_argument('--output', required=True,
+                        help="Sortie .csv, ou .parquet (dossier de fichiers)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Nombre de processus (défaut : nombre de cœurs)")
+    parser.add_argument('--tmi', type=float, default=DEFAULT_TMI,
+                        help="Tranche marginale d'imposition par défaut (%%)")
+    parser.add_argument('--no-market', action='store_true',
+                        help="Ne pas comparer aux données DVF")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignorer le point de reprise existant")
+    args = parser.parse_args(argv)
+
+    def progress(lignes: int, secondes: float) -> None:
+        vitesse = lignes / secondes if secondes > 0 else 0
+        print(f"\r{lignes:,} annonces évaluées ({vitesse:,.0f}/s)", end='',
+              file=sys.stderr, flush=True)
+
+    bilan = run_batch(args.input, args.output, args.chunksize, args.workers, args.tmi,
+                      market=not args.no_market, resume=not args.restart, progress=progress)
+    print(file=sys.stderr)
+    print(f"{args.output}: {bilan['rows']:,} annonces en {bilan['seconds']:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
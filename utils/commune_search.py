@@ -0,0 +1,213 @@
+"""
+Index de recherche des communes par nom ou code INSEE (préfixes, sous-chaînes
+et recherche approchée), construit une seule fois
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from utils.profiling import timed
+
+# Articles ignorés en tête de nom ("L'Abergement" se trouve avec "abergement")
+ARTICLES = {'l', 'le', 'la', 'les'}
+
+# Abréviations courantes développées avant recherche
+ABREVIATIONS = {'st': 'saint', 'ste': 'sainte'}
+
+# Similarité minimale (coefficient de Dice sur les trigrammes) en recherche approchée
+FUZZY_THRESHOLD = 0.45
+
+# Rangs des résultats (du plus pertinent au moins pertinent)
+RANG_EXACT, RANG_CODE, RANG_PREFIXE, RANG_MOT, RANG_SOUS_CHAINE, RANG_APPROCHE = range(6)
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_name(text: str) -> str:
+    """
+    Normalise un nom pour la recherche (minuscules, sans accents ni ponctuation)
+
+    Args:
+        text: Nom ou terme de recherche (ex: "Saint-Étienne", "st etienne")
+
+    Returns:
+        Nom normalisé (ex: "saint etienne")
+    """
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    ascii_text = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    words = _NON_ALNUM.sub(' ', ascii_text.lower()).split()
+    return ' '.join(ABREVIATIONS.get(w, w) for w in words)
+
+
+def _trigrams(text: str) -> set:
+    """Trigrammes d'un nom normalisé, bornés par des espaces"""
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CommuneSearchIndex:
+    """
+    Index de recherche construit une seule fois sur les communes
+
+    - préfixes de nom et de mot : tableau trié de clés normalisées (une clé
+      par début de mot), parcouru par recherche dichotomique ;
+    - codes INSEE : tableau trié, même principe ;
+    - sous-chaînes et fautes de frappe : listes de postings par trigramme.
+
+    Les résultats sont classés : nom exact, code, préfixe du nom, préfixe
+    d'un mot, sous-chaîne, puis correspondance approchée.
+    """
+
+    def __init__(self, code_to_name: Dict[str, str],
+                 available_codes: Optional[Iterable[str]] = None):
+        """
+        Args:
+            code_to_name: Dictionnaire code INSEE -> nom
+            available_codes: Codes à conserver (ex: communes présentes dans DVF)
+        """
+        if available_codes is not None:
+            allowed = set(available_codes)
+            code_to_name = {c: n for c, n in code_to_name.items() if c in allowed}
+
+        self.codes: List[str] = list(code_to_name)
+        self.names: List[str] = [code_to_name[c] for c in self.codes]
+        self.normalized: List[str] = [normalize_name(n) for n in self.names]
+
+        # Clés de préfixe : une par début de mot, rang selon la position
+        keys, key_ids, key_ranks = [], [], []
+        for i, norm in enumerate(self.normalized):
+            words = norm.split(' ')
+            offset = 0
+            en_tete = True
+            for word in words:
+                keys.append(norm[offset:])
+                key_ids.append(i)
+                key_ranks.append(RANG_PREFIXE if en_tete else RANG_MOT)
+                en_tete = en_tete and word in ARTICLES
+                offset += len(word) + 1
+
+        order = np.argsort(np.array(keys, dtype=object), kind='stable')
+        self._keys = np.array(keys, dtype=str)[order]
+        self._key_ids = np.array(key_ids, dtype=np.int32)[order]
+        self._key_ranks = np.array(key_ranks, dtype=np.int8)[order]
+
+        code_order = np.argsort(np.array(self.codes, dtype=object), kind='stable')
+        self._sorted_codes = np.array(self.codes, dtype=str)[code_order]
+        self._code_ids = code_order.astype(np.int32)
+
+        # Postings par trigramme (identifiants triés)
+        postings = defaultdict(list)
+        self._n_trigrams = np.zeros(len(self.codes), dtype=np.int32)
+        for i, norm in enumerate(self.normalized):
+            trigrams = _trigrams(norm)
+            self._n_trigrams[i] = len(trigrams)
+            for trigram in trigrams:
+                postings[trigram].append(i)
+        self._postings: Dict[str, np.ndarray] = {
+            t: np.array(ids, dtype=np.int32) for t, ids in postings.items()
+        }
+
+        # Ordre de présentation au sein d'un rang : noms courts, puis alphabétique
+        lengths = np.array([len(n) for n in self.normalized], dtype=np.int64)
+        alpha_rank = np.empty(len(self.codes), dtype=np.int64)
+        alpha_rank[np.argsort(np.array(self.normalized, dtype=object), kind='stable')] = \
+            np.arange(len(self.codes))
+        self._lengths = lengths
+        self._sort_key = lengths * max(len(self.codes), 1) + alpha_rank
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _prefix_range(self, sorted_keys: np.ndarray, prefix: str) -> slice:
+        """Plage des clés commençant par prefix (recherche dichotomique)"""
+        start = int(np.searchsorted(sorted_keys, prefix, side='left'))
+        stop = int(np.searchsorted(sorted_keys, prefix + '\uffff', side='left'))
+        return slice(start, stop)
+
+    def _substring_ids(self, query: str) -> np.ndarray:
+        """Communes dont le nom normalisé contient query (len(query) >= 3)"""
+        trigrams = {query[i:i + 3] for i in range(len(query) - 2)}
+        lists = sorted((self._postings.get(t) for t in trigrams),
+                       key=lambda p: 0 if p is None else len(p))
+        if not lists or lists[0] is None:
+            return np.array([], dtype=np.int32)
+        candidates = lists[0]
+        for posting in lists[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+        return np.array([i for i in candidates if query in self.normalized[i]], dtype=np.int32)
+
+    def _fuzzy_ids(self, query: str, limit: int) -> np.ndarray:
+        """Communes les plus proches de query (similarité de Dice sur les trigrammes)"""
+        trigrams = _trigrams(query)
+        postings = [self._postings[t] for t in trigrams if t in self._postings]
+        if not postings:
+            return np.array([], dtype=np.int32)
+        common = np.bincount(np.concatenate(postings), minlength=len(self.codes))
+        candidates = np.flatnonzero(common)
+        dice = 2 * common[candidates] / (len(trigrams) + self._n_trigrams[candidates])
+        keep = dice >= FUZZY_THRESHOLD
+        candidates, dice = candidates[keep], dice[keep]
+        best = np.lexsort((self._lengths[candidates], -dice))[:limit]
+        return candidates[best]
+
+    @timed('CommuneSearchIndex.search')
+    def search(self, search_term: str, max_results: int = 50, fuzzy: bool = True,
+               allowed: Optional[Set[str]] = None) -> List[Tuple[str, str]]:
+        """
+        Recherche des communes par code INSEE ou nom
+
+        Args:
+            search_term: Terme de recherche (accents, casse et tirets ignorés)
+            max_results: Nombre maximum de résultats
+            fuzzy: Compléter par une recherche approchée si peu de résultats
+            allowed: Codes INSEE autorisés (None = toutes les communes de l'index)
+
+        Returns:
+            Liste de tuples (code, nom), classés par pertinence
+        """
+        if not search_term or not self.codes:
+            return []
+
+        rangs: Dict[int, int] = {}
+
+        def ajouter(ids, rank, trier=True):
+            ids = np.asarray(ids, dtype=np.int64)
+            if trier:
+                ids = ids[np.argsort(self._sort_key[ids], kind='stable')]
+            for i in ids.tolist():
+                if len(rangs) >= max_results:
+                    return
+                if allowed is None or self.codes[i] in allowed:
+                    rangs.setdefault(i, rank)
+
+        # Recherche par code
+        code = search_term.strip().upper()
+        if code and code[0].isdigit():
+            plage = self._prefix_range(self._sorted_codes, code)
+            ajouter(self._code_ids[plage], RANG_CODE, trier=False)
+
+        query = normalize_name(search_term)
+        if query:
+            plage = self._prefix_range(self._keys, query)
+            ids, ranks = self._key_ids[plage], self._key_ranks[plage]
+
+            # Nom exact (clés égales au terme, en tête de plage), puis préfixe
+            # du nom, puis préfixe d'un mot
+            n_exact = int(np.searchsorted(self._keys, query, side='right')) - plage.start
+            ajouter(ids[:n_exact][ranks[:n_exact] == RANG_PREFIXE], RANG_EXACT)
+            ajouter(ids[ranks == RANG_PREFIXE], RANG_PREFIXE)
+            ajouter(ids[ranks == RANG_MOT], RANG_MOT)
+
+            if len(query) >= 3 and len(rangs) < max_results:
+                ajouter(self._substring_ids(query), RANG_SOUS_CHAINE)
+
+            if fuzzy and len(query) >= 3 and len(rangs) < max_results:
+                limite = max_results if allowed is None else len(self.codes)
+                ajouter(self._fuzzy_ids(query, limite), RANG_APPROCHE, trier=False)
+
+        return [(self.codes[i], self.names[i]) for i in rangs]
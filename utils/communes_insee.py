@@ -1,12 +1,17 @@
 """
 Module pour charger et gérer les données INSEE des communes
 """
+import threading
+
 import pandas as pd
 import streamlit as st
 from typing import Dict, Tuple, List, Optional
 
+from utils.commune_search import CommuneSearchIndex
+from utils.profiling import profiled_cache, timed
+
 
-@st.cache_data
+@profiled_cache(st.cache_data)
 def load_communes_insee() -> pd.DataFrame:
     """
     Charge le fichier des communes INSEE
@@ -33,6 +38,7 @@ def load_communes_insee() -> pd.DataFrame:
         return pd.DataFrame()
 
 
+@timed()
 def create_commune_search_dict(df_insee: pd.DataFrame) -> Tuple[Dict[str, str], Dict[str, str]]:
     """
     Crée des dictionnaires pour la recherche de communes
@@ -47,25 +53,67 @@ def create_commune_search_dict(df_insee: pd.DataFrame) -> Tuple[Dict[str, str],
         return {}, {}
     
     # Filtrer uniquement les communes (TYPECOM = 'COM')
-    df_communes = df_insee[df_insee['TYPECOM'] == 'COM'].copy()
+    df_communes = df_insee.loc[df_insee['TYPECOM'] == 'COM', ['COM', 'LIBELLE']].dropna()
     
     # Créer les dictionnaires
-    code_to_name = {}
-    name_to_code = {}
-    
-    for _, row in df_communes.iterrows():
-        code = row['COM']
-        libelle = row['LIBELLE']
-        
-        if pd.notna(code) and pd.notna(libelle):
-            code_to_name[code] = libelle
-            # Normaliser le nom pour la recherche
-            name_normalized = libelle.lower().strip()
-            name_to_code[name_normalized] = code
+    code_to_name = dict(zip(df_communes['COM'], df_communes['LIBELLE']))
+    # Normaliser le nom pour la recherche
+    name_to_code = dict(zip(df_communes['LIBELLE'].str.lower().str.strip(), df_communes['COM']))
     
     return code_to_name, name_to_code
 
 
+def load_commune_search_index() -> CommuneSearchIndex:
+    """
+    Retourne l'index de recherche des communes présentes dans DVF
+    
+    Construit une fois par version du jeu de données DVF (résultat dérivé
+    conservé dans le store, voir utils.dvf_loader.load_dvf_store).
+    
+    Returns:
+        CommuneSearchIndex partagé entre les sessions
+    """
+    from utils.dvf_loader import load_dvf_store
+    
+    store = load_dvf_store()
+    
+    def build():
+        code_to_name, _ = create_commune_search_dict(load_communes_insee())
+        return CommuneSearchIndex(code_to_name, available_codes=store.communes)
+    
+    return store.memoize(('commune_search_index',), build)
+
+
+# Dernier index construit par search_communes : (clé, dictionnaire, codes disponibles, index),
+# remplacé d'un bloc sous verrou (une session ne lit jamais un index d'un autre dictionnaire).
+# Les entrées sont conservées pour que leurs id() restent valides tant que la clé est en cache.
+_SEARCH_INDEX: Optional[Tuple[Tuple[int, int, int, int], Dict[str, str], List[str],
+                              CommuneSearchIndex]] = None
+_SEARCH_INDEX_LOCK = threading.Lock()
+
+
+def _search_index(code_to_name: Dict[str, str], available_codes) -> CommuneSearchIndex:
+    """
+    Index des communes disponibles, reconstruit seulement si les entrées changent
+    
+    La clé (identité et taille des deux entrées) se vérifie en O(1) à chaque
+    frappe ; les appelants passent des objets stables (résultats mis en cache),
+    une nouvelle liste ou un nouveau dictionnaire reconstruit l'index.
+    """
+    global _SEARCH_INDEX
+    key = (id(code_to_name), len(code_to_name), id(available_codes), len(available_codes))
+    with _SEARCH_INDEX_LOCK:
+        entry = _SEARCH_INDEX
+    if entry is not None and entry[0] == key:
+        return entry[3]
+    
+    index = CommuneSearchIndex(code_to_name, available_codes=available_codes)
+    with _SEARCH_INDEX_LOCK:
+        _SEARCH_INDEX = (key, code_to_name, available_codes, index)
+    return index
+
+
+@timed()
 def search_communes(search_term: str, code_to_name: Dict[str, str], 
                     available_codes: List[str], max_results: int = 50) -> List[Tuple[str, str]]:
     """
@@ -78,32 +126,15 @@ def search_communes(search_term: str, code_to_name: Dict[str, str],
         max_results: Nombre maximum de résultats
     
     Returns:
-        Liste de tuples (code, nom)
+        Liste de tuples (code, nom), classés par pertinence
+        (voir CommuneSearchIndex.search)
     """
     if not search_term:
         return []
     
-    search_lower = search_term.lower().strip()
-    results = []
-    
-    # Filtrer uniquement les communes disponibles dans les données DVF
-    available_codes_set = set(available_codes)
-    
-    for code, nom in code_to_name.items():
-        if code not in available_codes_set:
-            continue
-        
-        # Recherche par code
-        if search_lower in code.lower():
-            results.append((code, nom))
-        # Recherche par nom
-        elif search_lower in nom.lower():
-            results.append((code, nom))
-        
-        if len(results) >= max_results:
-            break
-    
-    return sorted(results, key=lambda x: x[1])  # Trier par nom
+    # Index restreint aux communes disponibles dans les données DVF
+    return _search_index(code_to_name, available_codes).search(search_term,
+                                                               max_results=max_results)
 
 
 def format_commune_option(code: str, nom: str) -> str:
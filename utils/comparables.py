@@ -0,0 +1,244 @@
+"""
+Recherche des communes-années comparables (k plus proches voisins) par
+surface, prix au m² et année, au sein d'un canton, d'un département ou de la
+France entière
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.dvf_store import DVFStore, get_store
+from utils.profiling import timed
+
+# Caractéristiques utilisables (colonne DVF -> colonne de la requête)
+FEATURES = {'surface_moy': 'surface', 'prix_m2_moyen': 'prix_m2', 'annee': 'annee'}
+
+# Échelle de chaque caractéristique : un écart d'une échelle compte pour une
+# unité de distance. Surfaces et prix sont comparés en écart relatif
+# (logarithme : 0.2 ≈ 20 %), les années en nombre d'années.
+DEFAULT_SCALES = {'surface_moy': 0.2, 'prix_m2_moyen': 0.2, 'annee': 2.0}
+LOG_FEATURES = ('surface_moy', 'prix_m2_moyen')
+
+# Périmètres de recherche : niveau -> colonne de la hiérarchie INSEE
+SCOPES = {'canton': 'can', 'departement': 'dep', 'national': None}
+DEFAULT_K = 10
+
+# Colonnes DVF rapportées pour chaque comparable
+RESULT_COLS = ['insee_com', 'annee', 'surface_moy', 'prix_m2_moyen', 'prix_moyen', 'nb_mutations']
+
+
+class ComparablesIndex:
+    """
+    Index des lignes commune-année pour la recherche de comparables
+
+    Les caractéristiques sont normalisées une fois (voir DEFAULT_SCALES) ;
+    un arbre k-d (scipy.spatial.cKDTree) est construit au premier besoin
+    pour chaque périmètre (un canton, un département, la France) et chaque
+    jeu de caractéristiques, puis conservé avec l'index.
+    """
+
+    def __init__(self, store: DVFStore, scales: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            store: DVFStore
+            scales: Échelles des caractéristiques (défaut : DEFAULT_SCALES)
+        """
+        from utils.hierarchy import attach_hierarchy, load_commune_hierarchy
+
+        self.version = store.version
+        self.scales = dict(DEFAULT_SCALES, **(scales or {}))
+        codes = np.asarray(store.insee_codes.codes, dtype=np.int64)
+        self.rows = store.df.iloc[:len(codes)]
+        self._codes = codes
+
+        # Caractéristiques normalisées (NaN si manquantes ou non positives)
+        self._features: Dict[str, np.ndarray] = {
+            col: self._normalize(col, self.rows[col].to_numpy(dtype=float))
+            for col in FEATURES if col in self.rows.columns
+        }
+
+        # Canton et département de chaque commune (référentiel INSEE)
+        self.communes = pd.Index(store.insee_codes.categories)
+        self.hierarchy = attach_hierarchy(self.communes, load_commune_hierarchy())
+
+        # Lignes de chaque entité, par périmètre
+        self._members: Dict[str, Dict[str, np.ndarray]] = {}
+        for scope, col in SCOPES.items():
+            if col is None:
+                continue
+            entites = self.hierarchy[col].astype(object).to_numpy()[codes]
+            self._members[scope] = pd.Series(np.arange(len(codes))).groupby(entites).indices
+
+        self._max_rows = int(np.bincount(codes).max()) if len(codes) else 0
+        self._trees: Dict[Tuple, Tuple[object, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def _normalize(self, col: str, values: np.ndarray) -> np.ndarray:
+        """Coordonnées d'une caractéristique (logarithme si relatif), divisées par l'échelle"""
+        values = np.asarray(values, dtype=float)
+        if col in LOG_FEATURES:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = np.where(values > 0, np.log(values), np.nan)
+        return values / self.scales[col]
+
+    def _tree(self, scope: str, entity: Optional[str], features: Tuple[str, ...]):
+        """Arbre k-d d'un périmètre (construit au premier appel) et positions des lignes"""
+        key = (scope, entity, features)
+        with self._lock:
+            if key in self._trees:
+                return self._trees[key]
+
+        from scipy.spatial import cKDTree
+
+        if scope == 'national':
+            positions = np.arange(len(self._codes))
+        else:
+            positions = self._members[scope].get(entity, np.array([], dtype=np.int64))
+        points = np.column_stack([self._features[col][positions] for col in features])
+        complets = ~np.isnan(points).any(axis=1)
+        positions, points = positions[complets], points[complets]
+        arbre = (cKDTree(points) if len(points) else None, positions)
+
+        with self._lock:
+            self._trees[key] = arbre
+        return arbre
+
+    def _entities(self, scope: str, insee_codes: np.ndarray) -> np.ndarray:
+        """Entité (canton, département) de chaque code INSEE de requête"""
+        if scope == 'national':
+            return np.full(len(insee_codes), None, dtype=object)
+        rangs = self.communes.get_indexer(insee_codes)
+        connues = rangs >= 0
+        entites = np.full(len(insee_codes), None, dtype=object)
+        entites[connues] = self.hierarchy[SCOPES[scope]].to_numpy(dtype=object)[rangs[connues]]
+        if scope == 'departement' and not connues.all():
+            # Commune sans données : département déduit du code (voir departement_from_code)
+            inconnues = pd.Series(insee_codes[~connues], dtype=str)
+            entites[~connues] = np.where(inconnues.str.startswith('97'),
+                                         inconnues.str[:3], inconnues.str[:2])
+        return entites
+
+    @timed()
+    def query(self, queries: pd.DataFrame, k: int = DEFAULT_K, scope: str = 'departement',
+              exclude_self: bool = False) -> pd.DataFrame:
+        """
+        Recherche les k comparables les plus proches de chaque requête
+
+        Args:
+            queries: Une ligne par requête, colonnes parmi surface, prix_m2,
+                     annee (au moins une) et insee_com (requis hors
+                     périmètre national). Les colonnes présentes définissent
+                     les caractéristiques comparées ; une requête où l'une
+                     d'elles manque n'a pas de résultat.
+            k: Nombre de comparables par requête
+            scope: 'canton', 'departement' ou 'national'
+            exclude_self: Exclut les lignes de la commune de la requête
+
+        Returns:
+            DataFrame (une ligne par comparable, triées par requête puis
+            distance) : requete (index de la requête), rang, distance et les
+            colonnes RESULT_COLS
+        """
+        if scope not in SCOPES:
+            raise ValueError(f"Périmètre inconnu : {scope}")
+        if k < 1:
+            raise ValueError("k doit être au moins 1")
+        features = tuple(col for col, nom in FEATURES.items()
+                         if nom in queries.columns and col in self._features)
+        if not features:
+            raise ValueError("Aucune caractéristique de comparaison (surface, prix_m2, annee)")
+
+        points = np.column_stack([
+            self._normalize(col, queries[FEATURES[col]].to_numpy(dtype=float)) for col in features
+        ])
+        if scope != 'national' and 'insee_com' not in queries.columns:
+            raise ValueError("La colonne insee_com est requise pour ce périmètre")
+        codes = (queries['insee_com'].astype(str).str.zfill(5).to_numpy(dtype=object)
+                 if 'insee_com' in queries.columns else np.full(len(queries), '', dtype=object))
+        entites = self._entities(scope, codes)
+        valides = ~np.isnan(points).any(axis=1)
+
+        # Requêtes regroupées par périmètre : un appel de l'arbre par groupe
+        requetes, positions, distances = [], [], []
+        groupes = pd.Series(np.arange(len(queries))[valides]).groupby(
+            pd.Series(entites[valides], dtype=object).fillna(''), sort=False).indices
+        for entite, membres in groupes.items():
+            indices = np.flatnonzero(valides)[membres]
+            arbre, lignes = self._tree(scope, entite or None, features)
+            if arbre is None:
+                continue
+            # Marge pour l'exclusion de la commune : ses lignes peuvent précéder les k voisins
+            demande = min(k + (self._max_rows if exclude_self else 0), len(lignes))
+            dist, idx = arbre.query(points[indices], k=demande)
+            dist, idx = dist.reshape(len(indices), -1), idx.reshape(len(indices), -1)
+            trouvees = lignes[idx]
+            garder = np.ones(trouvees.shape, dtype=bool)
+            if exclude_self:
+                propres = self.communes.get_indexer(codes[indices])
+                garder = self._codes[trouvees] != propres[:, None]
+            # Les k premiers résultats conservés de chaque requête
+            garder &= np.cumsum(garder, axis=1) <= k
+            lignes_requete = np.repeat(indices, garder.sum(axis=1))
+            requetes.append(lignes_requete)
+            positions.append(trouvees[garder])
+            distances.append(dist[garder])
+
+        if not requetes:
+            return pd.DataFrame(columns=['requete', 'rang', 'distance'] + RESULT_COLS)
+
+        requetes = np.concatenate(requetes)
+        positions = np.concatenate(positions)
+        distances = np.concatenate(distances)
+        ordre = np.lexsort((distances, requetes))
+        requetes, positions, distances = requetes[ordre], positions[ordre], distances[ordre]
+
+        resultat = self.rows.iloc[positions][[c for c in RESULT_COLS if c in self.rows.columns]]
+        resultat = resultat.reset_index(drop=True)
+        resultat['insee_com'] = resultat['insee_com'].astype(str)
+        rangs = np.arange(len(requetes)) - np.searchsorted(requetes, requetes, side='left') + 1
+        resultat.insert(0, 'requete', queries.index.to_numpy()[requetes])
+        resultat.insert(1, 'rang', rangs)
+        resultat.insert(2, 'distance', distances)
+        return resultat
+
+
+def get_comparables_index(data) -> ComparablesIndex:
+    """
+    Retourne l'index des comparables des données DVF (construit une fois par store)
+
+    Args:
+        data: DVFStore ou DataFrame DVF
+
+    Returns:
+        ComparablesIndex
+    """
+    store = get_store(data)
+    return store.memoize(('comparables_index',), lambda: ComparablesIndex(store))
+
+
+def find_comparables(data, surface: Optional[float] = None, prix_m2: Optional[float] = None,
+                     annee: Optional[int] = None, insee: Optional[str] = None,
+                     k: int = DEFAULT_K, scope: str = 'departement',
+                     exclude_self: bool = False) -> pd.DataFrame:
+    """
+    Comparables d'un bien (voir ComparablesIndex.query)
+
+    Args:
+        data: DVFStore ou DataFrame DVF
+        surface: Surface du bien (m²)
+        prix_m2: Prix au m²
+        annee: Année de référence
+        insee: Code INSEE de la commune du bien
+        k: Nombre de comparables
+        scope: 'canton', 'departement' ou 'national'
+        exclude_self: Exclut la commune du bien
+
+    Returns:
+        DataFrame des k comparables, du plus proche au plus éloigné
+    """
+    requete = {nom: [valeur] for nom, valeur in
+               [('surface', surface), ('prix_m2', prix_m2), ('annee', annee), ('insee_com', insee)]
+               if valeur is not None}
+    return get_comparables_index(data).query(pd.DataFrame(requete), k, scope, exclude_self)
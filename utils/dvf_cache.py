@@ -0,0 +1,192 @@
+"""
+Cache disque colonnaire (Parquet) des fichiers DVF normalisés
+
+Chaque fichier `data/dvfYYYY.csv` est converti une seule fois en Parquet typé.
+Un fichier de signature (JSON) conserve le mtime, la taille et le SHA-256 du CSV
+source : le cache n'est reconstruit que si le contenu du CSV a réellement changé.
+"""
+import hashlib
+import json
+import os
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+from utils.profiling import timed
+
+# Version du format de cache : à incrémenter si la normalisation change
+CACHE_FORMAT_VERSION = 2
+
+# Dossier du cache (surchargeable par variable d'environnement)
+DEFAULT_CACHE_DIR = os.path.join("data", ".cache")
+
+
+def get_cache_dir() -> str:
+    """Retourne le dossier du cache DVF"""
+    return os.environ.get("DVF_CACHE_DIR", DEFAULT_CACHE_DIR)
+
+
+def file_sha256(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Calcule l'empreinte SHA-256 d'un fichier par blocs
+
+    Args:
+        file_path: Chemin du fichier
+        chunk_size: Taille des blocs lus
+
+    Returns:
+        Empreinte hexadécimale
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_paths(source_path: str, cache_dir: str):
+    """
+    Retourne les chemins (données, signature) du cache d'un fichier source
+
+    Le nom inclut une empreinte du chemin absolu : deux dossiers de données
+    (ex: DVF_DATA_DIR des benchmarks et données réelles) ne partagent pas
+    la même entrée de cache.
+    """
+    empreinte = hashlib.sha256(os.path.abspath(source_path).encode("utf-8")).hexdigest()[:12]
+    base = f"{os.path.splitext(os.path.basename(source_path))[0]}-{empreinte}"
+    return (os.path.join(cache_dir, f"{base}.parquet"),
+            os.path.join(cache_dir, f"{base}.json"))
+
+
+def _read_signature(signature_path: str) -> Optional[Dict]:
+    """Lit le fichier de signature, None s'il est absent ou illisible"""
+    try:
+        with open(signature_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path: str, writer: Callable[[str], None]) -> None:
+    """Écrit un fichier via un fichier temporaire puis un renommage atomique"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _write_signature(signature_path: str, signature: Dict) -> None:
+    """Écrit le fichier de signature de manière atomique"""
+    def writer(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(signature, f)
+    _write_atomic(signature_path, writer)
+
+
+def is_cache_valid(source_path: str, cache_dir: Optional[str] = None) -> bool:
+    """
+    Indique si le cache d'un fichier source est à jour
+
+    Le mtime et la taille sont comparés d'abord (sans lire le fichier). S'ils
+    diffèrent, le SHA-256 est recalculé : un simple `touch` ne déclenche donc
+    pas de reconstruction, la signature est seulement rafraîchie.
+
+    Args:
+        source_path: Chemin du CSV source
+        cache_dir: Dossier du cache (défaut: get_cache_dir())
+
+    Returns:
+        True si le cache peut être utilisé
+    """
+    cache_dir = cache_dir or get_cache_dir()
+    data_path, signature_path = _cache_paths(source_path, cache_dir)
+
+    signature = _read_signature(signature_path)
+    if not signature or not os.path.exists(data_path):
+        return False
+    if signature.get("version") != CACHE_FORMAT_VERSION:
+        return False
+
+    stat = os.stat(source_path)
+    if signature.get("mtime_ns") == stat.st_mtime_ns and signature.get("size") == stat.st_size:
+        return True
+
+    # mtime modifié : vérifier le contenu réel
+    if signature.get("sha256") != file_sha256(source_path):
+        return False
+
+    signature.update({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size})
+    try:
+        _write_signature(signature_path, signature)
+    except OSError:
+        pass
+    return True
+
+
+@timed()
+def load_cached_frame(source_path: str, builder: Callable[[str], pd.DataFrame],
+                      cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    Charge un DataFrame depuis le cache Parquet, ou le construit et le met en cache
+
+    Args:
+        source_path: Chemin du CSV source
+        builder: Fonction construisant le DataFrame normalisé à partir du CSV
+        cache_dir: Dossier du cache (défaut: get_cache_dir())
+
+    Returns:
+        DataFrame normalisé
+    """
+    cache_dir = cache_dir or get_cache_dir()
+    data_path, signature_path = _cache_paths(source_path, cache_dir)
+
+    try:
+        if is_cache_valid(source_path, cache_dir):
+            return pd.read_parquet(data_path)
+    except Exception:
+        # Cache corrompu ou moteur Parquet indisponible : reconstruire
+        pass
+
+    df = builder(source_path)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        stat = os.stat(source_path)
+        signature = {
+            "version": CACHE_FORMAT_VERSION,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": file_sha256(source_path),
+        }
+        _write_atomic(data_path, lambda tmp: df.to_parquet(tmp, index=False))
+        _write_signature(signature_path, signature)
+    except Exception:
+        # Le cache est une optimisation : un échec d'écriture n'est pas bloquant
+        pass
+
+    return df
+
+
+def clear_cache(cache_dir: Optional[str] = None) -> int:
+    """
+    Supprime les fichiers du cache DVF
+
+    Args:
+        cache_dir: Dossier du cache (défaut: get_cache_dir())
+
+    Returns:
+        Nombre de fichiers supprimés
+    """
+    cache_dir = cache_dir or get_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith((".parquet", ".json")):
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
@@ -0,0 +1,385 @@
+"""
+Ingestion des fichiers DVF bruts (une ligne par local et par parcelle) par
+blocs, et réduction au format agrégé commune × année lu par load_dvf_data
+
+Usage :
+    python -m utils.dvf_ingest full_2024.csv.gz --output data/dvf{year}.csv
+"""
+import argparse
+import csv
+import os
+import sys
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# Formats reconnus : fichiers géolocalisés Etalab (geo-dvf) et fichiers
+# « valeurs foncières » de la DGFiP. Colonnes source -> colonnes internes.
+RAW_FORMATS = {
+    'etalab': {
+        'sep': ',',
+        'decimal': '.',
+        'columns': {
+            'id_mutation': 'mutation',
+            'date_mutation': 'date',
+            'nature_mutation': 'nature',
+            'valeur_fonciere': 'valeur',
+            'code_commune': 'insee_com',
+            'type_local': 'type_local',
+            'surface_reelle_bati': 'surface'
+        }
+    },
+    'dgfip': {
+        'sep': '|',
+        'decimal': ',',
+        'columns': {
+            'No disposition': 'disposition',
+            'Date mutation': 'date',
+            'Nature mutation': 'nature',
+            'Valeur fonciere': 'valeur',
+            'Code departement': 'departement',
+            'Code commune': 'commune',
+            'Type local': 'type_local',
+            'Surface reelle bati': 'surface'
+        }
+    }
+}
+
+# Natures de mutation retenues et types de locaux comptés
+NATURES = {'Vente'}
+TYPE_MAISON = 'Maison'
+TYPE_APPARTEMENT = 'Appartement'
+
+DEFAULT_CHUNKSIZE = 500_000
+DEFAULT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+# Colonnes du schéma agrégé (voir load_dvf_data) et en-têtes des CSV dvfYYYY
+OUTPUT_HEADERS = {
+    'insee_com': 'INSEE_COM',
+    'annee': 'annee',
+    'nb_mutations': 'nb_mutations',
+    'nb_maisons': 'NbMaisons',
+    'nb_apparts': 'NbApparts',
+    'prop_maison': 'PropMaison',
+    'prop_appart': 'PropAppart',
+    'prix_moyen': 'PrixMoyen',
+    'prix_m2_moyen': 'Prixm2Moyen',
+    'surface_moy': 'SurfaceMoy'
+}
+
+# Sommes partielles accumulées par (commune, année)
+_SUM_COLS = ['nb_mutations', 'nb_maisons', 'nb_apparts', 'somme_prix', 'somme_prix_m2',
+             'somme_surface']
+
+
+def detect_format(path: str) -> str:
+    """
+    Détecte le format d'un fichier DVF brut d'après son en-tête
+
+    Args:
+        path: Chemin du fichier (éventuellement compressé)
+
+    Returns:
+        'etalab' ou 'dgfip'
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    if 'id_mutation' in header:
+        return 'etalab'
+    header = pd.read_csv(path, sep='|', nrows=0).columns
+    if 'Valeur fonciere' in header:
+        return 'dgfip'
+    raise ValueError(f"Format DVF non reconnu: {path}")
+
+
+def _normalize_chunk(chunk: pd.DataFrame, fmt: str) -> pd.DataFrame:
+    """Renomme les colonnes d'un bloc et construit les clés (mutation, commune)"""
+    chunk = chunk.rename(columns=RAW_FORMATS[fmt]['columns'])
+
+    if fmt == 'dgfip':
+        # Pas d'identifiant de mutation : date, valeur, commune et disposition
+        dep = chunk['departement'].str.zfill(2)
+        commune = chunk['commune'].str.zfill(3)
+        # Outre-mer : département sur 3 caractères, code commune 97 + 3 chiffres
+        chunk['insee_com'] = dep.where(dep.str.len() == 2, dep.str[:2]) + commune
+        chunk['mutation'] = (chunk['date'] + '|' + chunk['valeur'].astype(str) + '|'
+                             + chunk['insee_com'] + '|' + chunk['disposition'].astype(str))
+        chunk['annee'] = chunk['date'].str[-4:]
+    else:
+        chunk['annee'] = chunk['date'].str[:4]
+
+    chunk['annee'] = pd.to_numeric(chunk['annee'], errors='coerce')
+    return chunk[['mutation', 'annee', 'nature', 'valeur', 'insee_com', 'type_local', 'surface']]
+
+
+def reduce_mutations(lines: pd.DataFrame) -> pd.DataFrame:
+    """
+    Réduit des lignes brutes complètes (toutes les lignes de chaque mutation)
+    à une ligne par vente d'un seul logement
+
+    Les lignes répétées d'un même local (plusieurs lots ou parcelles) sont
+    dédoublonnées ; seules les ventes d'exactement une maison ou un
+    appartement (dépendances éventuelles) de valeur et surface connues sont
+    conservées, pour que le prix au m² soit significatif.
+
+    Args:
+        lines: Lignes normalisées (mutation, annee, nature, valeur, insee_com,
+               type_local, surface)
+
+    Returns:
+        DataFrame (insee_com, annee, maison, prix, surface, prix_m2) par mutation
+    """
+    ventes = lines[lines['nature'].isin(NATURES)]
+    locaux = ventes[ventes['type_local'].isin([TYPE_MAISON, TYPE_APPARTEMENT])]
+    locaux = locaux.drop_duplicates(['mutation', 'type_local', 'surface', 'insee_com'])
+
+    par_mutation = locaux.groupby('mutation', sort=False).agg(
+        n_locaux=('type_local', 'size'),
+        type_local=('type_local', 'first'),
+        insee_com=('insee_com', 'first'),
+        annee=('annee', 'first'),
+        prix=('valeur', 'first'),
+        surface=('surface', 'sum')
+    )
+    par_mutation = par_mutation[(par_mutation['n_locaux'] == 1)
+                                & (par_mutation['prix'] > 0)
+                                & (par_mutation['surface'] > 0)
+                                & par_mutation['annee'].notna()]
+
+    return pd.DataFrame({
+        'insee_com': par_mutation['insee_com'].to_numpy(),
+        'annee': par_mutation['annee'].to_numpy(dtype=np.int64),
+        'maison': (par_mutation['type_local'] == TYPE_MAISON).to_numpy(),
+        'prix': par_mutation['prix'].to_numpy(dtype=float),
+        'surface': par_mutation['surface'].to_numpy(dtype=float),
+        'prix_m2': (par_mutation['prix'] / par_mutation['surface']).to_numpy(dtype=float)
+    })
+
+
+def iter_raw_chunks(path: str, fmt: Optional[str] = None,
+                    chunksize: int = DEFAULT_CHUNKSIZE) -> Iterable[pd.DataFrame]:
+    """
+    Lit un fichier DVF brut par blocs de lignes normalisées
+
+    Les lignes d'une même mutation étant consécutives dans les fichiers
+    publiés, la dernière mutation de chaque bloc est reportée sur le bloc
+    suivant : chaque bloc rendu contient des mutations complètes.
+
+    Args:
+        path: Chemin du fichier (.csv, .txt, éventuellement compressé)
+        fmt: 'etalab' ou 'dgfip' (détecté si None)
+        chunksize: Nombre de lignes lues à la fois (mémoire bornée)
+
+    Yields:
+        Blocs de lignes normalisées
+    """
+    fmt = fmt or detect_format(path)
+    spec = RAW_FORMATS[fmt]
+    reader = pd.read_csv(
+        path, sep=spec['sep'], decimal=spec['decimal'], usecols=list(spec['columns']),
+        dtype={col: str for col in spec['columns']
+               if spec['columns'][col] not in ('valeur', 'surface')},
+        chunksize=chunksize
+    )
+
+    report = None
+    for chunk in reader:
+        chunk = _normalize_chunk(chunk, fmt)
+        if report is not None:
+            chunk = pd.concat([report, chunk], ignore_index=True)
+        derniere = chunk['mutation'].iloc[-1]
+        fin = chunk['mutation'] == derniere
+        report = chunk[fin]
+        if (~fin).any():
+            yield chunk[~fin]
+    if report is not None and not report.empty:
+        yield report
+
+
+class DVFAggregator:
+    """
+    Réduction incrémentale des ventes au format agrégé commune × année
+
+    Les moyennes sont tenues par sommes partielles ; si des quantiles sont
+    demandés, les prix de chaque vente sont conservés pour un calcul exact en
+    fin de traitement (16 octets par vente).
+    """
+
+    # Nombre de blocs partiels au-delà duquel ils sont fusionnés
+    COMPACT_EVERY = 32
+
+    def __init__(self, quantiles: Optional[Sequence[float]] = None):
+        """
+        Args:
+            quantiles: Quantiles exacts à calculer (ex: (0.25, 0.5, 0.75)),
+                       None pour les seules moyennes
+        """
+        self.quantiles = list(quantiles) if quantiles else []
+        self._partials: List[pd.DataFrame] = []
+        self._values: Dict[str, List[np.ndarray]] = {
+            'insee_com': [], 'annee': [], 'prix': [], 'prix_m2': []
+        }
+
+    def add(self, ventes: pd.DataFrame) -> None:
+        """
+        Ajoute des ventes (voir reduce_mutations)
+
+        Args:
+            ventes: DataFrame (insee_com, annee, maison, prix, surface, prix_m2)
+        """
+        if ventes.empty:
+            return
+        partiel = pd.DataFrame({
+            'insee_com': ventes['insee_com'],
+            'annee': ventes['annee'],
+            'nb_mutations': 1,
+            'nb_maisons': ventes['maison'].astype(int),
+            'nb_apparts': (~ventes['maison']).astype(int),
+            'somme_prix': ventes['prix'],
+            'somme_prix_m2': ventes['prix_m2'],
+            'somme_surface': ventes['surface']
+        }).groupby(['insee_com', 'annee']).sum()
+        self._partials.append(partiel)
+        if len(self._partials) >= self.COMPACT_EVERY:
+            self._partials = [self._merge_partials()]
+
+        if self.quantiles:
+            self._values['insee_com'].append(ventes['insee_com'].to_numpy(dtype=object))
+            self._values['annee'].append(ventes['annee'].to_numpy(dtype=np.int16))
+            self._values['prix'].append(ventes['prix'].to_numpy(dtype=float))
+            self._values['prix_m2'].append(ventes['prix_m2'].to_numpy(dtype=float))
+
+    def _merge_partials(self) -> pd.DataFrame:
+        """Fusionne les sommes partielles accumulées"""
+        if not self._partials:
+            return pd.DataFrame(columns=_SUM_COLS,
+                                index=pd.MultiIndex.from_arrays([[], []], names=['insee_com', 'annee']))
+        return pd.concat(self._partials).groupby(level=['insee_com', 'annee']).sum()
+
+    def _quantile_columns(self, index: pd.MultiIndex) -> pd.DataFrame:
+        """Médianes et quantiles exacts par (commune, année), alignés sur index"""
+        insee = np.concatenate(self._values['insee_com'])
+        annee = np.concatenate(self._values['annee']).astype(np.int64)
+        # Groupe (position dans index) de chaque vente
+        groupe_vente = index.get_indexer(pd.MultiIndex.from_arrays([insee, annee]))
+
+        counts = np.bincount(groupe_vente, minlength=len(index))
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        colonnes = {}
+        for nom in ('prix', 'prix_m2'):
+            valeurs = np.concatenate(self._values[nom])
+            triees = valeurs[np.lexsort((valeurs, groupe_vente))]
+            for q in sorted(set(self.quantiles) | {0.5}):
+                # Interpolation linéaire (méthode par défaut de numpy.quantile)
+                rang = q * (counts - 1)
+                bas = np.floor(rang).astype(np.int64)
+                haut = np.minimum(bas + 1, counts - 1)
+                poids = rang - bas
+                valeur = (triees[starts + bas] * (1 - poids) + triees[starts + haut] * poids)
+                suffixe = 'median' if q == 0.5 else f'q{round(q * 100):02d}'
+                colonnes[f'{nom}_{suffixe}'] = valeur
+        return pd.DataFrame(colonnes, index=index)
+
+    def result(self) -> pd.DataFrame:
+        """
+        Retourne le tableau agrégé
+
+        Returns:
+            DataFrame au schéma de load_dvf_data (insee_com, annee, nb_mutations,
+            nb_maisons, nb_apparts, prop_maison, prop_appart, prix_moyen,
+            prix_m2_moyen, surface_moy), suivi des colonnes de quantiles
+        """
+        sommes = self._merge_partials()
+        n = sommes['nb_mutations']
+        table = pd.DataFrame({
+            'nb_mutations': n.astype(np.int64),
+            'nb_maisons': sommes['nb_maisons'].astype(np.int64),
+            'nb_apparts': sommes['nb_apparts'].astype(np.int64),
+            'prop_maison': sommes['nb_maisons'] / n * 100,
+            'prop_appart': sommes['nb_apparts'] / n * 100,
+            'prix_moyen': sommes['somme_prix'] / n,
+            'prix_m2_moyen': sommes['somme_prix_m2'] / n,
+            'surface_moy': sommes['somme_surface'] / n
+        }, index=sommes.index)
+
+        if self.quantiles and len(table):
+            table = table.join(self._quantile_columns(table.index))
+        return table.reset_index()
+
+
+def ingest_raw_dvf(paths: Union[str, Sequence[str]], fmt: Optional[str] = None,
+                   chunksize: int = DEFAULT_CHUNKSIZE,
+                   quantiles: Optional[Sequence[float]] = None,
+                   progress=None) -> pd.DataFrame:
+    """
+    Agrège un ou plusieurs fichiers DVF bruts en mémoire bornée
+
+    Args:
+        paths: Chemin(s) des fichiers bruts
+        fmt: 'etalab' ou 'dgfip' (détecté par fichier si None)
+        chunksize: Nombre de lignes lues à la fois
+        quantiles: Quantiles exacts à ajouter (prix et prix au m²)
+        progress: Fonction optionnelle appelée avec le nombre de lignes lues
+
+    Returns:
+        DataFrame au schéma de load_dvf_data (une ligne par commune et par année)
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+
+    aggregator = DVFAggregator(quantiles)
+    lignes = 0
+    for path in paths:
+        for chunk in iter_raw_chunks(path, fmt, chunksize):
+            aggregator.add(reduce_mutations(chunk))
+            lignes += len(chunk)
+            if progress is not None:
+                progress(lignes)
+    return aggregator.result()
+
+
+def write_dvf_csv(df: pd.DataFrame, path: str) -> None:
+    """
+    Écrit un tableau agrégé au format des fichiers data/dvfYYYY.csv
+
+    Args:
+        df: Résultat de ingest_raw_dvf
+        path: Chemin du CSV
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    df.rename(columns=OUTPUT_HEADERS).to_csv(path, index=False, quoting=csv.QUOTE_NONNUMERIC)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Point d'entrée en ligne de commande"""
+    parser = argparse.ArgumentParser(
+        description="Agrège des fichiers DVF bruts au format commune × année"
+    )
+    parser.add_argument('paths', nargs='+', help="Fichiers DVF bruts (Etalab ou DGFiP)")
+    parser.add_argument('--output', default=os.path.join('data', 'dvf{year}.csv'),
+                        help="CSV de sortie ; {year} produit un fichier par année")
+    parser.add_argument('--format', choices=sorted(RAW_FORMATS), default=None)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--quantiles', action='store_true',
+                        help="Ajouter médianes et quantiles exacts")
+    args = parser.parse_args(argv)
+
+    def progress(lignes: int) -> None:
+        print(f"\r{lignes:,} lignes lues", end='', file=sys.stderr, flush=True)
+
+    df = ingest_raw_dvf(args.paths, args.format, args.chunksize,
+                        DEFAULT_QUANTILES if args.quantiles else None, progress)
+    print(file=sys.stderr)
+
+    if '{year}' in args.output:
+        for annee, rows in df.groupby('annee'):
+            write_dvf_csv(rows, args.output.format(year=annee))
+            print(f"{args.output.format(year=annee)}: {len(rows):,} communes")
+    else:
+        write_dvf_csv(df, args.output)
+        print(f"{args.output}: {len(df):,} lignes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,130 @@
 """
 Module de chargement et normalisation des données DVF (Demandes de Valeurs Foncières)
 """
+import hashlib
 import pandas as pd
 import os
-from typing import Optional, List, Dict
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict, Tuple
 import streamlit as st
+from utils import profiling
+from utils.dvf_cache import CACHE_FORMAT_VERSION, load_cached_frame
+from utils.dvf_memory import compact_dtypes
+from utils.dvf_store import DVFStore, get_store, store_cached
+from utils.hierarchy import get_hierarchy_cube
+from utils.insee_codes import consolidate_communes, load_code_remap, remap_insee_codes
+from utils.market_report import build_commune_report, build_market_report, compute_row_stats
+from utils.profiling import timed
+from utils.rankings import get_rankings
 
-@st.cache_data
-def load_dvf_data(years: Optional[List[int]] = None) -> pd.DataFrame:
+# Mapper les anciennes colonnes vers les nouvelles
+COLUMN_MAPPING = {
+    'annee': 'annee',
+    'année': 'annee',
+    'insee_com': 'insee_com',
+    'nb_mutations': 'nb_mutations',
+    'nbmaisons': 'nb_maisons',
+    'nbapparts': 'nb_apparts',
+    'propmaison': 'prop_maison',
+    'propappart': 'prop_appart',
+    'prixmoyen': 'prix_moyen',
+    'prixm2moyen': 'prix_m2_moyen',
+    'surfacemoy': 'surface_moy'
+}
+
+NUMERIC_COLS = ['nb_mutations', 'nb_maisons', 'nb_apparts',
+                'prop_maison', 'prop_appart', 'prix_moyen',
+                'prix_m2_moyen', 'surface_moy']
+
+# Dossier des fichiers dvfYYYY.csv (surchargeable par variable d'environnement)
+DEFAULT_DATA_DIR = "data"
+
+# Années chargées par défaut
+DEFAULT_YEARS = [2017, 2022, 2023, 2024]
+
+# Versions du jeu de données conservées en mémoire (fichiers modifiés, autres années)
+MAX_DATASET_VERSIONS = 4
+
+
+def get_data_dir() -> str:
+    """Retourne le dossier des fichiers DVF"""
+    return os.environ.get("DVF_DATA_DIR", DEFAULT_DATA_DIR)
+
+
+@timed()
+def read_dvf_csv(file_path: str, year: int) -> pd.DataFrame:
     """
-    Charge les données DVF pour les années spécifiées
+    Lit et normalise un fichier DVF annuel
+
+    Args:
+        file_path: Chemin du fichier CSV
+        year: Année du fichier (utilisée si la colonne année est absente)
+
+    Returns:
+        DataFrame avec colonnes normalisées et typées
+    """
+    # Codes INSEE lus comme texte (zéros initiaux, ex: '01001')
+    df = pd.read_csv(file_path, dtype={'INSEE_COM': str, 'insee_com': str})
+    
+    # Normaliser les noms de colonnes
+    df.columns = df.columns.str.lower().str.strip()
+    df = df.rename(columns=COLUMN_MAPPING)
+    
+    # Numéros de ligne exportés avec les fichiers (colonne sans nom)
+    df = df.drop(columns=[c for c in df.columns if c.startswith('unnamed:')])
+    
+    # Assurer que la colonne année existe
+    if 'annee' not in df.columns:
+        df['annee'] = year
+    
+    for col in NUMERIC_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    
+    return df
+
+
+def dataset_version(years: Optional[List[int]] = None) -> str:
+    """
+    Jeton de version du jeu de données DVF
+
+    Calculé à partir du dossier, des années, de la taille et de la date de
+    modification de chaque fichier dvfYYYY.csv et du format du cache : il
+    change dès qu'un fichier source est remplacé. Quelques appels à os.stat,
+    sans lecture des fichiers.
+
+    Args:
+        years: Années chargées (None = DEFAULT_YEARS)
+
+    Returns:
+        Jeton hexadécimal (16 caractères)
+    """
+    data_dir = get_data_dir()
+    empreinte = hashlib.sha256(f"{CACHE_FORMAT_VERSION}|{os.path.abspath(data_dir)}".encode())
+    for year in (years or DEFAULT_YEARS):
+        file_path = os.path.join(data_dir, f"dvf{year}.csv")
+        try:
+            info = os.stat(file_path)
+            empreinte.update(f"|{year}:{info.st_size}:{info.st_mtime_ns}".encode())
+        except OSError:
+            empreinte.update(f"|{year}:absent".encode())
+    return empreinte.hexdigest()[:16]
+
+
+@timed()
+def read_dvf_dataset(years: Optional[List[int]] = None) -> pd.DataFrame:
+    """
+    Lit et normalise les données DVF des années spécifiées (sans cache mémoire)
+    
+    Les fichiers normalisés sont lus depuis le cache Parquet (voir
+    utils.dvf_cache), reconstruit uniquement quand un CSV source change.
+    Les anciens codes INSEE (communes fusionnées depuis) sont remplacés par
+    les codes actuels, pour que l'historique d'une commune soit continu.
+    Les colonnes sont ensuite converties en types compacts (voir
+    utils.dvf_memory.compact_dtypes) : codes INSEE catégoriels, années et
+    comptages entiers, prix en float32.
     
     Args:
         years: Liste des années à charger (ex: [2022, 2023, 2024])
@@ -18,42 +133,17 @@ def load_dvf_data(years: Optional[List[int]] = None) -> pd.DataFrame:
     Returns:
         DataFrame avec les données DVF normalisées
     """
-    data_dir = "data"
+    data_dir = get_data_dir()
     all_data = []
     
     if years is None:
-        years = [2017, 2022, 2023, 2024]
+        years = DEFAULT_YEARS
     
     for year in years:
         file_path = os.path.join(data_dir, f"dvf{year}.csv")
         if os.path.exists(file_path):
             try:
-                df = pd.read_csv(file_path)
-                
-                # Normaliser les noms de colonnes
-                df.columns = df.columns.str.lower().str.strip()
-                
-                # Mapper les anciennes colonnes vers les nouvelles
-                column_mapping = {
-                    'annee': 'annee',
-                    'année': 'annee',
-                    'insee_com': 'insee_com',
-                    'nb_mutations': 'nb_mutations',
-                    'nbmaisons': 'nb_maisons',
-                    'nbapparts': 'nb_apparts',
-                    'propmaison': 'prop_maison',
-                    'propappart': 'prop_appart',
-                    'prixmoyen': 'prix_moyen',
-                    'prixm2moyen': 'prix_m2_moyen',
-                    'surfacemoy': 'surface_moy'
-                }
-                
-                df = df.rename(columns=column_mapping)
-                
-                # Assurer que la colonne année existe
-                if 'annee' not in df.columns:
-                    df['annee'] = year
-                
+                df = load_cached_frame(file_path, lambda path: read_dvf_csv(path, year))
                 all_data.append(df)
             except Exception as e:
                 st.warning(f"Erreur lors du chargement de {file_path}: {e}")
@@ -65,39 +155,107 @@ def load_dvf_data(years: Optional[List[int]] = None) -> pd.DataFrame:
     combined_df = pd.concat(all_data, ignore_index=True)
     
     # Nettoyer et convertir les types
-    numeric_cols = ['nb_mutations', 'nb_maisons', 'nb_apparts', 
-                    'prop_maison', 'prop_appart', 'prix_moyen', 
-                    'prix_m2_moyen', 'surface_moy']
-    
-    for col in numeric_cols:
+    for col in NUMERIC_COLS:
         if col in combined_df.columns:
             combined_df[col] = pd.to_numeric(combined_df[col], errors='coerce')
     
-    return combined_df
+    # Codes INSEE actuels (fusions de communes) : une ligne par commune et par année
+    if 'insee_com' in combined_df.columns:
+        anciens, actuels = load_code_remap()
+        combined_df['insee_com'] = remap_insee_codes(combined_df['insee_com'], anciens, actuels)
+        combined_df = consolidate_communes(combined_df)
+    
+    return compact_dtypes(combined_df)
 
 
-@st.cache_data
+# Stores chargés, par (années, version) ; partagés par les sessions Streamlit,
+# le serveur d'API et les traitements par lot du même processus
+_DATASETS: "OrderedDict[Tuple[Tuple[int, ...], str], DVFStore]" = OrderedDict()
+_DATASETS_LOCK = threading.Lock()
+
+
+def load_dvf_store(years: Optional[List[int]] = None) -> DVFStore:
+    """
+    Données DVF indexées, partagées (lecture seule) entre sessions et reruns
+    
+    Le store est conservé par années et par jeton de version (voir
+    dataset_version) : un appel ne hache ni ne copie les données, et un
+    fichier source modifié est rechargé automatiquement. Le chargement a
+    lieu une seule fois, même si plusieurs sessions le demandent ensemble.
+    
+    Args:
+        years: Liste des années à charger (None = toutes)
+    
+    Returns:
+        DVFStore partagé ; store.df contient les données, store.version leur version
+    """
+    years = list(years) if years else DEFAULT_YEARS
+    key = (tuple(years), dataset_version(years))
+    debut = time.perf_counter()
+    with _DATASETS_LOCK:
+        store = _DATASETS.get(key)
+        hit = store is not None
+        if hit:
+            _DATASETS.move_to_end(key)
+        else:
+            store = DVFStore(read_dvf_dataset(years), version=key[1])
+            _DATASETS[key] = store
+            while len(_DATASETS) > MAX_DATASET_VERSIONS:
+                _DATASETS.popitem(last=False)
+    if profiling.ENABLED:
+        profiling.record_lookup('utils.dvf_loader.load_dvf_store', hit=hit,
+                                duration=time.perf_counter() - debut)
+    return store
+
+
+def load_dvf_data(years: Optional[List[int]] = None) -> pd.DataFrame:
+    """
+    Charge les données DVF pour les années spécifiées
+    
+    Retourne le DataFrame partagé du store (voir load_dvf_store), trié par
+    code INSEE : il ne doit pas être modifié (faire une copie au besoin).
+    
+    Args:
+        years: Liste des années à charger (ex: [2022, 2023, 2024])
+              Si None, charge toutes les années disponibles
+    
+    Returns:
+        DataFrame avec les données DVF normalisées
+    """
+    return load_dvf_store(years).df
+
+
+def clear_dvf_store() -> None:
+    """Libère les données chargées en mémoire (le cache Parquet est conservé)"""
+    with _DATASETS_LOCK:
+        _DATASETS.clear()
+
+
+@store_cached
 def get_communes_list(df: pd.DataFrame) -> List[str]:
     """Retourne la liste des codes INSEE des communes disponibles"""
     if 'insee_com' in df.columns:
-        return sorted(df['insee_com'].dropna().unique().astype(str).tolist())
+        return get_store(df).communes
     return []
 
 
+@timed()
 def get_commune_data(df: pd.DataFrame, insee_code: str) -> pd.DataFrame:
     """
     Récupère les données d'une commune spécifique
     
     Args:
-        df: DataFrame DVF complet
+        df: DataFrame DVF complet (ou DVFStore)
         insee_code: Code INSEE de la commune
     
     Returns:
         DataFrame filtré pour la commune
     """
-    return df[df['insee_com'].astype(str) == str(insee_code)].copy()
+    return get_store(df).commune(insee_code)
 
 
+@timed()
+@store_cached
 def get_market_stats(df: pd.DataFrame, commune: Optional[str] = None, 
                      property_type: str = 'all') -> Dict:
     """
@@ -112,7 +270,10 @@ def get_market_stats(df: pd.DataFrame, commune: Optional[str] = None,
         Dictionnaire avec les statistiques
     """
     if commune:
-        df = get_commune_data(df, commune)
+        report = build_commune_report(get_store(df), commune)
+        if property_type == 'all':
+            return dict(report.stats)
+        df = report.rows
     
     if df.empty:
         return {}
@@ -123,30 +284,10 @@ def get_market_stats(df: pd.DataFrame, commune: Optional[str] = None,
     elif property_type == 'appartements' and 'nb_apparts' in df.columns:
         df = df[df['nb_apparts'] > 0]
     
-    stats = {}
-    
-    if 'prix_moyen' in df.columns:
-        stats['prix_moyen'] = df['prix_moyen'].mean()
-        stats['prix_median'] = df['prix_moyen'].median()
-        stats['prix_min'] = df['prix_moyen'].min()
-        stats['prix_max'] = df['prix_moyen'].max()
-    
-    if 'prix_m2_moyen' in df.columns:
-        stats['prix_m2_moyen'] = df['prix_m2_moyen'].mean()
-        stats['prix_m2_median'] = df['prix_m2_moyen'].median()
-        stats['prix_m2_min'] = df['prix_m2_moyen'].min()
-        stats['prix_m2_max'] = df['prix_m2_moyen'].max()
-    
-    if 'surface_moy' in df.columns:
-        stats['surface_moyenne'] = df['surface_moy'].mean()
-        stats['surface_mediane'] = df['surface_moy'].median()
-    
-    if 'nb_mutations' in df.columns:
-        stats['total_mutations'] = df['nb_mutations'].sum()
-    
-    return stats
+    return compute_row_stats(df)
 
 
+@store_cached
 def calculate_market_evolution(df: pd.DataFrame, commune: Optional[str] = None) -> pd.DataFrame:
     """
     Calcule l'évolution du marché année par année
@@ -159,46 +300,40 @@ def calculate_market_evolution(df: pd.DataFrame, commune: Optional[str] = None)
         DataFrame avec l'évolution annuelle
     """
     if commune:
-        df = get_commune_data(df, commune)
+        return build_commune_report(get_store(df), commune).evolution.copy()
     
     if df.empty or 'annee' not in df.columns:
         return pd.DataFrame()
     
-    evolution = df.groupby('annee').agg({
-        'prix_moyen': 'mean',
-        'prix_m2_moyen': 'mean',
-        'surface_moy': 'mean',
-        'nb_mutations': 'sum'
-    }).reset_index()
-    
-    # Calculer les variations annuelles
-    evolution['variation_prix'] = evolution['prix_moyen'].pct_change() * 100
-    evolution['variation_prix_m2'] = evolution['prix_m2_moyen'].pct_change() * 100
-    
-    return evolution
+    return build_market_report(df).evolution
 
 
-@st.cache_data
+@timed()
+@store_cached
 def get_departement_data(df: pd.DataFrame, dept_code: str) -> pd.DataFrame:
     """
     Récupère les données d'un département
     
     Args:
         df: DataFrame DVF
-        dept_code: Code du département (ex: '75', '69')
+        dept_code: Code du département (ex: '75', '69', '2A', '971')
     
     Returns:
         DataFrame filtré pour le département
     """
     if 'insee_com' in df.columns:
-        # Extraire les 2 ou 3 premiers caractères selon le département
-        mask = df['insee_com'].astype(str).str.startswith(dept_code)
-        return df[mask].copy()
+        # Communes rattachées au département dans le référentiel INSEE
+        store = get_store(df)
+        return store.rows_for(get_hierarchy_cube(store).communes_in('departement', dept_code))
     return pd.DataFrame()
 
 
+@timed()
 def get_top_communes(df: pd.DataFrame, metric: str = 'prix_m2_moyen', 
-                     top_n: int = 10, ascending: bool = False) -> pd.DataFrame:
+                     top_n: int = 10, ascending: bool = False,
+                     level: Optional[str] = None, code: Optional[str] = None,
+                     start: Optional[int] = None, end: Optional[int] = None,
+                     min_mutations: float = 0) -> pd.DataFrame:
     """
     Récupère le top N des communes selon une métrique
     
@@ -207,6 +342,12 @@ def get_top_communes(df: pd.DataFrame, metric: str = 'prix_m2_moyen',
         metric: Métrique à utiliser pour le classement
         top_n: Nombre de communes à retourner
         ascending: Ordre croissant (True) ou décroissant (False)
+        level: Niveau du filtre géographique ('canton', 'arrondissement',
+               'departement', 'region' ; None = France)
+        code: Code de l'entité du filtre
+        start: Première année incluse (None = toutes)
+        end: Dernière année incluse (None = toutes)
+        min_mutations: Nombre minimal de mutations sur la période
     
     Returns:
         DataFrame avec le classement
@@ -214,13 +355,5 @@ def get_top_communes(df: pd.DataFrame, metric: str = 'prix_m2_moyen',
     if metric not in df.columns or 'insee_com' not in df.columns:
         return pd.DataFrame()
     
-    # Grouper par commune et calculer la moyenne
-    top = df.groupby('insee_com').agg({
-        metric: 'mean',
-        'nb_mutations': 'sum'
-    }).reset_index()
-    
-    # Trier et prendre le top N
-    top = top.nlargest(top_n, metric) if not ascending else top.nsmallest(top_n, metric)
-    
-    return top
+    # Classements pré-triés à la construction du store (voir utils.rankings)
+    return get_rankings(df).top(metric, top_n, ascending, level, code, start, end, min_mutations)
@@ -0,0 +1,186 @@
+"""
+Empreinte mémoire des données DVF : types compacts et rapport par colonne et
+par résultat mis en cache
+"""
+import sys
+from typing import Any, Dict, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+# Types cibles des colonnes DVF (voir compact_dtypes)
+CATEGORY_COLS = ['insee_com']
+INT_COLS = {'annee': np.int16, 'nb_mutations': np.int32,
+            'nb_maisons': np.int32, 'nb_apparts': np.int32}
+FLOAT32_COLS = ['prop_maison', 'prop_appart', 'prix_moyen', 'prix_m2_moyen', 'surface_moy']
+
+# Écart relatif maximal accepté lors du passage en float32 (~7 chiffres significatifs)
+FLOAT32_RTOL = 1e-6
+
+
+def _fits_float32(values: np.ndarray) -> bool:
+    """Vrai si les valeurs sont représentables en float32 à FLOAT32_RTOL près"""
+    return bool(np.allclose(values.astype(np.float32), values, rtol=FLOAT32_RTOL,
+                            atol=0, equal_nan=True))
+
+
+def _compact_int(series: pd.Series, dtype) -> pd.Series:
+    """
+    Entier compact si possible ; float32 si la colonne contient des valeurs
+    manquantes (les comptages restent exacts jusqu'à 2**24) ; inchangée sinon
+    """
+    values = series.to_numpy(dtype=float)
+    finies = values[~np.isnan(values)]
+    if len(finies) and not np.array_equal(finies, np.round(finies)):
+        return series
+    info = np.iinfo(dtype)
+    if len(finies) and (finies.min() < info.min or finies.max() > info.max):
+        return series
+    if len(finies) == len(values):
+        return series.astype(dtype)
+    if _fits_float32(values):
+        return series.astype(np.float32)
+    return series
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convertit les colonnes DVF en types compacts
+
+    - insee_com : catégorie (un entier par ligne, chaque code stocké une fois) ;
+    - annee : int16, comptages : int32 (float32 s'ils ont des valeurs manquantes) ;
+    - prix, surfaces et proportions : float32 si la précision le permet
+      (écart relatif inférieur à FLOAT32_RTOL), float64 sinon.
+
+    Les colonnes absentes ou hors plage sont laissées telles quelles.
+
+    Args:
+        df: DataFrame DVF normalisé
+
+    Returns:
+        Nouveau DataFrame aux types compacts
+    """
+    df = df.copy(deep=False)
+
+    for col in CATEGORY_COLS:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = df[col].astype('category')
+
+    for col, dtype in INT_COLS.items():
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = _compact_int(df[col], dtype)
+
+    for col in FLOAT32_COLS:
+        if col in df.columns and df[col].dtype == np.float64:
+            if _fits_float32(df[col].to_numpy()):
+                df[col] = df[col].astype(np.float32)
+
+    return df
+
+
+def deep_sizeof(obj: Any, _seen: Optional[Set[int]] = None) -> int:
+    """
+    Taille approximative d'un objet et de son contenu, en octets
+
+    DataFrames, séries et tableaux NumPy sont mesurés par pandas/NumPy
+    (chaînes comprises) ; dictionnaires, séquences et objets sont parcourus
+    récursivement. Un objet partagé n'est compté qu'une fois par _seen.
+
+    Args:
+        obj: Objet mesuré
+        _seen: Identifiants des objets déjà comptés
+
+    Returns:
+        Nombre d'octets
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index, pd.Categorical)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return obj.nbytes + sum(deep_sizeof(v, _seen) for v in obj.ravel())
+        return obj.nbytes
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(deep_sizeof(k, _seen) + deep_sizeof(v, _seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(deep_sizeof(v, _seen) for v in obj)
+    if hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), _seen)
+    for slot in getattr(type(obj), '__slots__', ()):
+        if hasattr(obj, slot):
+            size += deep_sizeof(getattr(obj, slot), _seen)
+    return size
+
+
+def memory_report(data) -> Dict:
+    """
+    Empreinte mémoire des données DVF chargées
+
+    Args:
+        data: DVFStore ou DataFrame DVF (voir utils.dvf_store.get_store)
+
+    Returns:
+        Dictionnaire avec :
+        - 'colonnes' : DataFrame (colonne, dtype, octets, octets_par_ligne, part_pct) ;
+        - 'index' : DataFrame (element, octets) des structures d'accès du store ;
+        - 'cache' : DataFrame (cle, type, octets) des résultats mis en cache
+          par DVFStore.memoize, du plus récent au plus ancien ;
+        - 'total_donnees', 'total_index', 'total_cache', 'total' : octets
+    """
+    from utils.dvf_store import get_store
+
+    store = get_store(data)
+    df = store.df
+    seen: Set[int] = {id(store)}
+
+    usage = df.memory_usage(deep=True, index=True)
+    seen.add(id(df))
+    colonnes = pd.DataFrame({
+        'colonne': usage.index.astype(str),
+        'dtype': ['index' if c == 'Index' else str(df[c].dtype) for c in usage.index],
+        'octets': usage.to_numpy(dtype=np.int64),
+    })
+    total_donnees = int(colonnes['octets'].sum())
+    colonnes['octets_par_ligne'] = colonnes['octets'] / max(len(df), 1)
+    colonnes['part_pct'] = colonnes['octets'] / max(total_donnees, 1) * 100
+
+    index = pd.DataFrame(
+        [(nom, deep_sizeof(valeur, seen)) for nom, valeur in [
+            ('codes INSEE triés', store._keys),
+            ('rangs des communes', store._ranks),
+            ('bornes des plages', store._bounds),
+            ('codes catégoriels', store.insee_codes),
+            ('positions par année', store._year_positions),
+        ]],
+        columns=['element', 'octets']
+    )
+
+    with store._memo_lock:
+        entrees = list(store._memo.items())[::-1]
+    cache = pd.DataFrame(
+        [(repr(cle), type(valeur).__name__, deep_sizeof(valeur, seen)) for cle, valeur in entrees],
+        columns=['cle', 'type', 'octets']
+    )
+
+    total_index = int(index['octets'].sum())
+    total_cache = int(cache['octets'].sum())
+    return {
+        'colonnes': colonnes,
+        'index': index,
+        'cache': cache,
+        'total_donnees': total_donnees,
+        'total_index': total_index,
+        'total_cache': total_cache,
+        'total': total_donnees + total_index + total_cache,
+    }
@@ -0,0 +1,478 @@
+"""
+Panel dense commune × année des données DVF : un tableau NumPy par
+indicateur (communes en lignes, années calendaires en colonnes) et calculs
+de croissance vectorisés pour toutes les communes à la fois
+"""
+import warnings
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.dvf_store import DVFStore, get_store
+from utils.profiling import timed
+
+# Indicateurs disponibles et agrégation des lignes d'une même commune-année
+PANEL_METRICS = {
+    'prix_moyen': 'mean',
+    'prix_m2_moyen': 'mean',
+    'surface_moy': 'mean',
+    'nb_mutations': 'sum',
+}
+
+
+# --- Calculs sur tableaux (n séries × années) ---------------------------------
+#
+# Les fonctions ci-dessous prennent des valeurs (n, t) et les années (t,) des
+# colonnes, croissantes mais pas forcément consécutives : une colonne absente
+# ou une valeur manquante (NaN, ou prix nul) est sautée et l'écart réel entre
+# années observées sert à l'annualisation (2017 → 2022 compte pour 5 ans).
+
+def _as_panel(values, years) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Valeurs en float64 (n, t), années en float64 (t,) et masque des valeurs exploitables"""
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    years = np.asarray(years, dtype=float)
+    with np.errstate(invalid='ignore'):
+        valid = np.isfinite(values) & (values > 0)
+    return values, years, valid
+
+
+def _previous_valid(valid: np.ndarray) -> np.ndarray:
+    """Indice de la dernière colonne valide strictement antérieure (-1 si aucune)"""
+    n, t = valid.shape
+    derniere = np.maximum.accumulate(np.where(valid, np.arange(t), -1), axis=1)
+    precedente = np.full((n, t), -1, dtype=np.int64)
+    precedente[:, 1:] = derniere[:, :-1]
+    return precedente
+
+
+def _intervals(values, years) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Log-rendements et écarts (en années) entre valeurs observées successives
+
+    Returns:
+        Tuple (log_rendements, écarts, masque, valeurs_exploitables) de forme
+        (n, t) : la colonne j porte l'intervalle qui se termine en j (NaN
+        hors masque)
+    """
+    values, years, valid = _as_panel(values, years)
+    precedente = _previous_valid(valid)
+    masque = valid & (precedente >= 0)
+    source = np.maximum(precedente, 0)
+
+    rendements = np.full(values.shape, np.nan)
+    ecarts = np.full(values.shape, np.nan)
+    rendements[masque] = np.log(values[masque] / np.take_along_axis(values, source, axis=1)[masque])
+    ecarts[masque] = np.broadcast_to(years, values.shape)[masque] - years[source][masque]
+    return rendements, ecarts, masque, valid
+
+
+def annualized_growth(values, years) -> np.ndarray:
+    """
+    Croissance annualisée depuis l'année observée précédente
+
+    Args:
+        values: Valeurs (n, t) ou série (t,)
+        years: Années des colonnes (t,)
+
+    Returns:
+        Tableau (n, t) de taux annuels (0.05 = +5 %/an), NaN pour la première
+        année observée et les valeurs manquantes
+    """
+    rendements, ecarts, _, _ = _intervals(values, years)
+    return np.expm1(rendements / ecarts)
+
+
+def cagr(values, years) -> np.ndarray:
+    """
+    Taux de croissance annuel composé entre la première et la dernière année observées
+
+    Args:
+        values: Valeurs (n, t) ou série (t,)
+        years: Années des colonnes (t,)
+
+    Returns:
+        Tableau (n,) de taux annuels, NaN si moins de deux années observées
+    """
+    values, years, valid = _as_panel(values, years)
+    n, t = values.shape
+    premiere = valid.argmax(axis=1)
+    derniere = t - 1 - valid[:, ::-1].argmax(axis=1)
+    ok = valid.any(axis=1) & (derniere > premiere)
+
+    lignes = np.arange(n)
+    taux = np.full(n, np.nan)
+    ecarts = years[derniere] - years[premiere]
+    taux[ok] = np.expm1(np.log(values[lignes, derniere][ok] / values[lignes, premiere][ok]) / ecarts[ok])
+    return taux
+
+
+def year_over_year(values, years) -> np.ndarray:
+    """
+    Variation d'une année sur l'autre, entre années calendaires consécutives
+
+    Contrairement à annualized_growth, aucune valeur n'est calculée à travers
+    une année manquante.
+
+    Args:
+        values: Valeurs (n, t) ou série (t,)
+        years: Années des colonnes (t,)
+
+    Returns:
+        Tableau (n, t) de variations relatives (NaN si l'année précédente manque)
+    """
+    values, years, valid = _as_panel(values, years)
+    variations = np.full(values.shape, np.nan)
+    consecutives = valid[:, 1:] & valid[:, :-1] & (np.diff(years) == 1)
+    variations[:, 1:][consecutives] = values[:, 1:][consecutives] / values[:, :-1][consecutives] - 1
+    return variations
+
+
+def log_return_stats(values, years) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Dérive et variance annuelles des log-rendements (voir calibrate_appreciation)
+
+    Dérive μ = somme des log-rendements / somme des écarts ; variance =
+    moyenne des (r - μ·g)² / g, nulle avec un seul intervalle.
+
+    Args:
+        values: Valeurs (n, t) ou série (t,)
+        years: Années des colonnes (t,)
+
+    Returns:
+        Tuple (dérive, variance, nombre d'années observées) de forme (n,) ;
+        dérive et variance valent NaN sans intervalle
+    """
+    rendements, ecarts, masque, valid = _intervals(values, years)
+    nb_intervalles = masque.sum(axis=1)
+    sans_intervalle = nb_intervalles == 0
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        derive = np.nansum(rendements, axis=1) / np.nansum(ecarts, axis=1)
+        ecarts_carres = (rendements - derive[:, None] * ecarts) ** 2 / ecarts
+        variance = np.nansum(ecarts_carres, axis=1) / nb_intervalles
+    variance = np.where(nb_intervalles > 1, variance, 0.0)
+    derive[sans_intervalle] = np.nan
+    variance[sans_intervalle] = np.nan
+    return derive, variance, valid.sum(axis=1)
+
+
+def volatility(values, years) -> np.ndarray:
+    """
+    Volatilité annuelle (écart-type des log-rendements annualisés)
+
+    Args:
+        values: Valeurs (n, t) ou série (t,)
+        years: Années des colonnes (t,)
+
+    Returns:
+        Tableau (n,), NaN sans intervalle
+    """
+    return np.sqrt(log_return_stats(values, years)[1])
+
+
+def linear_trend(values, years) -> Dict[str, np.ndarray]:
+    """
+    Régression linéaire (moindres carrés) de chaque série sur l'année
+
+    Forme fermée à partir des sommes par ligne (équivalent à np.polyfit de
+    degré 1 sur les années renseignées), sans boucle sur les séries.
+
+    Args:
+        values: Valeurs (n, t) ou série (t,) ; NaN = année non renseignée
+        years: Années des colonnes (t,)
+
+    Returns:
+        Dictionnaire de tableaux (n,) :
+        - 'pente' : variation par an (unité de la série) ;
+        - 'ordonnee' : ordonnée à l'origine (année 0, comme np.polyfit) ;
+        - 'r2' : coefficient de détermination (1 si la série est constante) ;
+        - 'erreur_type' : erreur type de la pente (NaN avec moins de 3 points) ;
+        - 'pente_relative' : pente / moyenne de la série (0.05 = +5 %/an) ;
+        - 'nombre_points' : nombre d'années renseignées
+        Les coefficients valent NaN avec moins de 2 points.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    years = np.asarray(years, dtype=float)
+    valid = np.isfinite(values)
+    poids = valid.astype(float)
+    y = np.where(valid, values, 0.0)
+
+    # Années centrées (stabilité numérique), sommes par ligne
+    centre = years.mean() if len(years) else 0.0
+    x = years - centre
+    n = poids.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mx = (poids * x).sum(axis=1) / n
+        my = y.sum(axis=1) / n
+        dx = np.where(valid, x - mx[:, None], 0.0)
+        dy = np.where(valid, y - my[:, None], 0.0)
+        sxx = (dx * dx).sum(axis=1)
+        sxy = (dx * dy).sum(axis=1)
+        syy = (dy * dy).sum(axis=1)
+
+        ok = (n >= 2) & (sxx > 0)
+        pente = np.where(ok, sxy / sxx, np.nan)
+        residus = np.maximum(syy - pente * sxy, 0.0)
+        r2 = np.where(syy > 0, 1 - residus / syy, 1.0)
+        erreur_type = np.where(n > 2, np.sqrt(residus / (n - 2) / sxx), np.nan)
+        pente_relative = np.where(my != 0, pente / my, np.nan)
+
+    return {
+        'pente': pente,
+        'ordonnee': my - pente * (mx + centre),
+        'r2': np.where(ok, r2, np.nan),
+        'erreur_type': np.where(ok, erreur_type, np.nan),
+        'pente_relative': pente_relative,
+        'nombre_points': n.astype(np.int64),
+    }
+
+
+def theil_sen_slope(values, years) -> np.ndarray:
+    """
+    Pente de Theil-Sen (médiane des pentes entre toutes les paires d'années)
+
+    Estimateur robuste à une année aberrante ; le nombre de paires reste
+    faible (28 pour 8 années), toutes calculées en une opération.
+
+    Args:
+        values: Valeurs (n, t) ou série (t,) ; NaN = année non renseignée
+        years: Années des colonnes (t,)
+
+    Returns:
+        Tableau (n,) des pentes, NaN avec moins de 2 points
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    years = np.asarray(years, dtype=float)
+    avant, apres = np.triu_indices(len(years), k=1)
+    if not len(avant):
+        return np.full(len(values), np.nan)
+    pentes = (values[:, apres] - values[:, avant]) / (years[apres] - years[avant])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmedian(pentes, axis=1)
+
+
+# --- Panel des communes --------------------------------------------------------
+
+class DVFPanel:
+    """
+    Données DVF pivotées une fois en tableaux denses (communes × années)
+
+    Les lignes suivent l'ordre des codes INSEE du store, les colonnes toutes
+    les années calendaires de la première à la dernière année disponible :
+    les années absentes du jeu (ex: 2018-2021) sont des colonnes vides,
+    signalées par le masque `observed`. Chaque indicateur est pivoté au
+    premier accès (float64, NaN si manquant).
+    """
+
+    def __init__(self, store: DVFStore):
+        """
+        Args:
+            store: DVFStore (les lignes sont triées par commune)
+        """
+        self.version = store.version
+        self.communes = store._keys
+        self._ranks = store._ranks
+        self._df = store.df
+        n = len(self.communes)
+
+        store_years = store.years
+        if store_years:
+            self.years = np.arange(store_years[0], store_years[-1] + 1)
+        else:
+            self.years = np.array([], dtype=int)
+        t = len(self.years)
+
+        # Cellule (commune, année) de chaque ligne indexée (-1 si sans année)
+        lignes = np.asarray(store.insee_codes.codes, dtype=np.int64)
+        self._cells = np.full(len(lignes), -1, dtype=np.int64)
+        if t:
+            annees = pd.to_numeric(self._df['annee'].iloc[:len(lignes)], errors='coerce').to_numpy()
+            avec_annee = ~np.isnan(annees)
+            colonnes = (annees[avec_annee] - self.years[0]).astype(np.int64)
+            self._cells[avec_annee] = lignes[avec_annee] * t + colonnes
+
+        present = self._cells >= 0
+        self.observed = (np.bincount(self._cells[present], minlength=n * t) > 0).reshape(n, t)
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """(nombre de communes, nombre d'années calendaires)"""
+        return self.observed.shape
+
+    def values(self, metric: str = 'prix_m2_moyen') -> np.ndarray:
+        """
+        Tableau dense d'un indicateur
+
+        Args:
+            metric: Colonne DVF (voir PANEL_METRICS)
+
+        Returns:
+            Tableau (n_communes, n_années) en lecture seule, NaN si manquant
+        """
+        if metric not in self._arrays:
+            self._arrays[metric] = self._pivot(metric)
+        return self._arrays[metric]
+
+    def _pivot(self, metric: str) -> np.ndarray:
+        """Agrège les lignes de chaque commune-année (moyenne ou somme)"""
+        if metric not in PANEL_METRICS:
+            raise ValueError(f"Indicateur inconnu : {metric}")
+        n, t = self.shape
+        valeurs = self._df[metric].to_numpy(dtype=float)[:len(self._cells)]
+        present = (self._cells >= 0) & ~np.isnan(valeurs)
+        sommes = np.bincount(self._cells[present], weights=valeurs[present], minlength=n * t)
+
+        if PANEL_METRICS[metric] == 'sum':
+            tableau = np.where(self.observed.ravel(), sommes, np.nan)
+        else:
+            nombres = np.bincount(self._cells[present], minlength=n * t)
+            tableau = np.divide(sommes, nombres, out=np.full(n * t, np.nan), where=nombres > 0)
+        tableau = tableau.reshape(n, t)
+        tableau.flags.writeable = False
+        return tableau
+
+    def _window(self, metric: str, start: Optional[int],
+                end: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Colonnes de l'indicateur comprises entre start et end (inclus)"""
+        colonnes = np.ones(len(self.years), dtype=bool)
+        if start is not None:
+            colonnes &= self.years >= start
+        if end is not None:
+            colonnes &= self.years <= end
+        return self.values(metric)[:, colonnes], self.years[colonnes]
+
+    def rank(self, insee_code) -> Optional[int]:
+        """Ligne d'une commune dans le panel (None si inconnue)"""
+        return self._ranks.get(str(insee_code))
+
+    def cagr(self, metric: str = 'prix_m2_moyen', start: Optional[int] = None,
+             end: Optional[int] = None) -> np.ndarray:
+        """Taux annuel composé de chaque commune sur la période (voir cagr)"""
+        return cagr(*self._window(metric, start, end))
+
+    def growth(self, metric: str = 'prix_m2_moyen') -> np.ndarray:
+        """Croissance annualisée depuis l'année observée précédente (voir annualized_growth)"""
+        return annualized_growth(self.values(metric), self.years)
+
+    def yoy(self, metric: str = 'prix_m2_moyen') -> np.ndarray:
+        """Variation entre années calendaires consécutives (voir year_over_year)"""
+        return year_over_year(self.values(metric), self.years)
+
+    def volatility(self, metric: str = 'prix_m2_moyen', start: Optional[int] = None,
+                   end: Optional[int] = None) -> np.ndarray:
+        """Volatilité annuelle de chaque commune sur la période (voir volatility)"""
+        return volatility(*self._window(metric, start, end))
+
+    @timed()
+    def indicators(self, metric: str = 'prix_m2_moyen', start: Optional[int] = None,
+                   end: Optional[int] = None) -> pd.DataFrame:
+        """
+        Indicateurs de croissance de toutes les communes
+
+        Args:
+            metric: Indicateur (voir PANEL_METRICS)
+            start: Première année de la période (None = début des données)
+            end: Dernière année de la période (None = fin des données)
+
+        Returns:
+            DataFrame (une ligne par commune) : insee_com, premiere_annee,
+            derniere_annee, nombre_annees, croissance_annuelle (%/an, taux
+            composé), derive (%/an, log), volatilite (%/an) et
+            variation_derniere_annee (%, NaN si l'année précédente manque)
+        """
+        valeurs, annees = self._window(metric, start, end)
+        _, _, valid = _as_panel(valeurs, annees)
+        t = len(annees)
+        derive, variance, nombre = log_return_stats(valeurs, annees)
+        avec = valid.any(axis=1)
+
+        variations = year_over_year(valeurs, annees)
+        derniere = t - 1 - valid[:, ::-1].argmax(axis=1) if t else np.zeros(len(valeurs), dtype=int)
+        variation_derniere = (variations[np.arange(len(valeurs)), derniere] if t
+                              else np.full(len(valeurs), np.nan))
+
+        return pd.DataFrame({
+            'insee_com': self.communes,
+            'premiere_annee': np.where(avec, annees[valid.argmax(axis=1)] if t else 0, np.nan),
+            'derniere_annee': np.where(avec, annees[derniere] if t else 0, np.nan),
+            'nombre_annees': nombre,
+            'croissance_annuelle': cagr(valeurs, annees) * 100,
+            'derive': derive * 100,
+            'volatilite': np.sqrt(variance) * 100,
+            'variation_derniere_annee': variation_derniere * 100,
+        })
+
+    @timed()
+    def trends(self, metric: str = 'prix_m2_moyen', start: Optional[int] = None,
+               end: Optional[int] = None, robust: bool = False) -> pd.DataFrame:
+        """
+        Tendance linéaire de toutes les communes (voir linear_trend)
+
+        Args:
+            metric: Indicateur (voir PANEL_METRICS)
+            start: Première année de la période (None = début des données)
+            end: Dernière année de la période (None = fin des données)
+            robust: Ajoute la pente de Theil-Sen
+
+        Returns:
+            DataFrame (une ligne par commune) : insee_com, nombre_annees,
+            pente (par an), ordonnee, r2, erreur_type, pente_relative (%/an)
+            et, si robust, pente_theil_sen
+        """
+        valeurs, annees = self._window(metric, start, end)
+        tendance = linear_trend(valeurs, annees)
+        table = pd.DataFrame({
+            'insee_com': self.communes,
+            'nombre_annees': tendance['nombre_points'],
+            'pente': tendance['pente'],
+            'ordonnee': tendance['ordonnee'],
+            'r2': tendance['r2'],
+            'erreur_type': tendance['erreur_type'],
+            'pente_relative': tendance['pente_relative'] * 100,
+        })
+        if robust:
+            table['pente_theil_sen'] = theil_sen_slope(valeurs, annees)
+        return table
+
+
+def get_panel(data) -> DVFPanel:
+    """
+    Retourne le panel commune × année des données DVF (construit une fois par store)
+
+    Args:
+        data: DVFStore ou DataFrame DVF (voir utils.dvf_store.get_store)
+
+    Returns:
+        DVFPanel
+    """
+    store = get_store(data)
+    return store.memoize(('panel',), lambda: DVFPanel(store))
+
+
+def get_trend_table(data, metric: str = 'prix_m2_moyen', start: Optional[int] = None,
+                    end: Optional[int] = None, robust: bool = False) -> pd.DataFrame:
+    """
+    Table des tendances de toutes les communes, calculée une fois par version des données
+
+    Args:
+        data: DVFStore ou DataFrame DVF
+        metric: Indicateur (voir PANEL_METRICS)
+        start: Première année de la période (None = début des données)
+        end: Dernière année de la période (None = fin des données)
+        robust: Ajoute la pente de Theil-Sen
+
+    Returns:
+        DataFrame de DVFPanel.trends (partagé : ne pas modifier), la version
+        des données dans attrs['version']
+    """
+    store = get_store(data)
+
+    def build():
+        table = get_panel(store).trends(metric, start, end, robust)
+        table.attrs['version'] = store.version
+        return table
+
+    return store.memoize(('trend_table', metric, start, end, robust), build)
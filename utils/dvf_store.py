@@ -0,0 +1,291 @@
+"""
+Index en mémoire des données DVF (accès rapide par commune, département et année)
+"""
+import functools
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils import profiling
+
+
+class DVFStore:
+    """
+    Conteneur indexé des données DVF, construit une seule fois au chargement
+
+    Les lignes sont triées (tri stable) par code INSEE : chaque commune occupe
+    une plage contiguë, retrouvée en O(1) via son rang (dictionnaire) et un
+    tableau de bornes. Les départements (préfixes de code) sont retrouvés en
+    O(log n) par recherche dichotomique sur les codes triés, les années via
+    des positions précalculées.
+
+    Le DataFrame indexé ne doit pas être modifié après construction. Le
+    jeton de version identifie le jeu de données : les résultats dérivés
+    (memoize, store_cached) sont propres au store, donc à sa version.
+    """
+
+    # Nombre maximal de résultats dérivés conservés (voir memoize)
+    MEMO_SIZE = 512
+
+    def __init__(self, df: pd.DataFrame, version: Optional[str] = None):
+        """
+        Args:
+            df: DataFrame DVF normalisé (voir load_dvf_data)
+            version: Jeton de version du jeu de données (voir
+                     utils.dvf_loader.dataset_version) ; par défaut un jeton unique
+        """
+        self.version = version or uuid.uuid4().hex[:16]
+        if 'insee_com' in df.columns and not df.empty:
+            keys = df['insee_com'].astype(str).where(df['insee_com'].notna())
+            codes, uniques = pd.factorize(keys, sort=True)
+            n_communes = len(uniques)
+
+            # Tri stable : l'ordre d'origine est conservé au sein d'une commune,
+            # les lignes sans code INSEE sont rejetées en fin de tableau
+            codes = np.where(codes < 0, n_communes, codes)
+            order = np.argsort(codes, kind='stable')
+            self.df = df.iloc[order]
+            counts = np.bincount(codes, minlength=n_communes + 1)[:n_communes]
+        else:
+            self.df = df
+            n_communes, counts, uniques = 0, np.array([], dtype=np.int64), []
+
+        # Codes triés (un par commune), rang de chaque code et bornes des plages :
+        # la commune de rang i occupe les lignes _bounds[i]:_bounds[i + 1]
+        self._keys = np.asarray(uniques, dtype=str)
+        self._ranks: Dict[str, int] = {code: i for i, code in enumerate(uniques)}
+        self._bounds = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        # Catégorie ordonnée : codes entiers compacts pour les traitements vectorisés
+        self.insee_codes = pd.Categorical.from_codes(
+            np.arange(n_communes).repeat(counts), categories=list(uniques)
+        )
+
+        self._year_positions: Dict[int, np.ndarray] = {}
+        if 'annee' in self.df.columns:
+            annees = pd.to_numeric(self.df['annee'], errors='coerce').to_numpy()
+            for year in np.unique(annees[~np.isnan(annees)]):
+                self._year_positions[int(year)] = np.flatnonzero(annees == year)
+
+        self._memo: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+        # Référence faible vers le store : pas de cycle qui le maintiendrait en vie
+        _register(self.df, weakref.ref(self))
+
+    @property
+    def communes(self) -> List[str]:
+        """Codes INSEE disponibles, triés"""
+        return list(self._ranks)
+
+    @property
+    def years(self) -> List[int]:
+        """Années disponibles, triées"""
+        return sorted(self._year_positions)
+
+    def __contains__(self, insee_code) -> bool:
+        return str(insee_code) in self._ranks
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def memoize(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Retourne un résultat dérivé des données, calculé une seule fois (LRU)
+
+        Args:
+            key: Clé du résultat (ex: ('commune_report', '75056'))
+            compute: Fonction sans argument calculant le résultat
+
+        Returns:
+            Résultat mis en cache
+        """
+        with self._memo_lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                if profiling.ENABLED:
+                    profiling.record_lookup(_memo_name(key), hit=True)
+                return self._memo[key]
+
+        debut = time.perf_counter()
+        value = compute()
+        if profiling.ENABLED:
+            profiling.record_lookup(_memo_name(key), hit=False,
+                                    duration=time.perf_counter() - debut)
+        with self._memo_lock:
+            self._memo[key] = value
+            if len(self._memo) > self.MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return value
+
+    def commune_slice(self, insee_code) -> slice:
+        """
+        Retourne la plage de lignes (positions) d'une commune
+
+        Args:
+            insee_code: Code INSEE de la commune
+
+        Returns:
+            slice positionnel dans self.df (vide si la commune est inconnue)
+        """
+        rank = self._ranks.get(str(insee_code))
+        if rank is None:
+            return slice(0, 0)
+        return slice(int(self._bounds[rank]), int(self._bounds[rank + 1]))
+
+    def commune(self, insee_code, year: Optional[int] = None) -> pd.DataFrame:
+        """
+        Récupère les lignes d'une commune en O(1)
+
+        Args:
+            insee_code: Code INSEE de la commune
+            year: Année optionnelle
+
+        Returns:
+            DataFrame (copie) des lignes de la commune
+        """
+        rows = self.df.iloc[self.commune_slice(insee_code)]
+        if year is not None:
+            rows = rows[rows['annee'] == year]
+        return rows.copy()
+
+    def rows_for(self, insee_codes, year: Optional[int] = None) -> pd.DataFrame:
+        """
+        Récupère les lignes d'un ensemble de communes
+
+        Args:
+            insee_codes: Codes INSEE des communes
+            year: Année optionnelle
+
+        Returns:
+            DataFrame (copie) dans l'ordre d'origine des lignes
+        """
+        rangs = [self._ranks[code] for code in map(str, insee_codes) if code in self._ranks]
+        positions = (np.concatenate([np.arange(self._bounds[i], self._bounds[i + 1]) for i in rangs])
+                     if rangs else np.array([], dtype=np.int64))
+        rows = self.df.iloc[positions].sort_index()
+        if year is not None:
+            rows = rows[rows['annee'] == year]
+        return rows.copy()
+
+    def departement(self, dept_code: str, year: Optional[int] = None) -> pd.DataFrame:
+        """
+        Récupère les communes dont le code INSEE commence par dept_code, en O(log n)
+
+        Args:
+            dept_code: Code (ou préfixe) du département (ex: '75', '2A', '971')
+            year: Année optionnelle
+
+        Returns:
+            DataFrame (copie) dans l'ordre d'origine des lignes
+        """
+        prefix = str(dept_code)
+        premier = int(np.searchsorted(self._keys, prefix, side='left'))
+        dernier = int(np.searchsorted(self._keys, prefix + '\uffff', side='left'))
+        rows = self.df.iloc[self._bounds[premier]:self._bounds[dernier]].sort_index()
+        if year is not None:
+            rows = rows[rows['annee'] == year]
+        return rows.copy()
+
+    def year(self, year: int) -> pd.DataFrame:
+        """
+        Récupère toutes les lignes d'une année
+
+        Args:
+            year: Année
+
+        Returns:
+            DataFrame (copie) des lignes de l'année
+        """
+        positions = self._year_positions.get(int(year), np.array([], dtype=np.int64))
+        return self.df.iloc[positions].sort_index().copy()
+
+
+# Registre des stores par DataFrame (référence faible : libéré avec le DataFrame)
+_STORES: Dict[int, Tuple[weakref.ref, Callable[[], Optional[DVFStore]]]] = {}
+
+
+def _memo_name(key: Hashable) -> str:
+    """Nom de mesure d'un résultat mis en cache (premier élément de la clé)"""
+    return f"DVFStore.memoize[{key[0] if isinstance(key, tuple) and key else key}]"
+
+
+def _register(df: pd.DataFrame, store_ref: Callable[[], Optional[DVFStore]]) -> None:
+    """Associe un store (ou une référence faible vers celui-ci) à un DataFrame"""
+    key = id(df)
+    _STORES[key] = (weakref.ref(df, lambda _: _STORES.pop(key, None)), store_ref)
+
+
+def find_store(data) -> Optional[DVFStore]:
+    """
+    Retourne le DVFStore déjà associé à des données DVF, sans en construire
+
+    Args:
+        data: DVFStore ou DataFrame DVF
+
+    Returns:
+        DVFStore, ou None si le DataFrame n'est pas indexé
+    """
+    if isinstance(data, DVFStore):
+        return data
+    entry = _STORES.get(id(data))
+    if entry is not None and entry[0]() is data:
+        return entry[1]()
+    return None
+
+
+def get_store(data) -> DVFStore:
+    """
+    Retourne le DVFStore associé à des données DVF
+
+    Args:
+        data: DVFStore, ou DataFrame DVF (le store est construit au premier
+              appel puis réutilisé tant que le DataFrame existe)
+
+    Returns:
+        DVFStore
+    """
+    store = find_store(data)
+    if store is not None:
+        return store
+
+    store = DVFStore(data)
+    _register(data, lambda: store)
+    return store
+
+
+def store_cached(func: Callable) -> Callable:
+    """
+    Décorateur : résultat dérivé des données DVF mis en cache dans leur store
+
+    La clé est (nom qualifié de la fonction, arguments) dans DVFStore.memoize : le
+    jeu de données n'est ni haché ni copié, et le cache suit sa version.
+    Le premier argument de la fonction est le DataFrame DVF (ou le store) ;
+    s'il n'est pas indexé (sous-ensemble ad hoc) ou si les arguments ne sont
+    pas hachables, la fonction est simplement appelée.
+
+    Les résultats modifiables (DataFrame, dictionnaire, liste) sont renvoyés
+    en copie : l'appelant peut les modifier sans altérer le cache.
+    """
+    # Nom qualifié : deux fonctions homonymes de modules différents ne partagent pas le cache
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(data, *args, **kwargs):
+        store = find_store(data)
+        if store is None:
+            return func(data, *args, **kwargs)
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return func(store.df, *args, **kwargs)
+        result = store.memoize(key, lambda: func(store.df, *args, **kwargs))
+        return result.copy() if isinstance(result, (pd.DataFrame, pd.Series, dict, list)) else result
+    return wrapper
@@ -5,7 +5,154 @@ import numpy as np
 from typing import Dict, List, Tuple
 import pandas as pd
 
+from utils.profiling import timed
 
+
+# Colonnes du tableau d'amortissement mensuel
+LOAN_SCHEDULE_FIELDS = [('Mois', 'month'), ('Mensualité', 'payment'),
+                        ('Intérêts', 'interest'), ('Capital', 'principal'),
+                        ('Capital Restant', 'balance')]
+
+
+def _loan_inputs(principal, annual_rate, years):
+    """Normalise les paramètres de prêt (scalaires ou tableaux) en vecteurs"""
+    p, r, y = np.broadcast_arrays(np.asarray(principal, dtype=float),
+                                  np.asarray(annual_rate, dtype=float),
+                                  np.asarray(years, dtype=float))
+    is_scalar = p.ndim == 0
+    p, r, y = (np.atleast_1d(a).ravel() for a in (p, r, y))
+    monthly_rate = r / 100 / 12
+    n_payments = np.round(y * 12).astype(int)
+    return p, monthly_rate, n_payments, is_scalar
+
+
+def _monthly_payment(principal: np.ndarray, monthly_rate: np.ndarray,
+                     n_payments: np.ndarray) -> np.ndarray:
+    """Mensualité constante (amortissement linéaire si le taux est nul)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (1 + monthly_rate) ** n_payments
+        annuity = principal * (monthly_rate * growth) / (growth - 1)
+        linear = principal / n_payments
+    payment = np.where(monthly_rate != 0, annuity, linear)
+    return np.where(n_payments > 0, payment, 0.0)
+
+
+def _balance_after(principal: np.ndarray, monthly_rate: np.ndarray,
+                   payment: np.ndarray, n_payments: np.ndarray,
+                   months: np.ndarray) -> np.ndarray:
+    """
+    Capital restant dû après `months` mensualités (forme fermée)
+
+    Args:
+        principal, monthly_rate, payment, n_payments: Vecteurs (n_prets,)
+        months: Nombres de mensualités (n_prets, k) ou (k,)
+
+    Returns:
+        Capital restant (n_prets, k), nul après la dernière échéance
+    """
+    months = np.minimum(np.broadcast_to(months, (len(principal),) + np.shape(months)[-1:]),
+                        n_payments[:, None])
+    rate = monthly_rate[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (1 + rate) ** months
+        balance = principal[:, None] * growth - payment[:, None] * (growth - 1) / rate
+    linear = principal[:, None] - payment[:, None] * months
+    balance = np.where(rate != 0, balance, linear)
+    return np.maximum(balance, 0.0)
+
+
+def loan_schedule_arrays(principal, annual_rate, years, structured: bool = False):
+    """
+    Tableau d'amortissement mensuel calculé en forme fermée (sans boucle)
+
+    Accepte des scalaires ou des tableaux de même forme : chaque prêt devient
+    une ligne, les mois au-delà de sa durée sont à zéro.
+
+    Args:
+        principal: Montant(s) emprunté(s)
+        annual_rate: Taux annuel(s) (en %)
+        years: Durée(s) en années
+        structured: Retourner un tableau structuré NumPy plutôt qu'un dict
+
+    Returns:
+        Dict de tableaux {'month', 'payment', 'interest', 'principal', 'balance'}
+        de forme (n_mois,) pour un prêt ou (n_prets, n_mois_max) pour un lot,
+        ou le tableau structuré équivalent
+    """
+    p, rate, n_payments, is_scalar = _loan_inputs(principal, annual_rate, years)
+    payment = _monthly_payment(p, rate, n_payments)
+
+    n_months = int(n_payments.max()) if len(n_payments) else 0
+    months = np.arange(1, n_months + 1)
+    in_term = months[None, :] <= n_payments[:, None]
+
+    balance_before = _balance_after(p, rate, payment, n_payments, months - 1)
+    interest = np.where(in_term, balance_before * rate[:, None], 0.0)
+    payments = np.where(in_term, payment[:, None], 0.0)
+    columns = {
+        'month': np.broadcast_to(months, payments.shape).copy(),
+        'payment': payments,
+        'interest': interest,
+        'principal': payments - interest,
+        'balance': _balance_after(p, rate, payment, n_payments, months),
+    }
+
+    if is_scalar:
+        columns = {name: values[0] for name, values in columns.items()}
+
+    if structured:
+        shape = columns['payment'].shape
+        result = np.empty(shape, dtype=[('month', np.int32)] +
+                          [(name, np.float64) for _, name in LOAN_SCHEDULE_FIELDS[1:]])
+        for name, values in columns.items():
+            result[name] = values
+        return result
+
+    return columns
+
+
+def annual_loan_schedule(principal, annual_rate, years):
+    """
+    Tableau d'amortissement agrégé par année, sans matérialiser les mois
+
+    Le capital remboursé sur une année est la différence entre les capitaux
+    restants (forme fermée) en début et en fin d'année.
+
+    Args:
+        principal: Montant(s) emprunté(s)
+        annual_rate: Taux annuel(s) (en %)
+        years: Durée(s) en années
+
+    Returns:
+        Dict de tableaux {'year', 'payment', 'interest', 'principal', 'balance'}
+        de forme (n_annees,) ou (n_prets, n_annees_max)
+    """
+    p, rate, n_payments, is_scalar = _loan_inputs(principal, annual_rate, years)
+    payment = _monthly_payment(p, rate, n_payments)
+
+    n_years = int(np.ceil(n_payments.max() / 12)) if len(n_payments) else 0
+    year_index = np.arange(1, n_years + 1)
+
+    balance_start = _balance_after(p, rate, payment, n_payments, (year_index - 1) * 12)
+    balance_end = _balance_after(p, rate, payment, n_payments, year_index * 12)
+    months_paid = np.clip(n_payments[:, None] - (year_index - 1) * 12, 0, 12)
+    payments = payment[:, None] * months_paid
+    capital = balance_start - balance_end
+
+    columns = {
+        'year': np.broadcast_to(year_index, payments.shape).copy(),
+        'payment': payments,
+        'interest': payments - capital,
+        'principal': capital,
+        'balance': balance_end,
+    }
+
+    if is_scalar:
+        columns = {name: values[0] for name, values in columns.items()}
+    return columns
+
+
+@timed()
 def calculate_loan_schedule(principal: float, annual_rate: float, 
                             years: int) -> pd.DataFrame:
     """
@@ -22,30 +169,112 @@ def calculate_loan_schedule(principal: float, annual_rate: float,
     if annual_rate == 0 or years == 0:
         return pd.DataFrame()
     
-    monthly_rate = annual_rate / 100 / 12
-    n_payments = years * 12
-    
-    # Calcul de la mensualité
-    monthly_payment = principal * (monthly_rate * (1 + monthly_rate)**n_payments) / \
-                     ((1 + monthly_rate)**n_payments - 1)
-    
-    schedule = []
-    remaining_balance = principal
-    
-    for month in range(1, n_payments + 1):
-        interest = remaining_balance * monthly_rate
-        principal_payment = monthly_payment - interest
-        remaining_balance -= principal_payment
-        
-        schedule.append({
-            'Mois': month,
-            'Mensualité': monthly_payment,
-            'Intérêts': interest,
-            'Capital': principal_payment,
-            'Capital Restant': max(0, remaining_balance)
-        })
-    
-    return pd.DataFrame(schedule)
+    schedule = loan_schedule_arrays(principal, annual_rate, years)
+    return pd.DataFrame({label: schedule[name] for label, name in LOAN_SCHEDULE_FIELDS})
+
+
+# Bornes de recherche du TRI (taux décimaux) et grille de bracketing
+IRR_RATE_MIN = -0.99
+IRR_RATE_MAX = 10.0
+_IRR_GRID = np.expm1(np.linspace(np.log1p(IRR_RATE_MIN), np.log1p(IRR_RATE_MAX), 65))
+
+
+def _npv_matrix(cashflows: np.ndarray, rates: np.ndarray) -> np.ndarray:
+    """
+    VAN de chaque ligne de flux pour une grille de taux
+
+    Args:
+        cashflows: Flux (n_scenarios, n_periodes)
+        rates: Taux décimaux (n_taux,)
+
+    Returns:
+        Tableau (n_scenarios, n_taux)
+    """
+    periods = np.arange(cashflows.shape[1])
+    discount = (1.0 + rates)[:, None] ** -periods[None, :]
+    return cashflows @ discount.T
+
+
+def calculate_irr_batch(cashflows, tol: float = 1e-12, max_iter: int = 100) -> np.ndarray:
+    """
+    Calcule le TRI de nombreux scénarios en une seule passe vectorisée
+
+    Pour chaque ligne, une racine de la VAN est encadrée sur une grille de taux
+    (le changement de signe le plus proche de 0 % est retenu), puis affinée par
+    Newton sécurisé : un pas de Newton sortant de l'encadrement est remplacé
+    par une bissection, ce qui garantit la convergence.
+
+    Args:
+        cashflows: Flux de trésorerie (n_scenarios, n_periodes), période 0 en premier
+        tol: Tolérance sur le taux
+        max_iter: Nombre maximal d'itérations
+
+    Returns:
+        TRI en pourcentage par scénario (NaN si aucun TRI dans [-99 %, 1000 %])
+    """
+    cashflows = np.atleast_2d(np.asarray(cashflows, dtype=float))
+    n_rows = cashflows.shape[0]
+    result = np.full(n_rows, np.nan)
+    if n_rows == 0 or cashflows.shape[1] < 2:
+        return result
+
+    # 1. Encadrement : changement de signe de la VAN entre deux taux consécutifs
+    npv_grid = _npv_matrix(cashflows, _IRR_GRID)
+    exact = npv_grid == 0
+    crossing = (np.sign(npv_grid[:, :-1]) * np.sign(npv_grid[:, 1:])) < 0
+    midpoints = (_IRR_GRID[:-1] + _IRR_GRID[1:]) / 2
+    distance = np.where(crossing, np.abs(midpoints), np.inf)
+    best = np.argmin(distance, axis=1)
+    found = np.isfinite(distance[np.arange(n_rows), best])
+
+    # Racine exacte sur la grille (hors flux tous nuls : TRI indéfini)
+    exact_rows = exact.any(axis=1) & np.any(cashflows != 0, axis=1)
+    found &= np.any(cashflows != 0, axis=1)
+    if exact_rows.any():
+        exact_dist = np.where(exact, np.abs(_IRR_GRID), np.inf)
+        result[exact_rows] = _IRR_GRID[np.argmin(exact_dist[exact_rows], axis=1)]
+
+    rows = np.flatnonzero(found & ~exact_rows)
+    if rows.size:
+        cf = cashflows[rows]
+        lo = _IRR_GRID[best[rows]]
+        hi = _IRR_GRID[best[rows] + 1]
+        f_lo = npv_grid[rows, best[rows]]
+        periods = np.arange(cf.shape[1])
+        rate = (lo + hi) / 2
+        active = np.ones(rows.size, dtype=bool)
+
+        # 2. Newton sécurisé (bissection si le pas sort de [lo, hi])
+        for _ in range(max_iter):
+            base = 1.0 + rate[active]
+            discount = base[:, None] ** -periods[None, :]
+            f = np.sum(cf[active] * discount, axis=1)
+            df = np.sum(-periods[None, :] * cf[active] * discount / base[:, None], axis=1)
+
+            # Mise à jour de l'encadrement
+            same_side = np.sign(f) == np.sign(f_lo[active])
+            lo_a, hi_a, f_lo_a = lo[active], hi[active], f_lo[active]
+            lo_a = np.where(same_side, rate[active], lo_a)
+            f_lo_a = np.where(same_side, f, f_lo_a)
+            hi_a = np.where(same_side, hi_a, rate[active])
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                newton = rate[active] - f / df
+            bisect = (lo_a + hi_a) / 2
+            use_newton = np.isfinite(newton) & (newton > lo_a) & (newton < hi_a)
+            new_rate = np.where(use_newton, newton, bisect)
+            new_rate = np.where(f == 0, rate[active], new_rate)
+
+            converged = (np.abs(new_rate - rate[active]) < tol) | (f == 0)
+            lo[active], hi[active], f_lo[active] = lo_a, hi_a, f_lo_a
+            rate[active] = new_rate
+            active[np.flatnonzero(active)[converged]] = False
+            if not active.any():
+                break
+
+        result[rows] = rate
+
+    return result * 100
 
 
 def calculate_irr(cashflows: List[float]) -> float:
@@ -56,13 +285,10 @@ def calculate_irr(cashflows: List[float]) -> float:
         cashflows: Liste des flux de trésorerie (investissement initial négatif)
     
     Returns:
-        TRI en pourcentage
+        TRI en pourcentage (0.0 si le TRI n'est pas défini)
     """
-    try:
-        irr = np.irr(cashflows)
-        return irr * 100
-    except:
-        return 0.0
+    irr = calculate_irr_batch([cashflows])[0]
+    return float(irr) if np.isfinite(irr) else 0.0
 
 
 def calculate_npv(cashflows: List[float], discount_rate: float) -> float:
@@ -81,6 +307,49 @@ def calculate_npv(cashflows: List[float], discount_rate: float) -> float:
     return npv
 
 
+# Régimes micro (plafonds de loyers annuels, abattements) et prélèvements sociaux
+PLAFOND_MICRO_FONCIER = 15000
+ABATTEMENT_MICRO_FONCIER = 0.3
+PLAFOND_MICRO_BIC = 77700
+ABATTEMENT_MICRO_BIC = 0.5
+TAUX_PRELEVEMENTS_SOCIAUX = 0.172
+
+
+def calculate_tax_foncier(loyers_annuels, charges_deductibles, tranche_marginale) -> Dict:
+    """
+    Calcule l'imposition d'une location nue : micro-foncier et régime réel
+
+    Accepte des scalaires ou des tableaux numpy (calcul élément par élément).
+
+    Args:
+        loyers_annuels: Loyers annuels
+        charges_deductibles: Charges déductibles au réel (intérêts, charges, etc.)
+        tranche_marginale: Tranche marginale d'imposition (en %)
+
+    Returns:
+        Dictionnaire avec les revenus imposables et impôts (impôt sur le
+        revenu et prélèvements sociaux) des deux régimes ; ceux du
+        micro-foncier valent NaN au-delà du plafond de loyers
+    """
+    loyers_annuels = np.asarray(loyers_annuels, dtype=float)
+    charges_deductibles = np.asarray(charges_deductibles, dtype=float)
+    taux = np.asarray(tranche_marginale, dtype=float) / 100
+
+    micro_eligible = loyers_annuels <= PLAFOND_MICRO_FONCIER
+    revenus_micro = np.where(micro_eligible,
+                             loyers_annuels * (1 - ABATTEMENT_MICRO_FONCIER), np.nan)
+    revenus_reel = np.maximum(0, loyers_annuels - charges_deductibles)
+
+    return {
+        'micro_eligible': micro_eligible,
+        'revenus_imposables_micro': revenus_micro,
+        'impot_micro': revenus_micro * taux + calculate_social_charges(revenus_micro),
+        'revenus_imposables_reel': revenus_reel,
+        'impot_reel': revenus_reel * taux + calculate_social_charges(revenus_reel),
+        'deficit_foncier': np.maximum(0, charges_deductibles - loyers_annuels)
+    }
+
+
 def calculate_tax_lmnp(revenus_locatifs: float, charges_deductibles: float,
                        amortissement: float = 0) -> Dict:
     """
@@ -94,13 +363,14 @@ def calculate_tax_lmnp(revenus_locatifs: float, charges_deductibles: float,
     Returns:
         Dictionnaire avec les détails fiscaux
     """
-    # Régime réel simplifié
+    # Régime réel simplifié (np.maximum/np.minimum : scalaires ou tableaux numpy)
     revenus_imposables = revenus_locatifs - charges_deductibles - amortissement
-    revenus_imposables = max(0, revenus_imposables)
+    revenus_imposables = np.maximum(0, revenus_imposables)
     
     # Abattement micro-BIC (50% avec plafond de 77 700€)
-    abattement_micro = min(revenus_locatifs * 0.5, 77700 * 0.5)
-    revenus_micro = max(0, revenus_locatifs - abattement_micro)
+    abattement_micro = np.minimum(revenus_locatifs * ABATTEMENT_MICRO_BIC,
+                                  PLAFOND_MICRO_BIC * ABATTEMENT_MICRO_BIC)
+    revenus_micro = np.maximum(0, revenus_locatifs - abattement_micro)
     
     return {
         'revenus_locatifs': revenus_locatifs,
@@ -246,7 +516,7 @@ def calculate_social_charges(revenus_fonciers: float) -> float:
     Returns:
         Montant des prélèvements sociaux (17.2% en 2024)
     """
-    return revenus_fonciers * 0.172
+    return revenus_fonciers * TAUX_PRELEVEMENTS_SOCIAUX
 
 
 def calculate_profitability_ratios(prix_acquisition: float, loyers_annuels: float,
@@ -0,0 +1,287 @@
+"""
+Hiérarchie administrative des communes (canton, arrondissement, département,
+région) et tables agrégées DVF à chaque niveau
+"""
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.dvf_store import DVFStore, get_store
+from utils.profiling import profiled_cache, timed
+
+INSEE_COMMUNES_PATH = 'insee/v_commune_2025.csv'
+INSEE_DEPARTEMENTS_PATH = 'insee/v_departement_2025.csv'
+
+# Niveau -> colonne du référentiel INSEE
+HIERARCHY_LEVELS = {
+    'commune': 'insee_com',
+    'canton': 'can',
+    'arrondissement': 'arr',
+    'departement': 'dep',
+    'region': 'reg'
+}
+
+# Fichiers des libellés par niveau (colonne code, chemin)
+LEVEL_LABELS = {
+    'canton': ('CAN', 'insee/v_canton_2025.csv'),
+    'arrondissement': ('ARR', 'insee/v_arrondissement_2025.csv'),
+    'departement': ('DEP', INSEE_DEPARTEMENTS_PATH),
+    'region': ('REG', 'insee/v_region_2025.csv')
+}
+
+# Colonnes sommées et colonnes moyennées (pondération par le nombre de mutations)
+SUM_COLS = ['nb_mutations', 'nb_maisons', 'nb_apparts']
+WEIGHTED_COLS = ['prix_moyen', 'prix_m2_moyen', 'surface_moy']
+
+
+def departement_from_code(insee_code: str) -> str:
+    """
+    Déduit le département d'un code INSEE (2A/2B pour la Corse, 3 caractères en outre-mer)
+
+    Args:
+        insee_code: Code INSEE de la commune
+
+    Returns:
+        Code du département
+    """
+    code = str(insee_code)
+    return code[:3] if code.startswith('97') else code[:2]
+
+
+@profiled_cache(st.cache_data)
+def load_commune_hierarchy() -> pd.DataFrame:
+    """
+    Charge la hiérarchie administrative des communes INSEE
+
+    Les communes déléguées, associées et arrondissements municipaux héritent
+    de la hiérarchie de leur commune parente.
+
+    Returns:
+        DataFrame indexé par code INSEE avec colonnes 'can', 'arr', 'dep', 'reg'
+    """
+    try:
+        ref = pd.read_csv(INSEE_COMMUNES_PATH, dtype=str)
+    except Exception:
+        return pd.DataFrame(columns=['can', 'arr', 'dep', 'reg'])
+
+    ref.columns = ref.columns.str.strip()
+    ref = ref.rename(columns={'CAN': 'can', 'ARR': 'arr', 'DEP': 'dep', 'REG': 'reg'})
+    communes = ref[ref['TYPECOM'] == 'COM'].set_index('COM')[['can', 'arr', 'dep', 'reg']]
+
+    # Communes déléguées / associées / arrondissements : hiérarchie de la parente
+    autres = ref[(ref['TYPECOM'] != 'COM') & ~ref['COM'].isin(communes.index)]
+    autres = autres.drop_duplicates('COM')
+    parentes = communes.reindex(autres['COMPARENT'].to_numpy())
+    parentes.index = autres['COM'].to_numpy()
+
+    hierarchy = pd.concat([communes, parentes])
+    hierarchy.index.name = 'insee_com'
+    return hierarchy
+
+
+@profiled_cache(st.cache_data)
+def load_level_labels(level: str) -> Dict[str, str]:
+    """
+    Charge les libellés d'un niveau administratif
+
+    Args:
+        level: 'canton', 'arrondissement', 'departement' ou 'region'
+
+    Returns:
+        Dictionnaire code -> libellé
+    """
+    if level not in LEVEL_LABELS:
+        return {}
+    code_col, path = LEVEL_LABELS[level]
+    try:
+        ref = pd.read_csv(path, dtype=str)
+    except Exception:
+        return {}
+    return dict(zip(ref[code_col], ref['LIBELLE']))
+
+
+def attach_hierarchy(codes: pd.Index, hierarchy: pd.DataFrame) -> pd.DataFrame:
+    """
+    Associe la hiérarchie administrative à une liste de codes INSEE
+
+    Les codes absents du référentiel (anciennes communes) sont rattachés à
+    leur département déduit du code, et à la région de ce département.
+
+    Args:
+        codes: Codes INSEE
+        hierarchy: Hiérarchie (voir load_commune_hierarchy)
+
+    Returns:
+        DataFrame indexé par code avec colonnes 'can', 'arr', 'dep', 'reg'
+    """
+    result = hierarchy.reindex(codes)
+    manquants = result['dep'].isna()
+    if manquants.any():
+        deps = pd.Series([departement_from_code(c) for c in codes[manquants.to_numpy()]],
+                         index=result.index[manquants])
+        dep_to_reg = hierarchy.dropna(subset=['dep']).drop_duplicates('dep').set_index('dep')['reg']
+        result.loc[manquants, 'dep'] = deps
+        result.loc[manquants, 'reg'] = deps.map(dep_to_reg)
+    return result
+
+
+@timed()
+def rollup(rows: pd.DataFrame, keys: np.ndarray, key_name: str) -> pd.DataFrame:
+    """
+    Agrège des lignes DVF par clé et par année
+
+    Les volumes sont sommés ; prix et surfaces sont des moyennes pondérées par
+    le nombre de mutations (lignes sans valeur exclues du dénominateur).
+
+    Args:
+        rows: Lignes DVF
+        keys: Clé d'agrégation de chaque ligne (NaN = ligne ignorée)
+        key_name: Nom de la colonne clé
+
+    Returns:
+        DataFrame indexé par (clé, annee), trié
+    """
+    poids = rows['nb_mutations'].fillna(0).to_numpy(dtype=float)
+    data = {key_name: keys, 'annee': rows['annee'].to_numpy(),
+            'nb_communes': np.ones(len(rows))}
+    for col in SUM_COLS:
+        if col in rows.columns:
+            data[col] = rows[col].fillna(0).to_numpy(dtype=float)
+    for col in WEIGHTED_COLS:
+        if col in rows.columns:
+            valeurs = rows[col].to_numpy(dtype=float)
+            valide = ~np.isnan(valeurs)
+            data[f'_{col}_xw'] = np.where(valide, valeurs * poids, 0.0)
+            data[f'_{col}_w'] = np.where(valide, poids, 0.0)
+
+    sums = pd.DataFrame(data).dropna(subset=[key_name]).groupby([key_name, 'annee']).sum()
+
+    table = sums[[c for c in ['nb_communes'] + SUM_COLS if c in sums.columns]].copy()
+    for col in WEIGHTED_COLS:
+        if f'_{col}_w' in sums.columns:
+            w = sums[f'_{col}_w']
+            table[col] = (sums[f'_{col}_xw'] / w).where(w > 0)
+    if {'nb_maisons', 'nb_apparts', 'nb_mutations'} <= set(table.columns):
+        total = table['nb_mutations'].where(table['nb_mutations'] > 0)
+        table['prop_maison'] = table['nb_maisons'] / total * 100
+        table['prop_appart'] = table['nb_apparts'] / total * 100
+    table['nb_communes'] = table['nb_communes'].astype(int)
+    return table.sort_index()
+
+
+class HierarchyCube:
+    """
+    Tables DVF pré-agrégées à chaque niveau administratif et pour chaque année
+
+    Construites une seule fois par store (voir get_hierarchy_cube) : une page
+    régionale ou départementale lit quelques lignes au lieu de parcourir
+    toutes les communes.
+    """
+
+    def __init__(self, store: DVFStore, hierarchy: Optional[pd.DataFrame] = None):
+        """
+        Args:
+            store: DVFStore
+            hierarchy: Hiérarchie INSEE (par défaut load_commune_hierarchy())
+        """
+        if hierarchy is None:
+            hierarchy = load_commune_hierarchy()
+
+        categories = store.insee_codes.categories
+        self.communes = attach_hierarchy(pd.Index(categories), hierarchy)
+
+        # Clés de chaque ligne du store (les lignes sans code INSEE sont en fin)
+        codes = store.insee_codes.codes
+        rows = store.df.iloc[:len(codes)]
+
+        # Communes de chaque entité (positions dans self.communes)
+        self._members: Dict[str, Dict[str, np.ndarray]] = {
+            level: self.communes.groupby(col).indices
+            for level, col in HIERARCHY_LEVELS.items() if col != 'insee_com'
+        }
+
+        self.tables: Dict[str, pd.DataFrame] = {}
+        for level, col in HIERARCHY_LEVELS.items():
+            if col == 'insee_com':
+                keys = np.asarray(categories, dtype=object)[codes]
+            else:
+                keys = self.communes[col].to_numpy(dtype=object)[codes]
+            self.tables[level] = rollup(rows, keys, col)
+
+    def get(self, level: str, code: Optional[str] = None,
+            year: Optional[int] = None) -> pd.DataFrame:
+        """
+        Lit une table agrégée
+
+        Args:
+            level: Niveau ('commune', 'canton', 'arrondissement', 'departement', 'region')
+            code: Code de l'entité (None = toutes)
+            year: Année optionnelle
+
+        Returns:
+            DataFrame (copie), indexé par (code, annee) ; par année si code est donné
+        """
+        table = self.tables[level]
+        if code is not None:
+            code = str(code)
+            if code not in table.index.get_level_values(0):
+                return table.iloc[0:0].droplevel(0).copy()
+            table = table.loc[code]
+            if year is not None:
+                table = table[table.index == year]
+        elif year is not None:
+            table = table.xs(year, level='annee', drop_level=False)
+        return table.copy()
+
+    def communes_in(self, level: str, code: str) -> List[str]:
+        """
+        Codes INSEE des communes rattachées à une entité
+
+        Args:
+            level: Niveau ('canton', 'arrondissement', 'departement', 'region')
+            code: Code de l'entité
+
+        Returns:
+            Liste triée des codes INSEE
+        """
+        positions = self._members[level].get(str(code), np.array([], dtype=np.int64))
+        return self.communes.index[positions].tolist()
+
+    def children(self, level: str, code: str, child_level: str,
+                 year: Optional[int] = None) -> pd.DataFrame:
+        """
+        Lit les entités d'un niveau inférieur rattachées à une entité
+
+        Args:
+            level: Niveau parent (ex: 'region')
+            code: Code de l'entité parente
+            child_level: Niveau des enfants (ex: 'departement')
+            year: Année optionnelle
+
+        Returns:
+            DataFrame (copie) indexé par (code enfant, annee)
+        """
+        child_col = HIERARCHY_LEVELS[child_level]
+        membres = self.communes.iloc[self._members[level].get(str(code), [])]
+        enfants = membres.index if child_col == 'insee_com' else membres[child_col].dropna().unique()
+        table = self.tables[child_level]
+        table = table[table.index.get_level_values(0).isin(enfants)]
+        if year is not None:
+            table = table[table.index.get_level_values('annee') == year]
+        return table.copy()
+
+
+def get_hierarchy_cube(data: Union[DVFStore, pd.DataFrame]) -> HierarchyCube:
+    """
+    Retourne les tables agrégées d'un jeu de données DVF (construites une fois)
+
+    Args:
+        data: DVFStore ou DataFrame DVF
+
+    Returns:
+        HierarchyCube
+    """
+    store = get_store(data)
+    return store.memoize(('hierarchy_cube',), lambda: HierarchyCube(store))
@@ -0,0 +1,152 @@
+"""
+Correspondance des anciens codes INSEE vers les codes des communes actuelles
+(fusions, communes nouvelles, changements de département)
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.hierarchy import rollup
+from utils.profiling import profiled_cache, timed
+
+INSEE_MOUVEMENTS_PATH = 'insee/v_mvt_commune_2025.csv'
+INSEE_HISTORIQUE_PATH = 'insee/v_commune_depuis_1943.csv'
+
+# Types d'événements qui font disparaître un code au profit d'un autre :
+# 31 fusion simple, 32 création de commune nouvelle, 33 fusion-association,
+# 34 fusion-association devenue fusion simple, 41 changement de département,
+# 50 transfert de chef-lieu
+MODS_FUSION = {'31', '32', '33', '34', '41', '50'}
+
+
+def build_code_remap(mouvements: pd.DataFrame, historique: pd.DataFrame) -> Dict[str, str]:
+    """
+    Construit la table ancien code -> code actuel
+
+    Les événements sont appliqués dans l'ordre chronologique (le plus récent
+    l'emporte) puis les chaînes de fusions sont parcourues jusqu'au code
+    actuel. Les communes encore existantes ne sont jamais remplacées.
+
+    Args:
+        mouvements: Contenu de v_mvt_commune (colonnes MOD, DATE_EFF, TYPECOM_AV,
+                    COM_AV, TYPECOM_AP, COM_AP)
+        historique: Contenu de v_commune_depuis_1943 (colonnes TYPECOM, COM, DATE_FIN)
+
+    Returns:
+        Dictionnaire ancien code -> code actuel (codes inchangés absents)
+    """
+    actuelles = set(historique.loc[(historique['TYPECOM'] == 'COM')
+                                   & historique['DATE_FIN'].isna(), 'COM'])
+
+    aretes = mouvements[
+        mouvements['MOD'].isin(MODS_FUSION)
+        & (mouvements['TYPECOM_AV'] == 'COM')
+        & (mouvements['TYPECOM_AP'] == 'COM')
+        & (mouvements['COM_AV'] != mouvements['COM_AP'])
+    ].sort_values('DATE_EFF', kind='stable')
+
+    suivant = dict(zip(aretes['COM_AV'], aretes['COM_AP']))
+    for code in actuelles & set(suivant):
+        del suivant[code]
+
+    # Réduction des chaînes (A -> B -> C devient A -> C)
+    remap = {}
+    for code in suivant:
+        cible, vus = suivant[code], {code}
+        while cible in suivant and cible not in vus:
+            vus.add(cible)
+            cible = suivant[cible]
+        remap[code] = cible
+    return remap
+
+
+@profiled_cache(st.cache_data)
+def load_code_remap() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Charge la table de correspondance des codes INSEE
+
+    Returns:
+        Tuple (anciens codes triés, codes actuels correspondants) ;
+        tableaux vides si les fichiers INSEE sont absents
+    """
+    try:
+        mouvements = pd.read_csv(INSEE_MOUVEMENTS_PATH, dtype=str)
+        historique = pd.read_csv(INSEE_HISTORIQUE_PATH, dtype=str)
+    except Exception:
+        return np.array([], dtype=object), np.array([], dtype=object)
+
+    remap = build_code_remap(mouvements, historique)
+    anciens = np.array(sorted(remap), dtype=object)
+    return anciens, np.array([remap[c] for c in anciens], dtype=object)
+
+
+@timed()
+def remap_insee_codes(codes: pd.Series, anciens: np.ndarray,
+                      actuels: np.ndarray) -> pd.Series:
+    """
+    Remplace les anciens codes INSEE par les codes actuels
+
+    Les codes distincts sont traduits une fois (recherche dichotomique dans
+    la table triée), puis appliqués à toutes les lignes par un take entier.
+
+    Args:
+        codes: Codes INSEE des lignes
+        anciens: Anciens codes triés (voir load_code_remap)
+        actuels: Codes actuels correspondants
+
+    Returns:
+        Série des codes actuels (NaN conservés)
+    """
+    positions, uniques = pd.factorize(codes)
+    uniques = np.asarray(uniques, dtype=object)
+    if len(anciens) == 0 or len(uniques) == 0:
+        return codes
+
+    pos = np.searchsorted(anciens, uniques).clip(max=len(anciens) - 1)
+    trouves = anciens[pos] == uniques
+    traduits = np.where(trouves, actuels[pos], uniques)
+
+    # -1 (valeur manquante) pointe vers la sentinelle NaN ajoutée en fin
+    traduits = np.append(traduits, np.nan)
+    return pd.Series(traduits.take(positions), index=codes.index, name=codes.name)
+
+
+@timed()
+def consolidate_communes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fusionne les lignes d'une même commune et d'une même année
+
+    Après correspondance des codes, les anciennes communes fusionnées
+    partagent le code de la commune actuelle : leurs lignes sont regroupées
+    (volumes sommés, prix et surfaces pondérés par le nombre de mutations).
+
+    Args:
+        df: DataFrame DVF normalisé
+
+    Returns:
+        DataFrame avec une ligne par (commune, année), ordre d'origine conservé
+    """
+    doublons = df.duplicated(['insee_com', 'annee'], keep=False) & df['insee_com'].notna()
+    if not doublons.any():
+        return df
+
+    groupes = df[doublons]
+    agreges = rollup(groupes, groupes['insee_com'].to_numpy(dtype=object), 'insee_com')
+    agreges = agreges.drop(columns='nb_communes').reset_index()
+
+    # Chaque groupe reprend la position (index) de sa première ligne
+    premiers = groupes.drop_duplicates(['insee_com', 'annee'])
+    agreges = agreges.merge(
+        premiers.drop(columns=agreges.columns.difference(['insee_com', 'annee']),
+                      errors='ignore').reset_index(),
+        on=['insee_com', 'annee']
+    ).set_index('index')
+    agreges.index.name = df.index.name
+
+    result = pd.concat([df[~doublons], agreges[df.columns]]).sort_index()
+    for col in df.columns:
+        if result[col].dtype != df[col].dtype and df[col].dtype.kind in 'iu':
+            result[col] = result[col].round().astype(df[col].dtype)
+    return result
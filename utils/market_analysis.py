@@ -5,6 +5,21 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional, Tuple
 import streamlit as st
+from utils.dvf_panel import get_panel, get_trend_table
+from utils.dvf_store import get_store
+from utils.profiling import timed
+from utils.market_report import (
+    MarketReport, build_commune_report, build_market_report,
+    BAREME_LIQUIDITE, BAREME_TENDANCE, BAREME_VOLUME, BAREME_STABILITE,
+    APPRECIATIONS, APPRECIATION_DEFAUT
+)
+
+
+def _get_report(df: pd.DataFrame, commune: Optional[str]) -> MarketReport:
+    """Rapport de marché de la commune (mis en cache), ou de toutes les lignes"""
+    if commune:
+        return build_commune_report(get_store(df), commune)
+    return build_market_report(df)
 
 
 def analyze_price_trends(df: pd.DataFrame, commune: Optional[str] = None) -> Dict:
@@ -18,54 +33,7 @@ def analyze_price_trends(df: pd.DataFrame, commune: Optional[str] = None) -> Dic
     Returns:
         Dictionnaire avec les tendances
     """
-    if commune:
-        from utils.dvf_loader import get_commune_data
-        df = get_commune_data(df, commune)
-    
-    if df.empty or 'annee' not in df.columns:
-        return {}
-    
-    # Calculer les moyennes par année
-    yearly_avg = df.groupby('annee').agg({
-        'prix_moyen': 'mean',
-        'prix_m2_moyen': 'mean',
-        'nb_mutations': 'sum'
-    }).reset_index()
-    
-    if len(yearly_avg) < 2:
-        return {'tendance': 'Données insuffisantes'}
-    
-    # Calculer les variations
-    variation_prix = yearly_avg['prix_moyen'].pct_change().mean() * 100
-    variation_prix_m2 = yearly_avg['prix_m2_moyen'].pct_change().mean() * 100
-    
-    # Tendance générale (régression linéaire simple)
-    if 'prix_m2_moyen' in yearly_avg.columns:
-        years = yearly_avg['annee'].values
-        prices = yearly_avg['prix_m2_moyen'].values
-        
-        # Régression linéaire
-        z = np.polyfit(years, prices, 1)
-        tendance_slope = z[0]
-        
-        if tendance_slope > 50:
-            tendance = "Forte hausse"
-        elif tendance_slope > 0:
-            tendance = "Hausse modérée"
-        elif tendance_slope > -50:
-            tendance = "Baisse modérée"
-        else:
-            tendance = "Forte baisse"
-    else:
-        tendance = "Indéterminée"
-    
-    return {
-        'variation_prix_annuelle': variation_prix,
-        'variation_prix_m2_annuelle': variation_prix_m2,
-        'tendance': tendance,
-        'nombre_annees': len(yearly_avg),
-        'evolution': yearly_avg
-    }
+    return _get_report(df, commune).copy_of('trends')
 
 
 def calculate_market_liquidity(df: pd.DataFrame, commune: Optional[str] = None) -> Dict:
@@ -79,45 +47,7 @@ def calculate_market_liquidity(df: pd.DataFrame, commune: Optional[str] = None)
     Returns:
         Dictionnaire avec indicateurs de liquidité
     """
-    if commune:
-        from utils.dvf_loader import get_commune_data
-        df = get_commune_data(df, commune)
-    
-    if df.empty:
-        return {}
-    
-    # Nombre de transactions
-    total_transactions = df['nb_mutations'].sum() if 'nb_mutations' in df.columns else 0
-    
-    # Transactions par année
-    if 'annee' in df.columns:
-        annees_uniques = df['annee'].nunique()
-        transactions_par_an = total_transactions / annees_uniques if annees_uniques > 0 else 0
-    else:
-        transactions_par_an = 0
-    
-    # Volume du marché
-    if 'prix_moyen' in df.columns and 'nb_mutations' in df.columns:
-        volume_total = (df['prix_moyen'] * df['nb_mutations']).sum()
-    else:
-        volume_total = 0
-    
-    # Évaluer la liquidité
-    if transactions_par_an > 100:
-        liquidite = "Très liquide"
-    elif transactions_par_an > 50:
-        liquidite = "Liquide"
-    elif transactions_par_an > 20:
-        liquidite = "Moyennement liquide"
-    else:
-        liquidite = "Peu liquide"
-    
-    return {
-        'total_transactions': total_transactions,
-        'transactions_par_an': transactions_par_an,
-        'volume_total': volume_total,
-        'evaluation_liquidite': liquidite
-    }
+    return _get_report(df, commune).copy_of('liquidity')
 
 
 def compare_to_market(prix_m2: float, df: pd.DataFrame, 
@@ -133,43 +63,7 @@ def compare_to_market(prix_m2: float, df: pd.DataFrame,
     Returns:
         Dictionnaire avec la comparaison
     """
-    if commune:
-        from utils.dvf_loader import get_commune_data
-        df = get_commune_data(df, commune)
-    
-    if df.empty or 'prix_m2_moyen' not in df.columns:
-        return {'statut': 'Données insuffisantes'}
-    
-    # Statistiques du marché
-    prix_m2_marche = df['prix_m2_moyen'].mean()
-    prix_m2_median = df['prix_m2_moyen'].median()
-    prix_m2_std = df['prix_m2_moyen'].std()
-    
-    # Écart par rapport à la moyenne
-    ecart_pct = ((prix_m2 - prix_m2_marche) / prix_m2_marche) * 100
-    
-    # Positionnement
-    if prix_m2 < prix_m2_median * 0.8:
-        positionnement = "Bien en dessous du marché"
-        evaluation = "Excellent prix"
-    elif prix_m2 < prix_m2_median:
-        positionnement = "En dessous du marché"
-        evaluation = "Bon prix"
-    elif prix_m2 < prix_m2_median * 1.2:
-        positionnement = "Dans la moyenne du marché"
-        evaluation = "Prix correct"
-    else:
-        positionnement = "Au-dessus du marché"
-        evaluation = "Prix élevé"
-    
-    return {
-        'prix_m2_analyse': prix_m2,
-        'prix_m2_marche': prix_m2_marche,
-        'prix_m2_median': prix_m2_median,
-        'ecart_pourcentage': ecart_pct,
-        'positionnement': positionnement,
-        'evaluation': evaluation
-    }
+    return _get_report(df, commune).compare(prix_m2)
 
 
 def find_similar_properties(surface: float, df: pd.DataFrame,
@@ -186,6 +80,9 @@ def find_similar_properties(surface: float, df: pd.DataFrame,
     
     Returns:
         DataFrame avec les biens similaires
+    
+    Voir utils.comparables.find_comparables pour une recherche des plus
+    proches voisins (surface, prix au m², année) étendue au département.
     """
     if commune:
         from utils.dvf_loader import get_commune_data
@@ -217,101 +114,99 @@ def calculate_market_score(df: pd.DataFrame, commune: str) -> Dict:
     Returns:
         Dictionnaire avec le score et ses composantes
     """
-    from utils.dvf_loader import get_commune_data
-    df_commune = get_commune_data(df, commune)
-    
-    if df_commune.empty:
-        return {'score': 0, 'appreciation': 'Données insuffisantes'}
-    
-    score = 0
-    details = {}
-    
-    # 1. Liquidité (0-25 points)
-    liquidite = calculate_market_liquidity(df, commune)
-    if liquidite.get('transactions_par_an', 0) > 100:
-        score += 25
-        details['liquidite'] = 'Excellent'
-    elif liquidite.get('transactions_par_an', 0) > 50:
-        score += 20
-        details['liquidite'] = 'Bon'
-    elif liquidite.get('transactions_par_an', 0) > 20:
-        score += 15
-        details['liquidite'] = 'Moyen'
-    else:
-        score += 10
-        details['liquidite'] = 'Faible'
-    
-    # 2. Tendance des prix (0-35 points)
-    trends = analyze_price_trends(df, commune)
-    variation = trends.get('variation_prix_m2_annuelle', 0)
-    if variation > 5:
-        score += 35
-        details['tendance'] = 'Forte croissance'
-    elif variation > 2:
-        score += 30
-        details['tendance'] = 'Croissance'
-    elif variation > 0:
-        score += 25
-        details['tendance'] = 'Stable positif'
-    elif variation > -2:
-        score += 15
-        details['tendance'] = 'Stable'
-    else:
-        score += 5
-        details['tendance'] = 'Baisse'
-    
-    # 3. Volume du marché (0-20 points)
-    volume = liquidite.get('volume_total', 0)
-    if volume > 10000000:  # > 10M€
-        score += 20
-        details['volume'] = 'Très important'
-    elif volume > 5000000:
-        score += 15
-        details['volume'] = 'Important'
-    elif volume > 1000000:
-        score += 10
-        details['volume'] = 'Moyen'
-    else:
-        score += 5
-        details['volume'] = 'Faible'
-    
-    # 4. Stabilité (0-20 points)
-    if 'prix_m2_moyen' in df_commune.columns:
-        std = df_commune['prix_m2_moyen'].std()
-        mean = df_commune['prix_m2_moyen'].mean()
-        cv = (std / mean * 100) if mean > 0 else 100
-        
-        if cv < 10:
-            score += 20
-            details['stabilite'] = 'Très stable'
-        elif cv < 20:
-            score += 15
-            details['stabilite'] = 'Stable'
-        elif cv < 30:
-            score += 10
-            details['stabilite'] = 'Variable'
-        else:
-            score += 5
-            details['stabilite'] = 'Très variable'
-    
-    # Appréciation globale
-    if score >= 85:
-        appreciation = "Excellent marché"
-    elif score >= 70:
-        appreciation = "Bon marché"
-    elif score >= 55:
-        appreciation = "Marché correct"
-    elif score >= 40:
-        appreciation = "Marché moyen"
-    else:
-        appreciation = "Marché difficile"
+    return build_commune_report(get_store(df), commune).copy_of('score')
+
+
+def _select_bareme(values: np.ndarray, bareme) -> Tuple[np.ndarray, np.ndarray]:
+    """Version vectorisée de apply_bareme (np.select, NaN = palier par défaut)"""
+    op, paliers, (points_defaut, libelle_defaut) = bareme
+    conditions = [(values > seuil) if op == '>' else (values < seuil)
+                  for seuil, _, _ in paliers]
+    points = np.select(conditions, [p for _, p, _ in paliers], default=points_defaut)
+    libelles = np.select(conditions, [l for _, _, l in paliers], default=libelle_defaut)
+    return points, libelles
+
+
+@timed()
+def score_all_communes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcule le score de marché de toutes les communes en une passe vectorisée
     
-    return {
-        'score': score,
-        'score_max': 100,
-        'appreciation': appreciation,
-        'details': details
-    }
+    Mêmes composantes et mêmes barèmes que calculate_market_score, calculés
+    par groupby sur l'ensemble des communes au lieu d'un appel par commune
+    (la tendance provient de la table des tendances, voir utils.dvf_panel).
+    
+    Args:
+        df: DataFrame DVF
+    
+    Returns:
+        DataFrame (une ligne par commune) avec les indicateurs, les points de
+        chaque composante, le score total et l'appréciation
+    """
+    if df.empty or 'insee_com' not in df.columns:
+        return pd.DataFrame()
+    
+    rows = df[df['insee_com'].notna()]
+    rows = rows.assign(
+        insee_com=rows['insee_com'].astype(str),
+        prix_m2_moyen=rows['prix_m2_moyen'].astype(float),
+        volume=rows['prix_moyen'].astype(float) * rows['nb_mutations']
+    )
+    
+    # Indicateurs par commune (lignes commune-année)
+    communes = rows.groupby('insee_com', sort=True).agg(
+        total_transactions=('nb_mutations', 'sum'),
+        nb_annees=('annee', 'nunique'),
+        volume_total=('volume', 'sum'),
+        prix_m2_mean=('prix_m2_moyen', 'mean'),
+        prix_m2_std=('prix_m2_moyen', 'std'),
+    )
+    
+    # Tendance du prix/m² : taux composé et pente de la régression linéaire,
+    # calculés pour toutes les communes sur le panel commune × année
+    panel = get_panel(df)
+    tendances = get_trend_table(df).set_index('insee_com')
+    variation = pd.Series(panel.cagr('prix_m2_moyen') * 100, index=panel.communes)
+    pente = tendances['pente_relative']
+    
+    # Moins de 2 années : tendance indéterminée, variation considérée nulle
+    n_years = pd.Series(panel.observed.sum(axis=1), index=panel.communes)
+    variation = variation.where(n_years >= 2, 0.0)
+    pente = pente.where(n_years >= 2, 0.0)
+    
+    nb_annees = communes['nb_annees'].to_numpy()
+    communes['transactions_par_an'] = np.divide(
+        communes['total_transactions'].to_numpy(dtype=float), nb_annees,
+        out=np.zeros(len(communes)), where=nb_annees > 0
+    )
+    communes['variation_prix_m2_annuelle'] = variation.reindex(communes.index)
+    communes['pente_relative_prix_m2'] = pente.reindex(communes.index)
+    mean = communes['prix_m2_mean'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cv = communes['prix_m2_std'].to_numpy() / mean * 100
+    communes['cv_prix_m2'] = np.where(mean > 0, cv, 100.0)
+    
+    composantes = [
+        ('liquidite', 'transactions_par_an', BAREME_LIQUIDITE),
+        ('tendance', 'pente_relative_prix_m2', BAREME_TENDANCE),
+        ('volume', 'volume_total', BAREME_VOLUME),
+        ('stabilite', 'cv_prix_m2', BAREME_STABILITE),
+    ]
+    
+    total = np.zeros(len(communes), dtype=int)
+    for nom, colonne, bareme in composantes:
+        points, libelles = _select_bareme(communes[colonne].to_numpy(), bareme)
+        communes[f'score_{nom}'] = points
+        communes[nom] = libelles
+        total += points
+    communes['score'] = total
+    
+    conditions = [total >= seuil for seuil, _ in APPRECIATIONS]
+    communes['appreciation'] = np.select(
+        conditions, [libelle for _, libelle in APPRECIATIONS], default=APPRECIATION_DEFAUT
+    )
+    
+    return communes.drop(columns=['nb_annees']).reset_index()
 
 
 def get_investment_recommendation(df: pd.DataFrame, commune: str,
@@ -328,10 +223,11 @@ def get_investment_recommendation(df: pd.DataFrame, commune: str,
     Returns:
         Dictionnaire avec la recommandation
     """
-    # Analyser le marché
-    market_score = calculate_market_score(df, commune)
-    comparison = compare_to_market(prix_m2, df, commune)
-    trends = analyze_price_trends(df, commune)
+    # Analyser le marché (un seul rapport pour la commune)
+    report = build_commune_report(get_store(df), commune)
+    market_score = report.copy_of('score')
+    comparison = report.compare(prix_m2)
+    trends = report.copy_of('trends')
     
     # Score global de recommandation
     score = market_score.get('score', 50)
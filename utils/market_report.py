@@ -0,0 +1,378 @@
+"""
+Rapport de marché calculé en une seule passe (statistiques, évolution,
+tendances, liquidité, score) pour une commune ou un ensemble de lignes DVF
+"""
+import copy
+import weakref
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.dvf_panel import annualized_growth, cagr, linear_trend, volatility
+from utils.dvf_store import DVFStore
+from utils.profiling import timed
+
+
+@dataclass
+class MarketReport:
+    """Ensemble des indicateurs de marché calculés sur un même jeu de lignes"""
+    rows: pd.DataFrame
+    stats: Dict = field(default_factory=dict)
+    evolution: pd.DataFrame = field(default_factory=pd.DataFrame)
+    trends: Dict = field(default_factory=dict)
+    liquidity: Dict = field(default_factory=dict)
+    score: Dict = field(default_factory=dict)
+    prix_m2_marche: float = np.nan
+    prix_m2_median: float = np.nan
+    prix_m2_std: float = np.nan
+    insee: Optional[str] = None
+    # Référence faible vers le store (le rapport est mis en cache dans le store)
+    store_ref: Optional[Callable[[], Optional[DVFStore]]] = field(default=None, repr=False)
+
+    @property
+    def empty(self) -> bool:
+        return self.rows.empty
+
+    def copy_of(self, name: str):
+        """
+        Copie profonde d'un indicateur du rapport ('stats', 'trends', 'score'...)
+
+        Le rapport est mis en cache et partagé entre les sessions : les
+        dictionnaires imbriqués (details) et les DataFrame (evolution) rendus
+        à l'appelant ne doivent pas être ceux du cache.
+        """
+        return copy.deepcopy(getattr(self, name))
+
+    def compare(self, prix_m2: float) -> Dict:
+        """
+        Compare un prix au m² avec le marché du rapport
+
+        Args:
+            prix_m2: Prix au m² à comparer
+
+        Returns:
+            Dictionnaire avec la comparaison (voir compare_to_market) ; pour
+            une commune, percentiles du prix dans la commune, son département
+            et en France (voir utils.price_quantiles)
+        """
+        if self.empty or 'prix_m2_moyen' not in self.rows.columns:
+            return {'statut': 'Données insuffisantes'}
+
+        # Écart par rapport à la moyenne
+        ecart_pct = ((prix_m2 - self.prix_m2_marche) / self.prix_m2_marche) * 100
+
+        # Positionnement
+        if prix_m2 < self.prix_m2_median * 0.8:
+            positionnement = "Bien en dessous du marché"
+            evaluation = "Excellent prix"
+        elif prix_m2 < self.prix_m2_median:
+            positionnement = "En dessous du marché"
+            evaluation = "Bon prix"
+        elif prix_m2 < self.prix_m2_median * 1.2:
+            positionnement = "Dans la moyenne du marché"
+            evaluation = "Prix correct"
+        else:
+            positionnement = "Au-dessus du marché"
+            evaluation = "Prix élevé"
+
+        comparaison = {
+            'prix_m2_analyse': prix_m2,
+            'prix_m2_marche': self.prix_m2_marche,
+            'prix_m2_median': self.prix_m2_median,
+            'ecart_pourcentage': ecart_pct,
+            'positionnement': positionnement,
+            'evaluation': evaluation
+        }
+
+        store = self.store_ref() if self.store_ref is not None else None
+        if store is not None and self.insee:
+            from utils.price_quantiles import get_price_quantiles
+            percentiles = get_price_quantiles(store).position(prix_m2, self.insee)
+            comparaison.update(percentiles.iloc[0].to_dict())
+        return comparaison
+
+
+def compute_row_stats(df: pd.DataFrame) -> Dict:
+    """
+    Statistiques descriptives sur les lignes DVF (voir get_market_stats)
+
+    Args:
+        df: Lignes DVF
+
+    Returns:
+        Dictionnaire avec les statistiques
+    """
+    stats = {}
+
+    # Statistiques en float64 (prix stockés en float32, voir compact_dtypes)
+    if 'prix_moyen' in df.columns:
+        prix = df['prix_moyen'].astype(float)
+        stats['prix_moyen'] = prix.mean()
+        stats['prix_median'] = prix.median()
+        stats['prix_min'] = prix.min()
+        stats['prix_max'] = prix.max()
+
+    if 'prix_m2_moyen' in df.columns:
+        prix_m2 = df['prix_m2_moyen'].astype(float)
+        stats['prix_m2_moyen'] = prix_m2.mean()
+        stats['prix_m2_median'] = prix_m2.median()
+        stats['prix_m2_min'] = prix_m2.min()
+        stats['prix_m2_max'] = prix_m2.max()
+
+    if 'surface_moy' in df.columns:
+        surface = df['surface_moy'].astype(float)
+        stats['surface_moyenne'] = surface.mean()
+        stats['surface_mediane'] = surface.median()
+
+    if 'nb_mutations' in df.columns:
+        stats['total_mutations'] = df['nb_mutations'].sum()
+
+    return stats
+
+
+def _build_trends(evolution: pd.DataFrame) -> Dict:
+    """
+    Tendances de prix à partir de l'évolution annuelle (voir analyze_price_trends)
+
+    Les variations moyennes sont des taux annuels composés entre la première
+    et la dernière année observées : un écart de plusieurs années entre deux
+    millésimes (2017 → 2022) n'est pas compté comme une seule année. La
+    tendance est une régression linéaire sur les années réelles, calculée
+    comme pour toutes les communes à la fois (voir get_trend_table).
+    """
+    yearly_avg = evolution[['annee', 'prix_moyen', 'prix_m2_moyen', 'nb_mutations']]
+
+    if len(yearly_avg) < 2:
+        return {'tendance': 'Données insuffisantes'}
+
+    annees = yearly_avg['annee'].to_numpy()
+    prix = yearly_avg[['prix_moyen', 'prix_m2_moyen']].to_numpy(dtype=float).T
+    variations = cagr(prix, annees) * 100
+
+    # Tendance générale (régression linéaire simple)
+    regression = {cle: valeurs[0] for cle, valeurs in linear_trend(prix[1], annees).items()}
+    tendance_slope = regression['pente']
+
+    if tendance_slope > 50:
+        tendance = "Forte hausse"
+    elif tendance_slope > 0:
+        tendance = "Hausse modérée"
+    elif tendance_slope > -50:
+        tendance = "Baisse modérée"
+    else:
+        tendance = "Forte baisse"
+
+    return {
+        'variation_prix_annuelle': variations[0],
+        'variation_prix_m2_annuelle': variations[1],
+        'volatilite_prix_m2': volatility(prix[1], annees)[0] * 100,
+        'pente_prix_m2': tendance_slope,
+        'pente_relative_prix_m2': regression['pente_relative'] * 100,
+        'r2_tendance': regression['r2'],
+        'erreur_type_pente': regression['erreur_type'],
+        'tendance': tendance,
+        'nombre_annees': len(yearly_avg),
+        'evolution': yearly_avg
+    }
+
+
+def _build_liquidity(rows: pd.DataFrame, n_years: int) -> Dict:
+    """Indicateurs de liquidité (voir calculate_market_liquidity)"""
+    total_transactions = rows['nb_mutations'].sum()
+    transactions_par_an = total_transactions / n_years if n_years > 0 else 0
+    volume_total = (rows['prix_moyen'] * rows['nb_mutations']).sum()
+
+    # Évaluer la liquidité
+    if transactions_par_an > 100:
+        liquidite = "Très liquide"
+    elif transactions_par_an > 50:
+        liquidite = "Liquide"
+    elif transactions_par_an > 20:
+        liquidite = "Moyennement liquide"
+    else:
+        liquidite = "Peu liquide"
+
+    return {
+        'total_transactions': total_transactions,
+        'transactions_par_an': transactions_par_an,
+        'volume_total': volume_total,
+        'evaluation_liquidite': liquidite
+    }
+
+
+# Barèmes du score de marché : paliers (seuil, points, libellé) testés dans
+# l'ordre, puis (points, libellé) par défaut. Partagés par le calcul scalaire
+# (_build_score) et le calcul vectorisé (score_all_communes).
+BAREME_LIQUIDITE = ('>', [(100, 25, 'Excellent'), (50, 20, 'Bon'), (20, 15, 'Moyen')],
+                    (10, 'Faible'))
+BAREME_TENDANCE = ('>', [(5, 35, 'Forte croissance'), (2, 30, 'Croissance'),
+                         (0, 25, 'Stable positif'), (-2, 15, 'Stable')],
+                   (5, 'Baisse'))
+BAREME_VOLUME = ('>', [(10000000, 20, 'Très important'), (5000000, 15, 'Important'),
+                       (1000000, 10, 'Moyen')],
+                 (5, 'Faible'))
+BAREME_STABILITE = ('<', [(10, 20, 'Très stable'), (20, 15, 'Stable'), (30, 10, 'Variable')],
+                    (5, 'Très variable'))
+
+# Appréciation globale : (score minimal, libellé)
+APPRECIATIONS = [(85, "Excellent marché"), (70, "Bon marché"),
+                 (55, "Marché correct"), (40, "Marché moyen")]
+APPRECIATION_DEFAUT = "Marché difficile"
+
+
+def apply_bareme(value: float, bareme) -> Tuple[int, str]:
+    """
+    Applique un barème de score à une valeur
+
+    Args:
+        value: Valeur mesurée (NaN = palier par défaut)
+        bareme: Barème (opérateur, paliers, défaut)
+
+    Returns:
+        Tuple (points, libellé)
+    """
+    op, paliers, defaut = bareme
+    for seuil, points, libelle in paliers:
+        if (value > seuil) if op == '>' else (value < seuil):
+            return points, libelle
+    return defaut
+
+
+def get_appreciation(score: float) -> str:
+    """Appréciation globale associée à un score"""
+    for seuil, libelle in APPRECIATIONS:
+        if score >= seuil:
+            return libelle
+    return APPRECIATION_DEFAUT
+
+
+def _build_score(liquidite: Dict, trends: Dict, prix_m2_mean: float,
+                 prix_m2_std: float) -> Dict:
+    """Score global du marché (voir calculate_market_score)"""
+    cv = (prix_m2_std / prix_m2_mean * 100) if prix_m2_mean > 0 else 100
+
+    composantes = [
+        # 1. Liquidité (0-25 points)
+        ('liquidite', liquidite.get('transactions_par_an', 0), BAREME_LIQUIDITE),
+        # 2. Tendance des prix (0-35 points) : pente de la régression, en %/an
+        ('tendance', trends.get('pente_relative_prix_m2', 0), BAREME_TENDANCE),
+        # 3. Volume du marché (0-20 points)
+        ('volume', liquidite.get('volume_total', 0), BAREME_VOLUME),
+        # 4. Stabilité (0-20 points)
+        ('stabilite', cv, BAREME_STABILITE),
+    ]
+
+    score = 0
+    details = {}
+    for nom, valeur, bareme in composantes:
+        points, libelle = apply_bareme(valeur, bareme)
+        score += points
+        details[nom] = libelle
+
+    return {
+        'score': score,
+        'score_max': 100,
+        'appreciation': get_appreciation(score),
+        'details': details
+    }
+
+
+def _yearly_evolution(rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Moyennes annuelles des prix et surfaces, somme des mutations
+
+    Équivalent à groupby('annee').agg(...) (valeurs manquantes ignorées),
+    calculé avec NumPy en float64 : les prix sont stockés en float32 (voir
+    utils.dvf_memory.compact_dtypes) et l'agrégation pandas coûte plus que
+    le calcul sur les quelques lignes d'une commune.
+    """
+    annees = rows['annee'].to_numpy()
+    valide = ~pd.isna(annees)
+    uniques, groupes = np.unique(annees[valide], return_inverse=True)
+    n = len(uniques)
+
+    evolution = pd.DataFrame({'annee': uniques})
+    for col in ['prix_moyen', 'prix_m2_moyen', 'surface_moy']:
+        valeurs = rows[col].to_numpy(dtype=float)[valide]
+        present = ~np.isnan(valeurs)
+        sommes = np.bincount(groupes[present], weights=valeurs[present], minlength=n)
+        nombres = np.bincount(groupes[present], minlength=n)
+        evolution[col] = np.divide(sommes, nombres, out=np.full(n, np.nan), where=nombres > 0)
+
+    mutations = rows['nb_mutations'].to_numpy()[valide]
+    sommes = np.bincount(groupes, weights=np.nan_to_num(mutations.astype(float)), minlength=n)
+    evolution['nb_mutations'] = sommes.astype(np.int64) if mutations.dtype.kind in 'iu' else sommes
+    return evolution
+
+
+@timed()
+def build_market_report(rows: pd.DataFrame, insee: Optional[str] = None) -> MarketReport:
+    """
+    Calcule tous les indicateurs de marché sur un jeu de lignes DVF
+
+    Une seule agrégation par année alimente l'évolution, les tendances et la
+    liquidité ; les statistiques de prix sont calculées une fois sur les lignes.
+
+    Args:
+        rows: Lignes DVF (une commune, un département, la France...)
+        insee: Code INSEE de la commune, le cas échéant
+
+    Returns:
+        MarketReport
+    """
+    if rows.empty:
+        return MarketReport(rows=rows, insee=insee,
+                            score={'score': 0, 'appreciation': 'Données insuffisantes'})
+
+    stats = compute_row_stats(rows)
+
+    evolution = _yearly_evolution(rows)
+
+    # Variations annualisées depuis l'année observée précédente
+    croissance = annualized_growth(
+        evolution[['prix_moyen', 'prix_m2_moyen']].to_numpy(dtype=float).T, evolution['annee']
+    )
+    evolution['variation_prix'] = croissance[0] * 100
+    evolution['variation_prix_m2'] = croissance[1] * 100
+
+    trends = _build_trends(evolution)
+    liquidity = _build_liquidity(rows, rows['annee'].nunique())
+
+    prix_m2_mean = stats['prix_m2_moyen']
+    prix_m2_std = rows['prix_m2_moyen'].astype(float).std()
+    score = _build_score(liquidity, trends, prix_m2_mean, prix_m2_std)
+
+    return MarketReport(
+        rows=rows,
+        stats=stats,
+        evolution=evolution,
+        trends=trends,
+        liquidity=liquidity,
+        score=score,
+        prix_m2_marche=prix_m2_mean,
+        prix_m2_median=stats['prix_m2_median'],
+        prix_m2_std=prix_m2_std,
+        insee=insee
+    )
+
+
+def build_commune_report(store: DVFStore, insee: str) -> MarketReport:
+    """
+    Rapport de marché complet d'une commune (mis en cache dans le store)
+
+    Args:
+        store: DVFStore
+        insee: Code INSEE de la commune
+
+    Returns:
+        MarketReport de la commune
+    """
+    insee = str(insee)
+    def build():
+        report = build_market_report(store.commune(insee), insee)
+        report.store_ref = weakref.ref(store)
+        return report
+
+    return store.memoize(('commune_report', insee), build)
@@ -0,0 +1,202 @@
+"""
+Simulation Monte Carlo de la projection sur 20 ans (appréciation, loyers et
+vacance locative stochastiques)
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from utils.dvf_panel import log_return_stats
+from utils.financial_calculator import calculate_irr_batch
+from utils.profiling import timed
+from utils.simulation import PARAM_NAMES, simulate_batch
+
+# Percentiles rapportés par défaut
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Volatilités par défaut (points de % par an)
+DEFAULT_APPRECIATION_VOL = 5.0
+DEFAULT_LOYER_VOL = 1.0
+DEFAULT_VACANCE_VOL = 3.0
+
+# Taille des blocs de trajectoires : fixe, pour que les résultats ne
+# dépendent pas du nombre de processus
+CHUNK_SIZE = 25000
+
+
+def calibrate_appreciation(evolution, min_years: int = 2) -> Optional[Dict]:
+    """
+    Estime la dérive et la volatilité annuelles du prix au m² d'une commune
+
+    Les rendements logarithmiques entre années disponibles sont annualisés
+    selon l'écart réel (2017 → 2022 compte pour 5 ans) : dérive = somme des
+    log-rendements / nombre d'années, variance = moyenne des (r - μ·g)² / g
+    (mêmes calculs que le panel des communes, voir utils.dvf_panel).
+
+    Args:
+        evolution: DataFrame avec colonnes 'annee' et 'prix_m2_moyen'
+                   (ex: build_commune_report(store, insee).evolution)
+        min_years: Nombre minimal d'années observées
+
+    Returns:
+        {'appreciation': % moyen/an, 'volatilite': %/an, 'nombre_annees': n}
+        ou None si l'historique est insuffisant
+    """
+    if evolution is None or len(evolution) < min_years:
+        return None
+
+    serie = evolution[['annee', 'prix_m2_moyen']].dropna()
+    serie = serie[serie['prix_m2_moyen'] > 0].sort_values('annee')
+    if len(serie) < min_years:
+        return None
+
+    derive, variances, _ = log_return_stats(serie['prix_m2_moyen'], serie['annee'])
+    mu, variance = float(derive[0]), float(variances[0])
+    sigma = float(np.sqrt(variance))
+
+    return {
+        # Espérance du facteur annuel log-normal : exp(μ + σ²/2)
+        'appreciation': float(np.expm1(mu + variance / 2) * 100),
+        'volatilite': sigma * 100,
+        'nombre_annees': len(serie)
+    }
+
+
+def _lognormal_factors(rng: np.random.Generator, mean_pct: float, vol_pct: float,
+                       shape) -> np.ndarray:
+    """Facteurs de croissance log-normaux d'espérance 1 + mean_pct/100"""
+    sigma = vol_pct / 100
+    mu = np.log1p(mean_pct / 100) - sigma ** 2 / 2
+    if sigma == 0:
+        return np.full(shape, np.exp(mu))
+    return np.exp(mu + sigma * rng.standard_normal(shape))
+
+
+def _simulate_chunk(args) -> Dict[str, np.ndarray]:
+    """
+    Simule un bloc de trajectoires (fonction de niveau module pour le pool)
+
+    Args:
+        args: Tuple (base, deterministe, n_paths, seed_sequence, volatilités)
+
+    Returns:
+        Tableaux (n_paths, horizon) du bloc et TRI (n_paths,)
+    """
+    base, deterministe, n_paths, seed, vols = args
+    rng = np.random.default_rng(seed)
+    horizon = deterministe['Remboursement'].shape[0]
+    shape = (n_paths, horizon)
+
+    # Valeur du bien
+    facteurs_valeur = _lognormal_factors(rng, base['appreciation_annuelle'],
+                                         vols['appreciation'], shape)
+    valeur_bien = base['prix_bien'] * np.cumprod(facteurs_valeur, axis=1)
+
+    # Loyer (pas d'indexation la première année)
+    facteurs_loyer = _lognormal_factors(rng, base['augmentation_loyer'], vols['loyer'], shape)
+    facteurs_loyer[:, 0] = 1.0
+    loyer = base['loyer_mensuel'] * np.cumprod(facteurs_loyer, axis=1)
+
+    # Vacance locative annuelle (normale tronquée à [0, 100] %)
+    vacance = base['vacance_locative']
+    if vols['vacance'] > 0:
+        vacance = np.clip(vacance + vols['vacance'] * rng.standard_normal(shape), 0, 100)
+
+    revenus = loyer * 12 * (1 - vacance / 100)
+    cashflow = revenus - deterministe['Charges Annuelles'] - deterministe['Remboursement']
+    patrimoine = valeur_bien - deterministe['Capital Restant']
+
+    flux = np.column_stack([np.full(n_paths, -base['apport']), cashflow])
+    flux[:, -1] += patrimoine[:, -1]
+
+    return {
+        'patrimoine_net': patrimoine,
+        'cashflow': cashflow,
+        'tri': calculate_irr_batch(flux)
+    }
+
+
+@timed()
+def simulate_monte_carlo(base_params: Mapping, n_paths: int = 10000,
+                         appreciation_vol: float = DEFAULT_APPRECIATION_VOL,
+                         loyer_vol: float = DEFAULT_LOYER_VOL,
+                         vacance_vol: float = DEFAULT_VACANCE_VOL,
+                         seed: Optional[int] = 42,
+                         percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+                         n_jobs: int = 1) -> Dict:
+    """
+    Simule la projection d'un investissement sur un grand nombre de trajectoires
+
+    L'appréciation et l'indexation des loyers suivent des facteurs annuels
+    log-normaux d'espérance égale aux hypothèses du scénario ; la vacance est
+    tirée chaque année autour de sa valeur moyenne. Le crédit et les charges
+    restent déterministes (voir simulate_batch).
+
+    Args:
+        base_params: Paramètres du scénario (dict PARAM_NAMES)
+        n_paths: Nombre de trajectoires
+        appreciation_vol: Volatilité annuelle de l'appréciation (%)
+        loyer_vol: Volatilité annuelle de l'indexation des loyers (%)
+        vacance_vol: Écart-type annuel de la vacance (points de %)
+        seed: Graine aléatoire (résultats reproductibles, quel que soit n_jobs)
+        percentiles: Percentiles à rapporter
+        n_jobs: Nombre de processus (1 = calcul dans le processus courant)
+
+    Returns:
+        Dictionnaire avec les bandes de percentiles par année de
+        'patrimoine_net', 'cashflow' et 'cashflow_cumule' (n_percentiles, horizon),
+        les percentiles du TRI et quelques probabilités de risque
+
+    Raises:
+        ValueError: Si n_paths < 1
+    """
+    if n_paths < 1:
+        raise ValueError("Le nombre de trajectoires doit être au moins 1")
+
+    base = {name: float(base_params[name]) for name in PARAM_NAMES}
+    projection = simulate_batch(base)['projection']
+    deterministe = {col: projection[col][0] for col in
+                    ('Charges Annuelles', 'Remboursement', 'Capital Restant', 'Patrimoine Net')}
+    vols = {'appreciation': appreciation_vol, 'loyer': loyer_vol, 'vacance': vacance_vol}
+
+    tailles = [CHUNK_SIZE] * (n_paths // CHUNK_SIZE)
+    if n_paths % CHUNK_SIZE:
+        tailles.append(n_paths % CHUNK_SIZE)
+    graines = np.random.SeedSequence(seed).spawn(len(tailles))
+    taches = [(base, deterministe, taille, graine, vols) for taille, graine in zip(tailles, graines)]
+
+    if n_jobs > 1 and len(taches) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            blocs: List[Dict] = list(pool.map(_simulate_chunk, taches))
+    else:
+        blocs = [_simulate_chunk(tache) for tache in taches]
+
+    patrimoine = np.concatenate([b['patrimoine_net'] for b in blocs])
+    cashflow = np.concatenate([b['cashflow'] for b in blocs])
+    tri = np.concatenate([b['tri'] for b in blocs])
+    cashflow_cumule = np.cumsum(cashflow, axis=1)
+
+    percentiles = list(percentiles)
+    tri_valides = tri[np.isfinite(tri)]
+    gain_final = patrimoine[:, -1] + cashflow_cumule[:, -1] - base['apport']
+
+    # Sans changement de signe des flux, le TRI n'existe pas : ces trajectoires
+    # comptent comme TRI négatif quand elles se soldent par une perte
+    tri_negatif = np.where(np.isfinite(tri), tri < 0, gain_final < 0)
+
+    return {
+        'percentiles': percentiles,
+        'annees': np.arange(1, patrimoine.shape[1] + 1),
+        'patrimoine_net': np.percentile(patrimoine, percentiles, axis=0),
+        'cashflow': np.percentile(cashflow, percentiles, axis=0),
+        'cashflow_cumule': np.percentile(cashflow_cumule, percentiles, axis=0),
+        'tri': (np.percentile(tri_valides, percentiles) if tri_valides.size
+                else np.full(len(percentiles), np.nan)),
+        'tri_moyen': float(tri_valides.mean()) if tri_valides.size else np.nan,
+        'prob_tri_negatif': float(np.mean(tri_negatif)),
+        'prob_tri_indefini': float(np.mean(~np.isfinite(tri))),
+        'prob_perte': float(np.mean(gain_final < 0)),
+        'patrimoine_deterministe': deterministe['Patrimoine Net'],
+        'n_paths': n_paths
+    }
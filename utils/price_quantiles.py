@@ -0,0 +1,270 @@
+"""
+Distributions des prix au m² triées par commune, département et France :
+position d'un prix (percentile) et quantiles en O(log n), par lots
+"""
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.dvf_store import DVFStore, get_store
+from utils.profiling import timed
+
+# Niveaux de comparaison, du plus local au plus large
+QUANTILE_LEVELS = ('commune', 'departement', 'national')
+NATIONAL_CODE = 'FR'
+
+# Quantiles des tableaux de synthèse (voir PriceQuantiles.summary)
+DEFAULT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+def _segment_search(values: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                    queries: np.ndarray, side: str = 'left') -> np.ndarray:
+    """
+    np.searchsorted appliqué à chaque requête dans sa propre plage triée
+
+    Recherche dichotomique vectorisée : toutes les requêtes avancent ensemble,
+    en log2(taille de la plus grande plage) itérations.
+
+    Args:
+        values: Valeurs triées au sein de chaque plage
+        starts: Début de la plage de chaque requête
+        ends: Fin (exclue) de la plage de chaque requête
+        queries: Valeurs recherchées
+        side: 'left' (première position >= requête) ou 'right' (> requête)
+
+    Returns:
+        Positions d'insertion (entre starts et ends)
+    """
+    lo = starts.astype(np.int64).copy()
+    hi = ends.astype(np.int64).copy()
+    derniere = max(len(values) - 1, 0)
+    while True:
+        actives = lo < hi
+        if not actives.any():
+            return lo
+        mid = (lo + hi) // 2
+        valeurs = values[np.minimum(mid, derniere)] if len(values) else np.zeros(len(mid))
+        droite = (valeurs < queries) if side == 'left' else (valeurs <= queries)
+        droite &= actives
+        lo = np.where(droite, mid + 1, lo)
+        hi = np.where(actives & ~droite, mid, hi)
+
+
+class _SortedGroups:
+    """Valeurs triées par groupe (plages contiguës) et poids cumulés"""
+
+    def __init__(self, keys: Sequence[str], groups: np.ndarray, values: np.ndarray,
+                 weights: np.ndarray):
+        """
+        Args:
+            keys: Code de chaque groupe
+            groups: Groupe de chaque valeur (-1 = ignorée)
+            values: Valeurs
+            weights: Poids des valeurs (nombre de mutations)
+        """
+        self.keys = np.asarray(keys, dtype=str)
+        self.ranks: Dict[str, int] = {code: i for i, code in enumerate(self.keys)}
+
+        valide = (groups >= 0) & np.isfinite(values) & np.isfinite(weights) & (weights > 0)
+        groups, values, weights = groups[valide], values[valide], weights[valide]
+        ordre = np.lexsort((values, groups))
+
+        self.values = values[ordre]
+        self.bounds = np.concatenate(
+            [[0], np.cumsum(np.bincount(groups, minlength=len(self.keys)))]
+        ).astype(np.int64)
+        self.cumulative = np.concatenate([[0.0], np.cumsum(weights[ordre])])
+
+    def percentiles(self, prices: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+        """Percentiles (0-100) des prix dans leur groupe ; NaN si groupe inconnu ou vide"""
+        connus = ranks >= 0
+        rangs = np.where(connus, ranks, 0)
+        starts, ends = self.bounds[rangs], self.bounds[rangs + 1]
+        total = self.cumulative[ends] - self.cumulative[starts]
+
+        # Rang moyen : les valeurs égales au prix comptent pour moitié
+        requetes = np.where(np.isnan(prices), 0.0, prices)
+        gauche = _segment_search(self.values, starts, ends, requetes, 'left')
+        droite = _segment_search(self.values, starts, ends, requetes, 'right')
+        dessous = (self.cumulative[gauche] + self.cumulative[droite]) / 2 - self.cumulative[starts]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            resultat = dessous / total * 100
+        return np.where(connus & (total > 0) & ~np.isnan(prices), resultat, np.nan)
+
+    def quantiles(self, q: Iterable[float]) -> np.ndarray:
+        """
+        Quantiles pondérés de chaque groupe (plus petite valeur dont le poids
+        cumulé atteint q) : tableau (n_groupes, n_quantiles), NaN si vide
+        """
+        q = np.asarray(list(q), dtype=float)
+        starts, ends = self.bounds[:-1], self.bounds[1:]
+        total = self.cumulative[ends] - self.cumulative[starts]
+        cibles = self.cumulative[starts][:, None] + total[:, None] * q[None, :]
+
+        # Poids cumulés croissants sur tout le tableau : une seule recherche globale
+        positions = np.searchsorted(self.cumulative, cibles, side='left') - 1
+        positions = np.clip(positions, starts[:, None], np.maximum(ends - 1, starts)[:, None])
+        resultat = self.values[np.minimum(positions, max(len(self.values) - 1, 0))] \
+            if len(self.values) else np.full(positions.shape, np.nan)
+        return np.where((total > 0)[:, None], resultat, np.nan)
+
+
+class PriceQuantiles:
+    """
+    Distributions des prix au m² (lignes commune-année) triées par niveau
+
+    Chaque ligne DVF pèse son nombre de mutations : le percentile d'un prix
+    est la part des mutations dont le prix moyen au m² lui est inférieur.
+    Les départements suivent le référentiel INSEE (voir utils.hierarchy),
+    avec repli sur le préfixe du code pour les communes absentes. Les lignes
+    sans code INSEE (agrégats nationaux) sont exclues de tous les niveaux.
+    """
+
+    def __init__(self, store: DVFStore, column: str = 'prix_m2_moyen',
+                 weight: str = 'nb_mutations'):
+        """
+        Args:
+            store: DVFStore
+            column: Colonne des prix
+            weight: Colonne des poids
+        """
+        from utils.hierarchy import attach_hierarchy, load_commune_hierarchy
+
+        self.version = store.version
+        codes = np.asarray(store.insee_codes.codes, dtype=np.int64)
+        rows = store.df.iloc[:len(codes)]
+        prix = rows[column].to_numpy(dtype=float)
+        poids = rows[weight].to_numpy(dtype=float) if weight in rows.columns else np.ones(len(rows))
+
+        communes = list(store.insee_codes.categories)
+        departements = attach_hierarchy(pd.Index(communes), load_commune_hierarchy())['dep']
+        dep_codes, dep_keys = pd.factorize(departements.astype(str).to_numpy(), sort=True)
+        self._commune_departement = dep_codes
+
+        self.levels: Dict[str, _SortedGroups] = {
+            'commune': _SortedGroups(communes, codes, prix, poids),
+            'departement': _SortedGroups(dep_keys, dep_codes[codes] if len(codes) else codes,
+                                         prix, poids),
+            'national': _SortedGroups([NATIONAL_CODE], np.zeros(len(codes), dtype=np.int64),
+                                      prix, poids),
+        }
+
+    def _ranks(self, level: str, insee_codes: np.ndarray) -> np.ndarray:
+        """Groupe de chaque code INSEE au niveau demandé (-1 si inconnu)"""
+        if level == 'national':
+            return np.zeros(len(insee_codes), dtype=np.int64)
+
+        communes = self.levels['commune']
+        rangs = pd.Index(communes.keys).get_indexer(insee_codes)
+        if level == 'commune':
+            return rangs
+
+        # Département de la commune, ou déduit du code si elle n'a pas de données
+        # (3 caractères en outre-mer, voir utils.hierarchy.departement_from_code)
+        resultat = np.full(len(insee_codes), -1, dtype=np.int64)
+        connues = rangs >= 0
+        resultat[connues] = self._commune_departement[rangs[connues]]
+        if not connues.all():
+            inconnues = pd.Series(insee_codes[~connues], dtype=str)
+            prefixes = np.where(inconnues.str.startswith('97'), inconnues.str[:3], inconnues.str[:2])
+            resultat[~connues] = pd.Index(self.levels['departement'].keys).get_indexer(prefixes)
+        return resultat
+
+    @timed()
+    def position(self, prix_m2, insee_codes=None) -> pd.DataFrame:
+        """
+        Positionne un lot de prix au m² à chaque niveau, en une passe
+
+        Args:
+            prix_m2: Prix au m² (scalaire ou séquence)
+            insee_codes: Code INSEE de chaque prix (ou un seul code pour tous ;
+                         None = niveau national seulement)
+
+        Returns:
+            DataFrame (une ligne par prix) : percentile_commune,
+            percentile_departement, percentile_national (0-100, NaN si la
+            commune ou le département n'a pas de données)
+        """
+        prix = np.atleast_1d(np.asarray(prix_m2, dtype=float))
+        if insee_codes is None:
+            codes = np.full(len(prix), '', dtype=object)
+        else:
+            codes = np.atleast_1d(np.asarray(insee_codes, dtype=object))
+            if len(codes) == 1 and len(prix) > 1:
+                codes = np.repeat(codes, len(prix))
+            codes = pd.Series(codes).astype(str).str.zfill(5).to_numpy(dtype=object)
+
+        resultat = {}
+        for level in QUANTILE_LEVELS:
+            if insee_codes is None and level != 'national':
+                resultat[f'percentile_{level}'] = np.full(len(prix), np.nan)
+                continue
+            resultat[f'percentile_{level}'] = self.levels[level].percentiles(
+                prix, self._ranks(level, codes))
+        return pd.DataFrame(resultat)
+
+    def percentile(self, prix_m2: float, insee: Optional[str] = None,
+                   level: str = 'commune') -> float:
+        """
+        Percentile d'un prix au m² dans une commune, son département ou la France
+
+        Args:
+            prix_m2: Prix au m²
+            insee: Code INSEE (ignoré au niveau national)
+            level: 'commune', 'departement' ou 'national'
+
+        Returns:
+            Percentile (0-100), NaN sans données
+        """
+        codes = np.array([str(insee or '')], dtype=object)
+        return float(self.levels[level].percentiles(np.array([float(prix_m2)]),
+                                                    self._ranks(level, codes))[0])
+
+    def summary(self, level: str = 'commune',
+                q: Sequence[float] = DEFAULT_QUANTILES) -> pd.DataFrame:
+        """
+        Quantiles pondérés de chaque entité d'un niveau
+
+        Args:
+            level: 'commune', 'departement' ou 'national'
+            q: Quantiles (entre 0 et 1)
+
+        Returns:
+            DataFrame indexé par code (colonnes p10, p25, p50...) et nombre de lignes
+        """
+        groupes = self.levels[level]
+        table = pd.DataFrame(groupes.quantiles(q), index=pd.Index(groupes.keys, name='code'),
+                             columns=[f'p{round(v * 100):d}' for v in q])
+        table['nb_lignes'] = np.diff(groupes.bounds)
+        return table
+
+
+def get_price_quantiles(data) -> PriceQuantiles:
+    """
+    Retourne les distributions de prix des données DVF (construites une fois par store)
+
+    Args:
+        data: DVFStore ou DataFrame DVF
+
+    Returns:
+        PriceQuantiles
+    """
+    store = get_store(data)
+    return store.memoize(('price_quantiles',), lambda: PriceQuantiles(store))
+
+
+def position_prices(data, prix_m2, insee_codes=None) -> pd.DataFrame:
+    """
+    Percentiles d'un lot de prix au m² par commune, département et France
+
+    Args:
+        data: DVFStore ou DataFrame DVF
+        prix_m2: Prix au m² (scalaire ou séquence)
+        insee_codes: Code INSEE de chaque prix (None = niveau national seulement)
+
+    Returns:
+        DataFrame de PriceQuantiles.position
+    """
+    return get_price_quantiles(data).position(prix_m2, insee_codes)
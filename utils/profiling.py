@@ -0,0 +1,254 @@
+"""
+Instrumentation des chemins critiques (appels, durées, hits/misses de cache)
+
+Activée par la variable d'environnement IMMO_PROFILE=1. Désactivée, les
+décorateurs renvoient la fonction d'origine et section() un contexte vide
+partagé : le coût est nul sur les fonctions et négligeable sur les sections.
+Avec IMMO_PROFILE_FILE=mesures.jsonl, chaque mesure est aussi ajoutée au
+fichier (une ligne JSON par mesure) pour une analyse hors ligne.
+
+Les mesures sont visibles dans l'application via ?diagnostics=1.
+"""
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+ENABLED = os.environ.get('IMMO_PROFILE', '').lower() in ('1', 'true', 'yes', 'on')
+EXPORT_PATH = os.environ.get('IMMO_PROFILE_FILE') or None
+
+# Nombre de mesures individuelles conservées en mémoire
+MAX_EVENTS = 20000
+
+
+class Profiler:
+    """Agrégats par nom et dernières mesures individuelles (thread-safe)"""
+
+    def __init__(self, export_path: Optional[str] = None, max_events: int = MAX_EVENTS):
+        """
+        Args:
+            export_path: Fichier JSONL où ajouter chaque mesure (optionnel)
+            max_events: Nombre de mesures individuelles conservées
+        """
+        self.export_path = export_path
+        self.stats: Dict[str, Dict] = {}
+        self.events: deque = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def record(self, name: str, kind: str, duration: float,
+               cache: Optional[str] = None) -> None:
+        """
+        Enregistre une mesure
+
+        Args:
+            name: Nom de la fonction ou de la section
+            kind: 'fonction', 'cache', 'memo', 'section' ou 'streamlit'
+            duration: Durée en secondes
+            cache: 'hit', 'miss' ou None
+        """
+        event = {'ts': time.time(), 'nom': name, 'type': kind, 'duree_s': duration,
+                 'cache': cache, 'thread': threading.current_thread().name}
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = {'type': kind, 'appels': 0, 'total_s': 0.0,
+                                            'max_s': 0.0, 'hits': 0, 'misses': 0}
+            stats['appels'] += 1
+            stats['total_s'] += duration
+            stats['max_s'] = max(stats['max_s'], duration)
+            if cache == 'hit':
+                stats['hits'] += 1
+            elif cache == 'miss':
+                stats['misses'] += 1
+            self.events.append(event)
+
+            if self.export_path:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(self.export_path) or '.', exist_ok=True)
+                    self._file = open(self.export_path, 'a', encoding='utf-8', buffering=1)
+                self._file.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Agrégats par nom, triés par durée totale décroissante
+
+        Returns:
+            DataFrame (nom, type, appels, total_s, moyenne_s, max_s, hits, misses, taux_hit)
+        """
+        with self._lock:
+            rows = [dict(stats, nom=name) for name, stats in self.stats.items()]
+        columns = ['nom', 'type', 'appels', 'total_s', 'moyenne_s', 'max_s',
+                   'hits', 'misses', 'taux_hit']
+        if not rows:
+            return pd.DataFrame(columns=columns)
+
+        df = pd.DataFrame(rows)
+        df['moyenne_s'] = df['total_s'] / df['appels']
+        lookups = df['hits'] + df['misses']
+        df['taux_hit'] = (df['hits'] / lookups * 100).where(lookups > 0)
+        return df[columns].sort_values('total_s', ascending=False).reset_index(drop=True)
+
+    def recent_events(self, limit: Optional[int] = None) -> List[Dict]:
+        """Dernières mesures individuelles (les plus récentes en fin de liste)"""
+        with self._lock:
+            events = list(self.events)
+        return events[-limit:] if limit else events
+
+    def to_jsonl(self) -> str:
+        """Mesures conservées en mémoire au format JSON lines"""
+        return ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in self.recent_events())
+
+    def reset(self) -> None:
+        """Efface agrégats et mesures en mémoire (le fichier d'export est conservé)"""
+        with self._lock:
+            self.stats.clear()
+            self.events.clear()
+
+
+PROFILER = Profiler(EXPORT_PATH)
+
+
+def timed(name: Optional[str] = None, kind: str = 'fonction') -> Callable:
+    """
+    Décorateur mesurant les appels d'une fonction
+
+    Args:
+        name: Nom de la mesure (défaut : module.fonction)
+        kind: Type de mesure
+
+    Returns:
+        Décorateur (identité si l'instrumentation est désactivée)
+    """
+    def decorate(func):
+        if not ENABLED:
+            return func
+        label = name or f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            debut = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.record(label, kind, time.perf_counter() - debut)
+        return wrapper
+    return decorate
+
+
+# Pile (par thread) des appels de fonctions en cache : le calcul effectif
+# marque l'appel en cours comme miss
+_local = threading.local()
+
+
+def profiled_cache(cache_decorator: Callable, name: Optional[str] = None) -> Callable:
+    """
+    Applique un décorateur de cache Streamlit en mesurant hits et misses
+
+    La durée d'un hit inclut le hachage des arguments et la copie du
+    résultat (st.cache_data) : c'est le coût réel d'un appel en cache.
+
+    Args:
+        cache_decorator: st.cache_data ou st.cache_resource (éventuellement paramétré)
+        name: Nom de la mesure (défaut : module.fonction)
+
+    Returns:
+        Décorateur (cache_decorator seul si l'instrumentation est désactivée)
+    """
+    def decorate(func):
+        if not ENABLED:
+            return cache_decorator(func)
+        label = name or f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            pile = getattr(_local, 'pile', None)
+            if pile:
+                pile[-1] = True
+            return func(*args, **kwargs)
+
+        cached_func = cache_decorator(compute)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            pile = _local.__dict__.setdefault('pile', [])
+            pile.append(False)
+            debut = time.perf_counter()
+            try:
+                return cached_func(*args, **kwargs)
+            finally:
+                miss = pile.pop()
+                PROFILER.record(label, 'cache', time.perf_counter() - debut,
+                                'miss' if miss else 'hit')
+
+        wrapper.clear = cached_func.clear
+        return wrapper
+    return decorate
+
+
+class _Section:
+    """Contexte mesurant la durée d'un bloc"""
+
+    __slots__ = ('name', 'kind', 'debut')
+
+    def __init__(self, name: str, kind: str):
+        self.name = name
+        self.kind = kind
+
+    def __enter__(self):
+        self.debut = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        PROFILER.record(self.name, self.kind, time.perf_counter() - self.debut)
+        return False
+
+
+_NULL_SECTION = contextlib.nullcontext()
+
+
+def section(name: str, kind: str = 'section'):
+    """
+    Contexte mesurant un bloc (section de page, étape d'un calcul)
+
+    Args:
+        name: Nom de la mesure
+        kind: Type de mesure
+
+    Returns:
+        Gestionnaire de contexte (vide si l'instrumentation est désactivée)
+    """
+    if not ENABLED:
+        return _NULL_SECTION
+    return _Section(name, kind)
+
+
+def record_lookup(name: str, hit: bool, duration: float = 0.0) -> None:
+    """Enregistre une recherche dans un cache applicatif (ex: DVFStore.memoize)"""
+    PROFILER.record(name, 'memo', duration, 'hit' if hit else 'miss')
+
+
+def instrument_streamlit() -> None:
+    """
+    Mesure le rendu des graphiques et tableaux Streamlit
+
+    st.plotly_chart inclut la sérialisation de la figure ; sans effet si
+    l'instrumentation est désactivée ou déjà en place.
+    """
+    if not ENABLED:
+        return
+    import streamlit as st
+
+    for attr in ('plotly_chart', 'dataframe'):
+        original = getattr(st, attr)
+        if getattr(original, '_profiled', False):
+            continue
+        wrapper = timed(f'st.{attr}', kind='streamlit')(original)
+        wrapper._profiled = True
+        setattr(st, attr, wrapper)
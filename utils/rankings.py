@@ -0,0 +1,284 @@
+"""
+Classements des communes (top N) pré-triés par métrique, avec filtres par
+entité administrative, fenêtre d'années et nombre minimal de mutations
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.dvf_store import DVFStore, get_store
+from utils.profiling import timed
+
+# Métriques triées à la construction (les autres colonnes numériques sont
+# classées à la demande par sélection partielle, voir top_positions)
+RANKING_METRICS = ('prix_m2_moyen', 'prix_moyen', 'nb_mutations', 'surface_moy')
+
+# Niveaux de filtrage -> colonne de la hiérarchie INSEE (voir utils.hierarchy)
+RANKING_LEVELS = {
+    'canton': 'can',
+    'arrondissement': 'arr',
+    'departement': 'dep',
+    'region': 'reg'
+}
+
+# Taille minimale d'un bloc parcouru lors du filtrage par nombre de mutations
+_SCAN_BLOCK = 64
+
+
+def top_positions(values: np.ndarray, n: int, ascending: bool = False) -> np.ndarray:
+    """
+    Positions des n plus grandes (ou plus petites) valeurs, triées
+
+    Sélection partielle (np.argpartition) en O(taille + n log n) ; les NaN
+    sont ignorés et, à valeur égale, la première position l'emporte (comme
+    DataFrame.nlargest).
+
+    Args:
+        values: Valeurs
+        n: Nombre de positions
+        ascending: Plus petites valeurs (True) ou plus grandes (False)
+
+    Returns:
+        Positions triées de la meilleure à la moins bonne
+    """
+    values = np.asarray(values, dtype=float)
+    valides = np.flatnonzero(~np.isnan(values))
+    if n <= 0 or not len(valides):
+        return np.array([], dtype=np.int64)
+    cles = values[valides] if ascending else -values[valides]
+    if n < len(valides):
+        # Seuil du n-ième : valeurs strictement meilleures, puis égalités dans l'ordre
+        seuil = cles[np.argpartition(cles, n - 1)[n - 1]]
+        meilleures = np.flatnonzero(cles < seuil)
+        egales = np.flatnonzero(cles == seuil)[:n - len(meilleures)]
+        choisies = np.concatenate([meilleures, egales])
+    else:
+        choisies = np.arange(len(valides))
+    ordre = np.lexsort((choisies, cles[choisies]))
+    return valides[choisies[ordre]]
+
+
+class CommuneRankings:
+    """
+    Classements des communes d'un jeu de données DVF
+
+    Les sommes et effectifs de chaque métrique sont tenus par commune et par
+    année : les agrégats d'une fenêtre d'années (moyenne des lignes de la
+    commune, somme des mutations) se lisent sans parcourir les lignes. Pour
+    les métriques de RANKING_METRICS, l'ordre des communes est trié une fois
+    par fenêtre, sens et niveau administratif (les communes d'une même
+    entité sont contiguës) : un top N se lit en O(N), ou en O(N / part des
+    communes retenues) avec un nombre minimal de mutations.
+    """
+
+    def __init__(self, store: DVFStore):
+        """
+        Args:
+            store: DVFStore
+        """
+        from utils.hierarchy import get_hierarchy_cube
+
+        self.version = store.version
+        self.years = np.asarray(store.years, dtype=np.int64)
+        self.communes = pd.Index(store.insee_codes.categories)
+        self.hierarchy = get_hierarchy_cube(store).communes
+
+        # Lignes avec code INSEE (les agrégats nationaux sont en fin de store)
+        codes = np.asarray(store.insee_codes.codes, dtype=np.int64)
+        rows = store.df.iloc[:len(codes)]
+        annees = np.searchsorted(self.years, pd.to_numeric(rows['annee']).to_numpy()) \
+            if 'annee' in rows.columns and len(self.years) else np.zeros(len(codes), dtype=np.int64)
+        self._rows = rows
+        self._cells = codes * max(len(self.years), 1) + annees
+        self._shape = (len(self.communes), max(len(self.years), 1))
+
+        # Lignes par commune et par année ; mutations par commune et par année
+        self._row_counts = self._accumulate(np.ones(len(codes)))
+        self._mutations = (self._accumulate(rows['nb_mutations'].to_numpy(dtype=float))
+                           if 'nb_mutations' in rows.columns else np.zeros(self._shape))
+
+        # Sommes et effectifs (valeurs non manquantes) des métriques
+        self._sums: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._aggregates: Dict[Tuple, Tuple[np.ndarray, np.ndarray]] = {}
+        self._orders: Dict[Tuple, Tuple[np.ndarray, Dict[str, Tuple[int, int]]]] = {}
+        self._lock = threading.Lock()
+
+        # Classements nationaux sur toute la période, prêts dès le chargement
+        for metric in RANKING_METRICS:
+            if metric in rows.columns:
+                for ascending in (False, True):
+                    self._order(metric, self._window(None, None), ascending, None)
+
+    def _accumulate(self, values: np.ndarray) -> np.ndarray:
+        """Somme des valeurs par (commune, année) : tableau communes x années"""
+        total = np.bincount(self._cells, weights=values, minlength=self._shape[0] * self._shape[1])
+        return total.reshape(self._shape)
+
+    def _window(self, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+        """Plage de colonnes (années) d'une fenêtre d'années incluses"""
+        debut = 0 if start is None else int(np.searchsorted(self.years, start, side='left'))
+        fin = len(self.years) if end is None else int(np.searchsorted(self.years, end, side='right'))
+        return debut, max(debut, fin)
+
+    def _metric_sums(self, metric: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Sommes et effectifs par (commune, année) d'une métrique (calculés une fois)"""
+        with self._lock:
+            if metric in self._sums:
+                return self._sums[metric]
+        valeurs = self._rows[metric].to_numpy(dtype=float)
+        presentes = ~np.isnan(valeurs)
+        sommes = (self._accumulate(np.where(presentes, valeurs, 0.0)),
+                  self._accumulate(presentes.astype(float)))
+        with self._lock:
+            self._sums[metric] = sommes
+        return sommes
+
+    def aggregate(self, metric: str, window: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Agrégats de chaque commune sur une plage d'années (calculés une fois)
+
+        Args:
+            metric: Colonne DVF
+            window: Plage de colonnes (voir _window)
+
+        Returns:
+            (valeur de la métrique, somme des mutations) par commune ; la
+            valeur est la moyenne des lignes (somme pour nb_mutations), NaN
+            si la commune n'a pas de ligne renseignée dans la fenêtre
+        """
+        key = (metric, window)
+        with self._lock:
+            if key in self._aggregates:
+                return self._aggregates[key]
+
+        debut, fin = window
+        mutations = self._mutations[:, debut:fin].sum(axis=1)
+        if metric == 'nb_mutations':
+            lignes = self._row_counts[:, debut:fin].sum(axis=1)
+            valeurs = np.where(lignes > 0, mutations, np.nan)
+        else:
+            sommes, effectifs = self._metric_sums(metric)
+            effectif = effectifs[:, debut:fin].sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                valeurs = np.where(effectif > 0, sommes[:, debut:fin].sum(axis=1) / effectif, np.nan)
+
+        resultat = (valeurs, mutations)
+        with self._lock:
+            self._aggregates[key] = resultat
+        return resultat
+
+    def _order(self, metric: str, window: Tuple[int, int], ascending: bool,
+               level: Optional[str]) -> Tuple[np.ndarray, Dict[str, Tuple[int, int]]]:
+        """
+        Communes triées d'une métrique (trié une fois par fenêtre, sens et niveau)
+
+        Returns:
+            (positions des communes, plage de chaque entité dans ces positions)
+        """
+        key = (metric, window, ascending, level)
+        with self._lock:
+            if key in self._orders:
+                return self._orders[key]
+
+        valeurs, _ = self.aggregate(metric, window)
+        valides = np.flatnonzero(~np.isnan(valeurs))
+        cles = valeurs[valides] if ascending else -valeurs[valides]
+        if level is None:
+            # Tri stable : à valeur égale, l'ordre des codes INSEE
+            ordre = valides[np.argsort(cles, kind='stable')]
+            plages = {'': (0, len(ordre))}
+        else:
+            entites = self.hierarchy[RANKING_LEVELS[level]].astype(str).to_numpy()[valides]
+            groupes, codes = pd.factorize(entites, sort=True)
+            rang = np.lexsort((valides, cles, groupes))
+            ordre = valides[rang]
+            bornes = np.concatenate([[0], np.cumsum(np.bincount(groupes, minlength=len(codes)))])
+            plages = {code: (int(bornes[i]), int(bornes[i + 1])) for i, code in enumerate(codes)}
+
+        resultat = (ordre, plages)
+        with self._lock:
+            self._orders[key] = resultat
+        return resultat
+
+    @timed()
+    def top(self, metric: str = 'prix_m2_moyen', n: int = 10, ascending: bool = False,
+            level: Optional[str] = None, code: Optional[str] = None,
+            start: Optional[int] = None, end: Optional[int] = None,
+            min_mutations: float = 0) -> pd.DataFrame:
+        """
+        Top N des communes selon une métrique
+
+        Args:
+            metric: Colonne DVF (RANKING_METRICS pré-triées ; toute autre
+                    colonne numérique est classée par sélection partielle)
+            n: Nombre de communes
+            ascending: Plus faibles valeurs (True) ou plus élevées (False)
+            level: Niveau du filtre ('canton', 'arrondissement',
+                   'departement', 'region' ; None = France)
+            code: Code de l'entité du filtre (requis avec level)
+            start: Première année incluse (None = depuis le début)
+            end: Dernière année incluse (None = jusqu'à la fin)
+            min_mutations: Nombre minimal de mutations sur la fenêtre
+
+        Returns:
+            DataFrame classé : insee_com, la métrique (moyenne des lignes de
+            la fenêtre) et nb_mutations (somme sur la fenêtre)
+        """
+        if level is not None and level not in RANKING_LEVELS:
+            raise ValueError(f"Niveau inconnu : {level}")
+        if level is not None and code is None:
+            raise ValueError("Le code de l'entité est requis avec un niveau")
+        colonnes = [metric] if metric == 'nb_mutations' else [metric, 'nb_mutations']
+        if metric not in self._rows.columns or n <= 0:
+            return pd.DataFrame(columns=['insee_com'] + colonnes)
+
+        window = self._window(start, end)
+        valeurs, mutations = self.aggregate(metric, window)
+        if metric in RANKING_METRICS:
+            positions = self._scan(metric, window, ascending, level, code, n,
+                                   mutations, min_mutations)
+        else:
+            # Métrique ad hoc : sélection partielle parmi les communes retenues
+            retenues = mutations >= min_mutations
+            if level is not None:
+                retenues &= self.hierarchy[RANKING_LEVELS[level]].astype(str).to_numpy() == str(code)
+            positions = top_positions(np.where(retenues, valeurs, np.nan), n, ascending)
+
+        resultat = pd.DataFrame({'insee_com': self.communes[positions].astype(str)})
+        resultat[metric] = valeurs[positions]
+        resultat['nb_mutations'] = mutations[positions].astype(np.int64)
+        return resultat
+
+    def _scan(self, metric: str, window: Tuple[int, int], ascending: bool,
+              level: Optional[str], code: Optional[str], n: int,
+              mutations: np.ndarray, min_mutations: float) -> np.ndarray:
+        """Premières communes de l'ordre trié qui passent le filtre de mutations"""
+        ordre, plages = self._order(metric, window, ascending, level)
+        debut, fin = plages.get('' if level is None else str(code), (0, 0))
+        if min_mutations <= 0:
+            return ordre[debut:min(fin, debut + n)]
+
+        # Parcours par blocs croissants : arrêt dès que n communes sont retenues
+        trouvees, bloc = [], max(2 * n, _SCAN_BLOCK)
+        while debut < fin and sum(len(t) for t in trouvees) < n:
+            candidates = ordre[debut:min(fin, debut + bloc)]
+            trouvees.append(candidates[mutations[candidates] >= min_mutations])
+            debut += bloc
+            bloc *= 2
+        return np.concatenate(trouvees)[:n] if trouvees else np.array([], dtype=np.int64)
+
+
+def get_rankings(data) -> CommuneRankings:
+    """
+    Retourne les classements des données DVF (construits une fois par store)
+
+    Args:
+        data: DVFStore ou DataFrame DVF
+
+    Returns:
+        CommuneRankings
+    """
+    store = get_store(data)
+    return store.memoize(('rankings',), lambda: CommuneRankings(store))
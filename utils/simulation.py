@@ -0,0 +1,328 @@
+"""
+Moteur de simulation d'investissement locatif vectorisé (N scénarios à la fois)
+"""
+from typing import Dict, List, Mapping
+
+import numpy as np
+import pandas as pd
+
+from utils.financial_calculator import calculate_irr_batch
+from utils.profiling import timed
+
+# Paramètres d'un scénario, dans l'ordre de calculer_investissement
+PARAM_NAMES = [
+    'prix_bien', 'surface', 'apport', 'taux_credit', 'duree_credit',
+    'loyer_mensuel', 'charges_copro', 'travaux', 'frais_notaire_pct',
+    'taxe_fonciere', 'assurance_pgl', 'vacance_locative',
+    'appreciation_annuelle', 'augmentation_loyer'
+]
+
+# Horizon de la projection (années)
+HORIZON = 20
+
+# Colonnes de la projection annuelle
+PROJECTION_COLUMNS = [
+    'Valeur Bien', 'Loyer Mensuel', 'Revenus Annuels', 'Charges Annuelles',
+    'Remboursement', 'Cashflow', 'Capital Restant', 'Plus-value', 'Patrimoine Net'
+]
+
+
+def _params_to_arrays(params_table) -> Dict[str, np.ndarray]:
+    """
+    Convertit une table de paramètres en vecteurs float64 de même longueur
+
+    Args:
+        params_table: DataFrame, tableau structuré NumPy ou dict de colonnes
+
+    Returns:
+        Dictionnaire {paramètre: vecteur (N,)}
+    """
+    if isinstance(params_table, np.ndarray) and params_table.dtype.names:
+        columns = {name: params_table[name] for name in params_table.dtype.names}
+    elif isinstance(params_table, (pd.DataFrame, Mapping)):
+        columns = params_table
+    else:
+        raise TypeError("params_table doit être un DataFrame, un tableau structuré ou un dict")
+
+    missing = [name for name in PARAM_NAMES if name not in columns]
+    if missing:
+        raise ValueError(f"Paramètres manquants: {', '.join(missing)}")
+
+    arrays = np.broadcast_arrays(*[np.asarray(columns[name], dtype=float) for name in PARAM_NAMES])
+    return {name: np.atleast_1d(a).ravel() for name, a in zip(PARAM_NAMES, arrays)}
+
+
+@timed()
+def simulate_batch(params_table, horizon: int = HORIZON) -> Dict:
+    """
+    Simule N scénarios d'investissement en une seule passe vectorisée
+
+    Reprend exactement les formules de calculer_investissement : les
+    indicateurs sont des vecteurs (N,), la projection des tableaux (N, horizon).
+
+    Args:
+        params_table: DataFrame, tableau structuré ou dict avec une colonne
+                      par paramètre de PARAM_NAMES (une ligne par scénario)
+        horizon: Nombre d'années de projection
+
+    Returns:
+        Dictionnaire des indicateurs (vecteurs) et 'projection' : dict
+        {colonne: tableau (N, horizon)} avec les colonnes de PROJECTION_COLUMNS
+    """
+    p = _params_to_arrays(params_table)
+    n = len(p['prix_bien'])
+
+    prix_bien = p['prix_bien']
+    apport = p['apport']
+    taux_credit = p['taux_credit']
+    duree_credit = p['duree_credit']
+    loyer_mensuel = p['loyer_mensuel']
+    vacance_locative = p['vacance_locative']
+
+    # Calculs initiaux
+    prix_total = prix_bien + p['travaux']
+    frais_notaire = prix_bien * p['frais_notaire_pct']
+    cout_total = prix_total + frais_notaire
+    montant_emprunte = cout_total - apport
+
+    # Mensualités du crédit
+    avec_credit = (taux_credit > 0) & (duree_credit > 0)
+    taux_mensuel = taux_credit / 100 / 12
+    nb_mois = duree_credit * 12
+    with np.errstate(divide='ignore', invalid='ignore'):
+        facteur = (1 + taux_mensuel)**nb_mois
+        mensualite = montant_emprunte * (taux_mensuel * facteur) / (facteur - 1)
+    mensualite_credit = np.where(avec_credit, mensualite, 0.0)
+    cout_total_credit = mensualite_credit * np.where(avec_credit, nb_mois, 0.0)
+    interets_total = np.where(avec_credit, cout_total_credit - montant_emprunte, 0.0)
+
+    # Revenus et charges mensuels
+    taux_occupation = 1 - vacance_locative / 100
+    revenus_bruts_mensuel = loyer_mensuel * taux_occupation
+    charges_mensuelles = p['charges_copro'] + p['assurance_pgl'] + (p['taxe_fonciere'] / 12)
+    charges_totales = charges_mensuelles + mensualite_credit
+
+    # Cashflow
+    cashflow_mensuel = revenus_bruts_mensuel - charges_totales
+    cashflow_annuel = cashflow_mensuel * 12
+
+    # Rentabilités
+    with np.errstate(divide='ignore', invalid='ignore'):
+        loyers_annuels = loyer_mensuel * 12
+        rentabilite_brute = (loyers_annuels / prix_total) * 100
+        charges_annuelles = charges_mensuelles * 12
+        revenus_nets = loyers_annuels * taux_occupation - charges_annuelles
+        rentabilite_nette = (revenus_nets / cout_total) * 100
+        roi = np.where(apport > 0, (revenus_nets / apport) * 100, 0.0)
+
+    # Projection : appréciation et indexation par produits cumulés
+    # (mêmes multiplications successives que la boucle annuelle)
+    facteurs_valeur = np.repeat((1 + p['appreciation_annuelle'] / 100)[:, None], horizon, axis=1)
+    valeur_bien = prix_bien[:, None] * np.cumprod(facteurs_valeur, axis=1)
+
+    facteurs_loyer = np.repeat((1 + p['augmentation_loyer'] / 100)[:, None], horizon, axis=1)
+    facteurs_loyer[:, 0] = 1.0
+    loyer_actuel = loyer_mensuel[:, None] * np.cumprod(facteurs_loyer, axis=1)
+
+    revenus_annee = loyer_actuel * 12 * taux_occupation[:, None]
+    charges_annee = (p['charges_copro'] + p['assurance_pgl']) * 12 + p['taxe_fonciere']
+    charges_annee = np.repeat(charges_annee[:, None], horizon, axis=1)
+
+    # Crédit : récurrence sur les années (vectorisée sur les scénarios)
+    remboursement = np.zeros((n, horizon))
+    capital = np.zeros((n, horizon))
+    capital_restant = montant_emprunte.copy()
+    remb_annuel = mensualite_credit * 12
+    for annee in range(1, horizon + 1):
+        en_cours = annee <= duree_credit
+        capital_rembourse = remb_annuel - (capital_restant * taux_credit / 100)
+        capital_restant = np.where(en_cours, capital_restant - capital_rembourse, 0.0)
+        remboursement[:, annee - 1] = np.where(en_cours, remb_annuel, 0.0)
+        capital[:, annee - 1] = capital_restant
+
+    capital_positif = np.maximum(0, capital)
+
+    projection = {
+        'Valeur Bien': valeur_bien,
+        'Loyer Mensuel': loyer_actuel,
+        'Revenus Annuels': revenus_annee,
+        'Charges Annuelles': charges_annee,
+        'Remboursement': remboursement,
+        'Cashflow': revenus_annee - charges_annee - remboursement,
+        'Capital Restant': capital_positif,
+        'Plus-value': valeur_bien - prix_bien[:, None],
+        'Patrimoine Net': valeur_bien - capital_positif
+    }
+
+    return {
+        'cout_total': cout_total,
+        'montant_emprunte': montant_emprunte,
+        'mensualite_credit': mensualite_credit,
+        'interets_total': interets_total,
+        'revenus_bruts_mensuel': revenus_bruts_mensuel,
+        'charges_mensuelles': charges_mensuelles,
+        'cashflow_mensuel': cashflow_mensuel,
+        'cashflow_annuel': cashflow_annuel,
+        'rentabilite_brute': rentabilite_brute,
+        'rentabilite_nette': rentabilite_nette,
+        'roi': roi,
+        'projection': projection
+    }
+
+
+@timed()
+def compute_tri(params_table, results: Dict) -> np.ndarray:
+    """
+    TRI de chaque scénario sur l'horizon de la projection
+
+    Flux retenus : apport en année 0, cashflows annuels, puis patrimoine net
+    (valeur du bien - capital restant) récupéré en dernière année.
+
+    Args:
+        params_table: Paramètres passés à simulate_batch
+        results: Résultat de simulate_batch
+
+    Returns:
+        TRI en pourcentage (N,), NaN si non défini (ex: apport nul)
+    """
+    apport = _params_to_arrays(params_table)['apport']
+    projection = results['projection']
+    flux = np.column_stack([-apport, projection['Cashflow']])
+    flux[:, -1] += projection['Patrimoine Net'][:, -1]
+    return calculate_irr_batch(flux)
+
+
+# Paramètres balayables dans une grille de sensibilité.
+# 'prix_m2' et 'loyer_m2' sont dérivés : ils fixent prix_bien / loyer_mensuel via la surface.
+SENSITIVITY_PARAMS = {
+    'taux_credit': "Taux crédit (%)",
+    'duree_credit': "Durée crédit (années)",
+    'prix_m2': "Prix au m² (€)",
+    'prix_bien': "Prix du bien (€)",
+    'apport': "Apport (€)",
+    'loyer_m2': "Loyer au m² (€)",
+    'loyer_mensuel': "Loyer mensuel (€)",
+    'vacance_locative': "Vacance locative (%)",
+    'charges_copro': "Charges copropriété (€/mois)",
+    'taxe_fonciere': "Taxe foncière (€/an)",
+    'travaux': "Travaux (€)",
+    'appreciation_annuelle': "Appréciation (%/an)",
+    'augmentation_loyer': "Augmentation loyer (%/an)",
+}
+
+
+# Paramètres dérivés -> paramètre de simulation qu'ils fixent
+DERIVED_PARAMS = {'prix_m2': 'prix_bien', 'loyer_m2': 'loyer_mensuel'}
+
+
+def swept_parameter(name: str) -> str:
+    """Paramètre de simulation modifié par un paramètre balayé (direct ou dérivé)"""
+    return DERIVED_PARAMS.get(name, name)
+
+
+def _apply_sweep(params: Dict[str, np.ndarray], name: str, values: np.ndarray) -> None:
+    """Affecte les valeurs balayées d'un paramètre (direct ou dérivé)"""
+    if name in DERIVED_PARAMS:
+        params[DERIVED_PARAMS[name]] = params['surface'] * values
+    elif name in PARAM_NAMES:
+        params[name] = values
+    else:
+        raise ValueError(f"Paramètre de sensibilité inconnu: {name}")
+
+
+def sensitivity_grid(base_params: Mapping, x_param: str, x_values,
+                     y_param: str, y_values, with_tri: bool = True) -> Dict:
+    """
+    Balaye deux paramètres sur une grille en une seule passe vectorisée
+
+    Args:
+        base_params: Paramètres du scénario de référence (dict PARAM_NAMES)
+        x_param: Paramètre en abscisse (voir SENSITIVITY_PARAMS)
+        x_values: Valeurs de x (nx,)
+        y_param: Paramètre en ordonnée
+        y_values: Valeurs de y (ny,)
+        with_tri: Calculer aussi le TRI
+
+    Returns:
+        Dictionnaire {'x', 'y', 'cashflow_mensuel', 'rentabilite_nette', 'tri'}
+        où chaque indicateur est un tableau (ny, nx)
+    """
+    if swept_parameter(x_param) == swept_parameter(y_param):
+        # ex. prix_m2 et prix_bien : le second balayage écraserait le premier
+        raise ValueError("Les deux paramètres balayés doivent modifier des paramètres différents")
+
+    x_values = np.asarray(x_values, dtype=float)
+    y_values = np.asarray(y_values, dtype=float)
+    grid_y, grid_x = np.meshgrid(y_values, x_values, indexing='ij')
+    shape = grid_x.shape
+
+    params = {name: np.full(grid_x.size, float(base_params[name])) for name in PARAM_NAMES}
+    _apply_sweep(params, x_param, grid_x.ravel())
+    _apply_sweep(params, y_param, grid_y.ravel())
+
+    results = simulate_batch(params)
+    grid = {
+        'x': x_values,
+        'y': y_values,
+        'cashflow_mensuel': results['cashflow_mensuel'].reshape(shape),
+        'rentabilite_nette': results['rentabilite_nette'].reshape(shape),
+    }
+    if with_tri:
+        grid['tri'] = compute_tri(params, results).reshape(shape)
+    return grid
+
+
+def batch_to_frame(results: Dict) -> pd.DataFrame:
+    """
+    Met les indicateurs d'un lot de simulations sous forme de DataFrame
+
+    Args:
+        results: Résultat de simulate_batch
+
+    Returns:
+        DataFrame (une ligne par scénario, sans la projection)
+    """
+    return pd.DataFrame({key: value for key, value in results.items() if key != 'projection'})
+
+
+def calculer_investissements(params_list: List[Mapping]) -> List[Dict]:
+    """
+    Calcule les indicateurs de plusieurs investissements en une seule passe
+
+    Args:
+        params_list: Liste de dictionnaires de paramètres (clés PARAM_NAMES)
+
+    Returns:
+        Liste de résultats au format de calculer_investissement
+    """
+    if not params_list:
+        return []
+    batch = simulate_batch({name: [params[name] for params in params_list]
+                            for name in PARAM_NAMES})
+
+    indicateurs = {key: value.tolist() for key, value in batch.items() if key != 'projection'}
+    projection = {col: batch['projection'][col].tolist() for col in PROJECTION_COLUMNS}
+
+    resultats = []
+    for i in range(len(params_list)):
+        resultat = {key: values[i] for key, values in indicateurs.items()}
+        resultat['projection'] = [
+            dict({'Année': annee + 1}, **{col: projection[col][i][annee] for col in PROJECTION_COLUMNS})
+            for annee in range(HORIZON)
+        ]
+        resultats.append(resultat)
+    return resultats
+
+
+def calculer_investissement(prix_bien, surface, apport, taux_credit, duree_credit,
+                           loyer_mensuel, charges_copro, travaux, frais_notaire_pct,
+                           taxe_fonciere, assurance_pgl, vacance_locative,
+                           appreciation_annuelle, augmentation_loyer):
+    """Calcule tous les indicateurs de l'investissement (cas N=1 de simulate_batch)"""
+    params = dict(zip(PARAM_NAMES, [
+        prix_bien, surface, apport, taux_credit, duree_credit,
+        loyer_mensuel, charges_copro, travaux, frais_notaire_pct,
+        taxe_fonciere, assurance_pgl, vacance_locative,
+        appreciation_annuelle, augmentation_loyer
+    ]))
+    return calculer_investissements([params])[0]